@@ -0,0 +1,124 @@
+import os
+import select
+
+class SysfsEdgeSource:
+    '''
+    Waits for edges on a Raspberry Pi GPIO line through the sysfs GPIO interface
+
+    Usage:
+        source = SysfsEdgeSource(17, edge='falling')
+        if source.wait(timeout=60):
+            ...
+    '''
+    sysfs_path = '/sys/class/gpio'
+
+    def __init__(self, pin, edge = 'falling'):
+        '''
+        Initialization of SysfsEdgeSource class
+
+        Args:
+            pin (int): BCM GPIO number
+            edge (string): 'rising', 'falling' or 'both'
+
+        Raises:
+            ValueError: f"Invalid edge: {edge}"
+        '''
+        if edge not in ('rising', 'falling', 'both'):
+            raise ValueError(f"Invalid edge: {edge}")
+        self.pin = pin
+        pin_path = os.path.join(self.sysfs_path, f"gpio{pin}")
+        if not os.path.exists(pin_path):
+            with open(os.path.join(self.sysfs_path, 'export'), 'w') as file:
+                file.write(str(pin))
+        with open(os.path.join(pin_path, 'direction'), 'w') as file:
+            file.write('in')
+        with open(os.path.join(pin_path, 'edge'), 'w') as file:
+            file.write(edge)
+        self.fd = os.open(os.path.join(pin_path, 'value'), os.O_RDONLY | os.O_NONBLOCK)
+        self.poller = select.poll()
+        self.poller.register(self.fd, select.POLLPRI | select.POLLERR)
+        self._read_value() #Clear the pending edge reported when the file is opened
+
+    def _read_value(self):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        return int(os.read(self.fd, 2).strip() or 0)
+
+    @property
+    def value(self):
+        '''
+        Return the current level of the line (0 or 1)
+        '''
+        return self._read_value()
+
+    def wait(self, timeout = None):
+        '''
+        Block until an edge is seen, without polling the line
+
+        Args:
+            timeout (float): seconds to wait, None to wait forever
+
+        Returns:
+            bool : True if an edge was seen, False on timeout
+        '''
+        events = self.poller.poll(None if timeout is None else timeout * 1000)
+        if not events:
+            return False
+        self._read_value()
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class PipeEdgeSource:
+    '''
+    Stand in for a GPIO edge source for testing without hardware. Each call to trigger() (or each byte written to the named pipe
+    at path) is one edge.
+
+    Usage:
+        source = PipeEdgeSource()
+        source.trigger()
+        assert source.wait(timeout=1)
+    '''
+
+    def __init__(self, path = None):
+        '''
+        Initialization of PipeEdgeSource class
+
+        Args:
+            path (string): optional named pipe to create, so another process can signal edges with e.g. echo > path
+        '''
+        self.path = path
+        if path is None:
+            self.read_fd, self.write_fd = os.pipe()
+        else:
+            if not os.path.exists(path):
+                os.mkfifo(path)
+            self.read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            self.write_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        os.set_blocking(self.read_fd, False)
+
+    def trigger(self):
+        '''
+        Signal one edge
+        '''
+        os.write(self.write_fd, b'\x01')
+
+    def wait(self, timeout = None):
+        '''
+        Block until an edge is signalled
+
+        Args:
+            timeout (float): seconds to wait, None to wait forever
+
+        Returns:
+            bool : True if an edge was signalled, False on timeout
+        '''
+        readable, _, _ = select.select([self.read_fd], [], [], timeout)
+        if not readable:
+            return False
+        os.read(self.read_fd, 1)
+        return True
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
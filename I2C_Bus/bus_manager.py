@@ -0,0 +1,205 @@
+import contextlib
+import os
+import threading
+import time
+
+# Environment variable selecting the bus backend, overrides the i2c section of controller_config.yml
+BACKEND_ENV = 'OBC_I2C_BACKEND'
+
+def open_smbus(bus_number):
+    '''
+    Open a hardware SMBus handle, smbus is imported on first use
+    '''
+    from smbus import SMBus
+    return SMBus(bus_number)
+
+def get_opener(backend = None, **options):
+    '''
+    Return a function opening buses of the given backend
+
+    Args:
+        backend (string): 'smbus' for hardware or 'sim' for I2C_Bus/sim_smbus.py, defaults to $OBC_I2C_BACKEND or 'smbus'
+        options: keyword arguments for SimSMBus (latency, byte_time, fault_rate, seed)
+
+    Raises:
+        ValueError: f"Unknown I2C backend: {backend}"
+    '''
+    backend = os.environ.get(BACKEND_ENV) or backend or 'smbus'
+    if backend == 'smbus':
+        return open_smbus
+    if backend == 'sim':
+        try:
+            from .sim_smbus import SimSMBus
+        except ImportError:
+            from sim_smbus import SimSMBus
+        return lambda bus_number: SimSMBus(bus_number, **options)
+    raise ValueError(f"Unknown I2C backend: {backend}")
+
+class ManagedBus:
+    '''
+    Thread safe stand in for an SMBus handle, created by BusManager
+
+    Functionality:
+    - Serialize every SMBus call on the bus with a lock
+    - Hold the bus over several calls with transaction()
+    - Run a batch of reads and writes as one critical section with submit()
+    - Record queue depth and lock wait time
+    '''
+
+    def __init__(self, bus_number, handle):
+        self.bus_number = bus_number
+        self.handle = handle
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquisitions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Hold the bus until the with block exits, calls made inside it cannot be interleaved by other threads
+        '''
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            with self._stats_lock:
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            start = time.monotonic()
+            self._lock.acquire()
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self.queue_depth -= 1
+                self.acquisitions += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._lock.release()
+
+    def submit(self, operations):
+        '''
+        Run a batch of SMBus calls as one critical section
+
+        Args:
+            operations (list): tuples of (method name, *args), e.g. ('read_byte_data', 0x6F, 0x00)
+
+        Returns:
+            list : result of each operation in order
+        '''
+        with self.transaction():
+            return [getattr(self.handle, operation[0])(*operation[1:]) for operation in operations]
+
+    def stats(self):
+        '''
+        Return queue depth and lock wait statistics for the bus, times are in seconds
+        '''
+        with self._stats_lock:
+            return {
+                'queue_depth' : self.queue_depth,
+                'max_queue_depth' : self.max_queue_depth,
+                'acquisitions' : self.acquisitions,
+                'wait_mean' : self.wait_total / self.acquisitions if self.acquisitions else 0.0,
+                'wait_max' : self.wait_max,
+            }
+
+    def read_byte(self, address):
+        with self.transaction():
+            return self.handle.read_byte(address)
+
+    def write_byte(self, address, value):
+        with self.transaction():
+            return self.handle.write_byte(address, value)
+
+    def read_byte_data(self, address, register):
+        with self.transaction():
+            return self.handle.read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value):
+        with self.transaction():
+            return self.handle.write_byte_data(address, register, value)
+
+    def read_word_data(self, address, register):
+        with self.transaction():
+            return self.handle.read_word_data(address, register)
+
+    def write_word_data(self, address, register, value):
+        with self.transaction():
+            return self.handle.write_word_data(address, register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        with self.transaction():
+            return self.handle.read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self.transaction():
+            return self.handle.write_i2c_block_data(address, register, data)
+
+    def close(self):
+        with self.transaction():
+            self.handle.close()
+
+class BusManager:
+    '''
+    Owns one handle per I2C bus number and hands out ManagedBus objects to the device drivers
+
+    Usage:
+        manager = BusManager()
+        rtc = RTC(i2c_bus = manager.bus(1))
+    '''
+
+    def __init__(self, opener = open_smbus):
+        '''
+        Initialization of BusManager class
+
+        Args:
+            opener (function): called with a bus number to open a new SMBus-like handle
+        '''
+        self.opener = opener
+        self._buses = {}
+        self._lock = threading.Lock()
+
+    def bus(self, bus_number = 1):
+        '''
+        Return the ManagedBus for bus_number, opening the handle on first use
+        '''
+        with self._lock:
+            if bus_number not in self._buses:
+                self._buses[bus_number] = ManagedBus(bus_number, self.opener(bus_number))
+            return self._buses[bus_number]
+
+    def stats(self):
+        '''
+        Return the statistics of every open bus keyed on bus number
+        '''
+        with self._lock:
+            buses = dict(self._buses)
+        return {bus_number: bus.stats() for bus_number, bus in buses.items()}
+
+    def format_stats(self):
+        '''
+        Return the bus statistics as printable text
+        '''
+        lines = ["I2C bus report:"]
+        for bus_number, stats in self.stats().items():
+            lines.append(f"  bus {bus_number}: acquisitions {stats['acquisitions']}, queue depth {stats['queue_depth']} "
+                         f"(max {stats['max_queue_depth']}), wait mean {stats['wait_mean']*1000:.3f} ms, "
+                         f"max {stats['wait_max']*1000:.3f} ms")
+        return "\n".join(lines)
+
+    def close(self):
+        '''
+        Close every open bus
+        '''
+        with self._lock:
+            buses = list(self._buses.values())
+            self._buses = {}
+        for bus in buses:
+            bus.close()
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+
+# Upper bounds in seconds of the transaction latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, float('inf'))
+
+class BusStats:
+    '''
+    Transaction counters and latency histograms per device address, register and SMBus operation
+
+    Functionality:
+    - Record count, bytes, errors and latency of every instrumented transaction
+    - Print a summary table
+    - Export in the Prometheus textfile collector format
+    '''
+
+    def __init__(self):
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def record(self, address, register, operation, length, latency, error = False):
+        key = (address, register, operation)
+        with self._lock:
+            record = self.records.get(key)
+            if record is None:
+                record = self.records[key] = {
+                    'count' : 0,
+                    'bytes' : 0,
+                    'errors' : 0,
+                    'latency_sum' : 0.0,
+                    'latency_max' : 0.0,
+                    'buckets' : [0] * len(LATENCY_BUCKETS),
+                }
+            record['count'] += 1
+            record['bytes'] += length
+            record['latency_sum'] += latency
+            record['latency_max'] = max(record['latency_max'], latency)
+            if error:
+                record['errors'] += 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    record['buckets'][index] += 1
+                    break
+
+    def snapshot(self):
+        '''
+        Return a copy of the records keyed on (address, register, operation)
+        '''
+        with self._lock:
+            return {key: dict(record, buckets=list(record['buckets'])) for key, record in self.records.items()}
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
+
+    def format_table(self):
+        '''
+        Return the records as a printable table, busiest first
+        '''
+        lines = [f"{'address':>7} {'register':>8} {'operation':<22} {'count':>7} {'bytes':>7} {'errors':>6} {'mean [ms]':>10} {'max [ms]':>9}"]
+        records = sorted(self.snapshot().items(), key=lambda item: item[1]['count'], reverse=True)
+        for (address, register, operation), record in records:
+            register_text = '-' if register is None else f"{register:#04x}"
+            lines.append(f"{address:>#7x} {register_text:>8} {operation:<22} {record['count']:>7} {record['bytes']:>7} {record['errors']:>6} "
+                         f"{record['latency_sum'] / record['count'] * 1000:>10.3f} {record['latency_max'] * 1000:>9.3f}")
+        lines.append(f"Total transactions: {sum(record['count'] for _, record in records)}, "
+                     f"bytes: {sum(record['bytes'] for _, record in records)}, errors: {sum(record['errors'] for _, record in records)}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        '''
+        Return the records in the Prometheus text exposition format
+        '''
+        records = sorted(self.snapshot().items(), key=lambda item: (item[0][0], -1 if item[0][1] is None else item[0][1], item[0][2]))
+        lines = []
+        counters = [
+            ('obc_i2c_transactions_total', 'count', 'I2C transactions'),
+            ('obc_i2c_bytes_total', 'bytes', 'Bytes transferred including the register byte'),
+            ('obc_i2c_errors_total', 'errors', 'I2C transactions that raised an error'),
+        ]
+        for name, field, help_text in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, record in records:
+                lines.append(f"{name}{{{self._labels(key)}}} {record[field]}")
+        lines.append("# HELP obc_i2c_transaction_seconds I2C transaction latency")
+        lines.append("# TYPE obc_i2c_transaction_seconds histogram")
+        for key, record in records:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, record['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"obc_i2c_transaction_seconds_bucket{{{labels},le=\"{le}\"}} {cumulative}")
+            lines.append(f"obc_i2c_transaction_seconds_sum{{{labels}}} {record['latency_sum']!r}")
+            lines.append(f"obc_i2c_transaction_seconds_count{{{labels}}} {record['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        '''
+        Atomically write the Prometheus export to path, for the node_exporter textfile collector
+        '''
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as file:
+            file.write(self.prometheus())
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _labels(key):
+        address, register, operation = key
+        register_text = '' if register is None else f"{register:#04x}"
+        return f"address=\"{address:#04x}\",register=\"{register_text}\",operation=\"{operation}\""
+
+class InstrumentedBus:
+    '''
+    Wraps an SMBus-like handle and records every transaction in a BusStats
+    '''
+
+    def __init__(self, handle, stats):
+        self.handle = handle
+        self.stats = stats
+
+    def _call(self, operation, address, register, length, *args):
+        start = time.perf_counter()
+        try:
+            result = getattr(self.handle, operation)(*args)
+        except Exception:
+            self.stats.record(address, register, operation, length, time.perf_counter() - start, error=True)
+            raise
+        self.stats.record(address, register, operation, length, time.perf_counter() - start)
+        return result
+
+    def read_byte(self, address):
+        return self._call('read_byte', address, None, 1, address)
+
+    def write_byte(self, address, value):
+        return self._call('write_byte', address, None, 1, address, value)
+
+    def read_byte_data(self, address, register):
+        return self._call('read_byte_data', address, register, 2, address, register)
+
+    def write_byte_data(self, address, register, value):
+        return self._call('write_byte_data', address, register, 2, address, register, value)
+
+    def read_word_data(self, address, register):
+        return self._call('read_word_data', address, register, 3, address, register)
+
+    def write_word_data(self, address, register, value):
+        return self._call('write_word_data', address, register, 3, address, register, value)
+
+    def read_i2c_block_data(self, address, register, length = 32):
+        return self._call('read_i2c_block_data', address, register, length + 1, address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        return self._call('write_i2c_block_data', address, register, len(data) + 1, address, register, data)
+
+    def close(self):
+        self.handle.close()
+
+def instrument(opener, stats):
+    '''
+    Wrap a bus opener (see bus_manager.get_opener) so every bus it opens records into stats
+    '''
+    return lambda bus_number: InstrumentedBus(opener(bus_number), stats)
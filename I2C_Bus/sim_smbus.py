@@ -0,0 +1,540 @@
+import binascii
+import datetime
+import errno
+import random
+import threading
+import time
+
+MAX_BLOCK_LENGTH = 32
+
+def _bcd(value):
+    return (value // 10) << 4 | value % 10
+
+def _from_bcd(value):
+    return (value >> 4) * 10 + (value & 0x0F)
+
+class SimMCP79410:
+    '''
+    Register level model of the MCP79410 RTC
+    Data Sheet: http://ww1.microchip.com/downloads/en/devicedoc/20002266h.pdf
+
+    Functionality:
+    - BCD timekeeping registers (0x00-0x06) that advance in real time while the ST bit is set
+    - OSCRUN follows ST after oscrun_delay seconds, VBATEN and PWRFAIL are stored in the wkday register
+    - ALM0/ALM1 set their ALMxIF flag when their match condition starts to hold, and mfp_output (a function, e.g.
+      PipeEdgeSource.trigger) is called when the MFP output asserts. Alarms are evaluated on every access and by update_alarms()
+    - The other control, alarm and SRAM registers (0x07-0x5F) are plain storage
+    '''
+    address = 0x6F
+    alarm_registers = (0x0A, 0x11)
+
+    def __init__(self, start = datetime.datetime(2000,1,1), running = False, oscrun_delay = 0.0, clock = time.monotonic,
+                 mfp_output = None):
+        self.clock = clock
+        self.mfp_output = mfp_output
+        self._mfp_asserted = False
+        self._alarm_checked = None #Last clock time the alarms were evaluated at
+        self.oscrun_delay = oscrun_delay
+        self.registers = bytearray(0x60)
+        self.pointer = 0
+        self._fields = [start.year, start.month, start.day, start.hour, start.minute, start.second]
+        self._weekday = start.isoweekday()
+        self._started_at = None
+        if running:
+            self.registers[0x00] = 0x80
+            self._started_at = self.clock()
+
+    @property
+    def running(self):
+        return self._started_at is not None
+
+    def now(self):
+        '''
+        Return the current time of the clock as a list of [year, month, day, hour, minute, second] and the weekday
+        '''
+        if not self.running:
+            return list(self._fields), self._weekday
+        try:
+            base = datetime.datetime(*self._fields)
+        except ValueError:
+            return list(self._fields), self._weekday #An invalid date does not advance
+        current = base + datetime.timedelta(seconds=int(self.clock() - self._started_at))
+        weekday = (self._weekday - 1 + (current.date() - base.date()).days) % 7 + 1
+        return [current.year, current.month, current.day, current.hour, current.minute, current.second], weekday
+
+    def _alarm_matches(self, alarm, current):
+        base = self.alarm_registers[alarm]
+        second, minute, hour, weekday, day, month = self.registers[base:base + 6]
+        fields = {
+            'second': current.second == _from_bcd(second & 0x7F),
+            'minute': current.minute == _from_bcd(minute & 0x7F),
+            'hour': current.hour == _from_bcd(hour & 0x3F),
+            'weekday': current.isoweekday() == weekday & 0x07,
+            'date': current.day == _from_bcd(day & 0x3F),
+            'month': current.month == _from_bcd(month & 0x1F),
+        }
+        mask = weekday >> 4 & 0x07
+        if mask == 0b111:
+            return all(fields.values())
+        return fields[('second', 'minute', 'hour', 'weekday', 'date')[mask]] if mask <= 0b100 else False
+
+    def update_alarms(self):
+        '''
+        Set the flag of every enabled alarm whose match condition started to hold since the last update, one second at a time
+        '''
+        now = self.clock()
+        if not self.running or self._alarm_checked is None:
+            self._alarm_checked = now
+            self._update_mfp()
+            return
+        try:
+            base = datetime.datetime(*self._fields)
+        except ValueError:
+            return #An invalid date does not advance
+        first = int(self._alarm_checked - self._started_at)
+        last = int(now - self._started_at)
+        self._alarm_checked = now
+        for elapsed in range(max(first, last - 86400) + 1, last + 1): #At most a day of seconds after a long gap
+            current = base + datetime.timedelta(seconds=elapsed)
+            for alarm, register in enumerate(self.alarm_registers):
+                if self.registers[0x07] & (0x10 << alarm) and self._alarm_matches(alarm, current) \
+                        and not self._alarm_matches(alarm, current - datetime.timedelta(seconds=1)):
+                    self.registers[register + 3] |= 0x08
+        self._update_mfp()
+
+    def _update_mfp(self):
+        asserted = any(self.registers[0x07] & (0x10 << alarm) and self.registers[register + 3] & 0x08
+                       for alarm, register in enumerate(self.alarm_registers))
+        if asserted and not self._mfp_asserted and self.mfp_output is not None:
+            self.mfp_output()
+        self._mfp_asserted = asserted
+
+    def _freeze(self):
+        self._fields, self._weekday = self.now()
+        if self.running:
+            self._started_at = self.clock()
+
+    def _read_register(self, register):
+        if register > 0x06:
+            return self.registers[register]
+        fields, weekday = self.now()
+        year, month, day, hour, minute, second = fields
+        if register == 0x00:
+            return self.registers[0x00] & 0x80 | _bcd(second)
+        if register == 0x01:
+            return _bcd(minute)
+        if register == 0x02:
+            return _bcd(hour)
+        if register == 0x03:
+            oscrun = self.running and self.clock() - self._started_at >= self.oscrun_delay
+            return (0x20 if oscrun else 0) | self.registers[0x03] & 0x18 | weekday
+        if register == 0x04:
+            return _bcd(day)
+        if register == 0x05:
+            leap_year = year % 4 == 0
+            return (0x20 if leap_year else 0) | _bcd(month)
+        return _bcd(year - 2000)
+
+    def read(self, register, length):
+        self.update_alarms()
+        data = [self._read_register((register + offset) % len(self.registers)) for offset in range(length)]
+        self.pointer = (register + length) % len(self.registers)
+        return data
+
+    def write(self, register, data):
+        self.update_alarms()
+        self._freeze()
+        was_running = self.running
+        for offset, value in enumerate(data):
+            address = (register + offset) % len(self.registers)
+            if address == 0x00:
+                self.registers[0x00] = value & 0x80
+                self._fields[5] = _from_bcd(value & 0x7F)
+            elif address == 0x01:
+                self._fields[4] = _from_bcd(value & 0x7F)
+            elif address == 0x02:
+                self._fields[3] = _from_bcd(value & 0x3F)
+            elif address == 0x03:
+                self.registers[0x03] = value & 0x18 #OSCRUN is read only
+                self._weekday = value & 0x07
+            elif address == 0x04:
+                self._fields[2] = _from_bcd(value & 0x3F)
+            elif address == 0x05:
+                self._fields[1] = _from_bcd(value & 0x1F) #LPYR is read only
+            elif address == 0x06:
+                self._fields[0] = _from_bcd(value) + 2000
+            else:
+                self.registers[address] = value
+        self.pointer = (register + len(data)) % len(self.registers)
+        if self.registers[0x00] & 0x80 and not was_running:
+            self._started_at = self.clock()
+        elif not self.registers[0x00] & 0x80:
+            self._started_at = None
+        self._update_mfp()
+
+class SimMCP79410EEPROM:
+    '''
+    Model of the 1 Kbit EEPROM of the MCP79410, a separate I2C slave (0x57) in the same package
+
+    Functionality:
+    - 128 bytes, sequential reads wrap around the whole array
+    - Page writes of up to 8 bytes, bytes past the end of a page wrap to its start like on the device
+    - Every write starts a write cycle of write_time seconds during which the device does not acknowledge (OSError),
+      which the host detects by ACK polling
+    '''
+    address = 0x57
+    size = 0x80
+    page_size = 8
+
+    def __init__(self, write_time = 0.005, clock = time.monotonic):
+        self.clock = clock
+        self.write_time = write_time
+        self.data = bytearray([0xFF] * self.size) #Erased EEPROM reads as 0xFF
+        self.pointer = 0
+        self.busy_until = 0.0
+        self.write_cycles = 0
+        self.page_writes = [0] * (self.size // self.page_size) #Write cycles per page, for wear checks
+
+    def _check_busy(self):
+        if self.clock() < self.busy_until:
+            raise OSError(errno.EREMOTEIO, "EEPROM write cycle in progress")
+
+    def read(self, register, length):
+        self._check_busy()
+        data = [self.data[(register + offset) % self.size] for offset in range(length)]
+        self.pointer = (register + length) % self.size
+        return data
+
+    def write(self, register, data):
+        self._check_busy()
+        register %= self.size
+        page_start = register - register % self.page_size
+        for offset, value in enumerate(data):
+            self.data[page_start + (register - page_start + offset) % self.page_size] = value
+        self.pointer = register % self.size
+        self.busy_until = self.clock() + self.write_time
+        self.write_cycles += 1
+        self.page_writes[page_start // self.page_size] += 1
+
+class SimMCP9808:
+    '''
+    Register level model of the MCP9808 temperature sensor
+    Data Sheet: https://ww1.microchip.com/downloads/en/DeviceDoc/25095A.pdf
+
+    Set the temperature attribute to change the ambient temperature reported by the sensor. The ambient register reports the
+    critical, upper and lower flags, and alert_output (a function, e.g. PipeEdgeSource.trigger) is called when the enabled
+    Alert output asserts.
+    '''
+    address = 0x18
+
+    def __init__(self, temperature = 20.0, alert_output = None):
+        self.alert_output = alert_output
+        self._alert_asserted = False
+        self._interrupt_latched = False
+        self.words = {
+            0x01 : 0x0000, #config
+            0x02 : 0x0000, #t_upper
+            0x03 : 0x0000, #t_lower
+            0x04 : 0x0000, #t_crit
+            0x06 : 0x0054, #manufacture_id
+            0x07 : 0x0400, #device_id
+        }
+        self.resolution = 0x03
+        self.pointer = 0x05
+        self.temperature = temperature
+
+    @property
+    def temperature(self):
+        return self._temperature
+
+    @temperature.setter
+    def temperature(self, value):
+        self._temperature = value
+        self._update_alert()
+
+    @staticmethod
+    def _limit(word):
+        value = word & 0x1FFF
+        return value - 0x2000 if value & 0x1000 else value
+
+    def _flags(self):
+        ambient = int(round(self.temperature * 16))
+        return (ambient >= self._limit(self.words[0x04]),
+                ambient > self._limit(self.words[0x02]),
+                ambient < self._limit(self.words[0x03]))
+
+    def _update_alert(self):
+        config = self.words[0x01]
+        critical, upper, lower = self._flags()
+        condition = critical if config & 0x0004 else critical or upper or lower
+        if config & 0x0001 and condition and not self._alert_asserted:
+            self._interrupt_latched = True
+        asserted = bool(config & 0x0008) and (self._interrupt_latched if config & 0x0001 else condition)
+        if asserted and not self._alert_asserted and self.alert_output is not None:
+            self.alert_output()
+        self._alert_asserted = asserted
+
+    def _ambient(self):
+        critical, upper, lower = self._flags()
+        return critical << 15 | upper << 14 | lower << 13 | int(round(self.temperature * 16)) & 0x1FFF
+
+    def _read_bytes(self, register):
+        if register == 0x05:
+            word = self._ambient()
+        elif register == 0x08:
+            return [self.resolution]
+        else:
+            word = self.words.get(register, 0)
+        return [word >> 8, word & 0xFF]
+
+    def read(self, register, length):
+        self.pointer = register
+        data = self._read_bytes(register)
+        return (data + [0] * length)[:length]
+
+    def write(self, register, data):
+        self.pointer = register
+        if register == 0x08:
+            if data:
+                self.resolution = data[0] & 0x03
+        elif register in (0x01, 0x02, 0x03, 0x04) and len(data) >= 2:
+            word = data[0] << 8 | data[1]
+            if register == 0x01:
+                if word & 0x0020:
+                    self._interrupt_latched = False #Interrupt clear
+                word &= ~0x0030 & 0xFFFF #Alert status and interrupt clear read as 0
+            else:
+                word &= 0x1FFC #Limit registers have 0.25 C resolution
+            self.words[register] = word
+            self._update_alert()
+
+class SimSTM32:
+    '''
+    Model of the STM32 peripheral handshake used by STM32/stm32.py
+
+    The host writes a WRITE (0x2) or READ (0x3) command byte, then either a block starting with BAD_BYTE (0x0) followed by the data,
+    or reads a block whose first two bytes are padding. Received data is echoed back on the next read and kept in received.
+    A single byte read after a command returns the status byte, READY (0x1) once ready_delay seconds have passed.
+
+    Framed transfers (STM32/framed_transport.py) use their own command registers, every frame is one block:
+    seq, flags, length, payload, CRC-16/CCITT (big endian) of the header and payload.
+    - FRAME (0x10): the host writes a frame, frames that fail the CRC or are out of sequence are dropped (go-back-N)
+    - ACK (0x11): the host reads [next expected seq, messages received], or writes [next expected seq] to acknowledge
+      the frames it read and rewind the send pointer to the first missing one
+    - READ_FRAME (0x12): the host reads the next frame of the queued messages, an IDLE frame when there is none
+    - RESET (0x13): restart both sequence numbers and drop any partial messages
+    corrupt_rate flips a bit in that fraction of the frames in either direction.
+    '''
+    address = 0x15
+    defined_bits = {
+        'BAD_BYTE' : 0x0,
+        'READY' : 0x1,
+        'WRITE' : 0x2,
+        'READ' : 0x3,
+    }
+    frame_registers = {
+        'FRAME' : 0x10,
+        'ACK' : 0x11,
+        'READ_FRAME' : 0x12,
+        'RESET' : 0x13,
+    }
+    frame_flags = {
+        'START' : 0x01,
+        'END' : 0x02,
+        'IDLE' : 0x04,
+    }
+    max_frame_payload = 27 #A 32 byte block less the 3 byte header and 2 byte CRC
+
+    def __init__(self, outbox = None, ready_delay = 0.0, clock = time.monotonic, corrupt_rate = 0.0, seed = None):
+        self.mode = None
+        self.inbox = []
+        self.received = [] #Every data block received, in order
+        self.outbox = list(outbox or [])
+        self.pointer = 0
+        self.ready_delay = ready_delay
+        self.clock = clock
+        self.command_time = None
+        self.status_polls = 0
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+        self.messages = [] #Framed messages received from the host
+        self.crc_errors = 0
+        self._reset_frames()
+
+    def _reset_frames(self):
+        self.rx_expected = 0
+        self.rx_chunks = []
+        self.tx_seq = 0 #Sequence number of tx_frames[0]
+        self.tx_frames = []
+        self.tx_next = 0
+
+    def _corrupt(self, data):
+        if self.corrupt_rate and data and self.random.random() < self.corrupt_rate:
+            data = list(data)
+            data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+        return data
+
+    @staticmethod
+    def _frame(seq, flags, payload):
+        body = bytes([seq, flags, len(payload)]) + bytes(payload)
+        return list(body + binascii.crc_hqx(body, 0xFFFF).to_bytes(2, 'big'))
+
+    def queue_message(self, data):
+        '''
+        Queue data to be read by the host as framed message
+        '''
+        size = self.max_frame_payload
+        chunks = [data[i:i + size] for i in range(0, len(data), size)] or [b'']
+        for index, chunk in enumerate(chunks):
+            flags = (self.frame_flags['START'] if index == 0 else 0) | (self.frame_flags['END'] if index == len(chunks) - 1 else 0)
+            seq = (self.tx_seq + len(self.tx_frames)) & 0xFF
+            self.tx_frames.append(self._frame(seq, flags, chunk))
+
+    def _receive_frame(self, data):
+        data = self._corrupt(data)
+        if len(data) < 5 or data[2] > len(data) - 5:
+            self.crc_errors += 1
+            return
+        end = 3 + data[2]
+        if binascii.crc_hqx(bytes(data[:end]), 0xFFFF) != int.from_bytes(bytes(data[end:end + 2]), 'big'):
+            self.crc_errors += 1
+            return
+        if data[0] != self.rx_expected:
+            return
+        self.rx_expected = (self.rx_expected + 1) & 0xFF
+        if data[1] & self.frame_flags['START']:
+            self.rx_chunks = []
+        self.rx_chunks.append(bytes(data[3:end]))
+        if data[1] & self.frame_flags['END']:
+            self.messages.append(b''.join(self.rx_chunks))
+            self.rx_chunks = []
+
+    def _acknowledge(self, expected):
+        acked = (expected - self.tx_seq) & 0xFF
+        if acked <= len(self.tx_frames):
+            del self.tx_frames[:acked]
+            self.tx_seq = expected
+        self.tx_next = 0 #Resend everything not acknowledged
+
+    def _read_frame(self):
+        if self.tx_next >= len(self.tx_frames):
+            return self._frame(self.tx_seq + len(self.tx_frames) & 0xFF, self.frame_flags['IDLE'], b'')
+        frame = self.tx_frames[self.tx_next]
+        self.tx_next += 1
+        return self._corrupt(frame)
+
+    def read(self, register, length):
+        if register == self.frame_registers['ACK']:
+            return ([self.rx_expected, len(self.messages) & 0xFF] + [0] * length)[:length]
+        if register == self.frame_registers['READ_FRAME']:
+            return (self._read_frame() + [0] * length)[:length]
+        if length == 1 and self.mode is not None:
+            self.status_polls += 1
+            ready = self.clock() - self.command_time >= self.ready_delay
+            return [self.defined_bits['READY'] if ready else self.defined_bits['BAD_BYTE']]
+        self.mode = None
+        return ([self.defined_bits['BAD_BYTE']] * 2 + self.outbox + [0] * length)[:length]
+
+    def write(self, register, data):
+        if register == self.frame_registers['FRAME']:
+            self._receive_frame(data)
+        elif register == self.frame_registers['ACK']:
+            self._acknowledge(data[0])
+        elif register == self.frame_registers['RESET']:
+            self._reset_frames()
+        elif self.mode == 'WRITE' and data and data[0] == self.defined_bits['BAD_BYTE']:
+            self.inbox = list(data[1:])
+            self.received.append(list(self.inbox))
+            self.outbox = list(self.inbox)
+            self.mode = None
+        elif list(data) == [self.defined_bits['WRITE']]:
+            self.mode = 'WRITE'
+            self.command_time = self.clock()
+        elif list(data) == [self.defined_bits['READ']]:
+            self.mode = 'READ'
+            self.command_time = self.clock()
+
+class SimSMBus:
+    '''
+    Drop in replacement for smbus.SMBus backed by simulated devices
+
+    Functionality:
+    - MCP79410 at 0x6F (its EEPROM at 0x57), MCP9808 at 0x18 and the STM32 handshake at 0x15 by default
+    - Per transaction latency: latency seconds plus byte_time seconds per data byte
+    - Fault injection: random faults with fault_rate, or fail_next() to fail the next transactions
+    - Missing devices and faults raise OSError like a NACK on real hardware
+    '''
+
+    def __init__(self, bus = 1, devices = None, latency = 0.0, byte_time = 0.0, fault_rate = 0.0, seed = None):
+        self.bus_number = bus
+        if devices is None:
+            devices = [SimMCP79410(), SimMCP79410EEPROM(), SimMCP9808(), SimSTM32()]
+        self.devices = {device.address: device for device in devices}
+        self.latency = latency
+        self.byte_time = byte_time
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.transaction_count = 0
+        self._pending_faults = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, count = 1, address = None):
+        '''
+        Make the next count transactions (to address, or to any address when None) raise OSError
+        '''
+        with self._lock:
+            self._pending_faults.extend([address] * count)
+
+    def _transaction(self, address, length):
+        with self._lock:
+            self.transaction_count += 1
+            for index, fault_address in enumerate(self._pending_faults):
+                if fault_address is None or fault_address == address:
+                    del self._pending_faults[index]
+                    raise OSError(errno.EIO, "Simulated bus fault")
+            if self.fault_rate and self.random.random() < self.fault_rate:
+                raise OSError(errno.EIO, "Simulated bus fault")
+        delay = self.latency + self.byte_time * length
+        if delay > 0:
+            time.sleep(delay)
+        if address not in self.devices:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        return self.devices[address]
+
+    @staticmethod
+    def _check_block(data):
+        if not 1 <= len(data) <= MAX_BLOCK_LENGTH:
+            raise OverflowError(f"Third argument must be a list of at least one, but not more than {MAX_BLOCK_LENGTH} integers")
+
+    def read_byte(self, address):
+        device = self._transaction(address, 1)
+        return device.read(device.pointer, 1)[0]
+
+    def write_byte(self, address, value):
+        device = self._transaction(address, 1)
+        device.pointer = value
+
+    def read_byte_data(self, address, register):
+        return self._transaction(address, 2).read(register, 1)[0]
+
+    def write_byte_data(self, address, register, value):
+        self._transaction(address, 2).write(register, [value & 0xFF])
+
+    def read_word_data(self, address, register):
+        data = self._transaction(address, 3).read(register, 2)
+        return data[1] << 8 | data[0] #SMBus words are little endian
+
+    def write_word_data(self, address, register, value):
+        self._transaction(address, 3).write(register, [value & 0xFF, value >> 8 & 0xFF])
+
+    def read_i2c_block_data(self, address, register, length = MAX_BLOCK_LENGTH):
+        if not 1 <= length <= MAX_BLOCK_LENGTH:
+            raise OverflowError(f"Length must be between 1 and {MAX_BLOCK_LENGTH}")
+        return self._transaction(address, length + 1).read(register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        self._check_block(data)
+        self._transaction(address, len(data) + 1).write(register, list(data))
+
+    def close(self):
+        pass
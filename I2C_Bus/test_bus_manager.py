@@ -0,0 +1,69 @@
+import threading
+import time
+from bus_manager import BusManager
+
+class RecordingBus:
+    '''SMBus stand in that records which thread made each call'''
+    def __init__(self, bus_number):
+        self.bus_number = bus_number
+        self.calls = []
+        self.closed = False
+
+    def read_byte_data(self, address, register):
+        self.calls.append(threading.get_ident())
+        time.sleep(0.001)
+        return register
+
+    def write_byte_data(self, address, register, value):
+        self.calls.append(threading.get_ident())
+        time.sleep(0.001)
+
+    def close(self):
+        self.closed = True
+
+def test_one_handle_per_bus_number():
+    opened = []
+    manager = BusManager(lambda bus_number: opened.append(bus_number) or RecordingBus(bus_number))
+    assert manager.bus(1) is manager.bus(1)
+    assert manager.bus(0) is not manager.bus(1)
+    assert opened == [1,0]
+
+def test_submit_is_one_critical_section():
+    manager = BusManager(RecordingBus)
+    bus = manager.bus(1)
+    batch = [('read_byte_data',0x6F,register) for register in range(5)]
+    results = []
+
+    def worker():
+        results.append(bus.submit(batch))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [[0,1,2,3,4]]*4
+    calls = bus.handle.calls
+    for start in range(0,len(calls),5):
+        assert len(set(calls[start:start+5])) == 1 #Batches never interleave
+    stats = manager.stats()[1]
+    assert stats['acquisitions'] == 4
+    assert stats['queue_depth'] == 0
+    assert stats['max_queue_depth'] >= 1
+    assert stats['wait_max'] >= stats['wait_mean'] >= 0
+
+def test_transaction_is_reentrant():
+    manager = BusManager(RecordingBus)
+    bus = manager.bus(1)
+    with bus.transaction():
+        bus.write_byte_data(0x6F,0x00,0x80)
+        assert bus.read_byte_data(0x6F,0x03) == 0x03
+    assert bus.stats()['acquisitions'] == 1
+
+def test_close():
+    manager = BusManager(RecordingBus)
+    handle = manager.bus(1).handle
+    manager.close()
+    assert handle.closed
+    assert manager.bus(1).handle is not handle
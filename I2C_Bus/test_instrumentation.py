@@ -0,0 +1,32 @@
+import pytest
+from sim_smbus import SimSMBus
+from instrumentation import BusStats, InstrumentedBus
+
+def test_counts_bytes_and_errors():
+    stats = BusStats()
+    bus = InstrumentedBus(SimSMBus(), stats)
+    bus.read_i2c_block_data(0x6F,0x00,7)
+    bus.read_i2c_block_data(0x6F,0x00,7)
+    bus.write_byte_data(0x6F,0x03,0x08)
+    with pytest.raises(OSError):
+        bus.read_byte_data(0x50,0x00)
+
+    records = stats.snapshot()
+    assert records[(0x6F,0x00,'read_i2c_block_data')]['count'] == 2
+    assert records[(0x6F,0x00,'read_i2c_block_data')]['bytes'] == 16
+    assert records[(0x6F,0x03,'write_byte_data')]['count'] == 1
+    assert records[(0x50,0x00,'read_byte_data')]['errors'] == 1
+    assert sum(records[(0x6F,0x00,'read_i2c_block_data')]['buckets']) == 2
+
+def test_prometheus_textfile(tmp_path):
+    stats = BusStats()
+    bus = InstrumentedBus(SimSMBus(), stats)
+    bus.read_i2c_block_data(0x18,0x05,2)
+    path = tmp_path / "obc.prom"
+    stats.write_textfile(str(path))
+    text = path.read_text()
+    labels = 'address="0x18",register="0x05",operation="read_i2c_block_data"'
+    assert f'obc_i2c_transactions_total{{{labels}}} 1' in text
+    assert f'obc_i2c_bytes_total{{{labels}}} 3' in text
+    assert f'obc_i2c_transaction_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f'obc_i2c_transaction_seconds_count{{{labels}}} 1' in text
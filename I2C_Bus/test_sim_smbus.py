@@ -0,0 +1,50 @@
+import datetime
+import time
+import pytest
+from sim_smbus import SimSMBus, SimMCP79410
+
+def test_rtc_advances_while_running():
+    now = [0.0]
+    bus = SimSMBus(devices=[SimMCP79410(datetime.datetime(2023,2,5,0,15,59),running=True,clock=lambda: now[0])])
+    assert bus.read_i2c_block_data(0x6F,0x00,7) == [0x80|0x59,0x15,0x00,0x20|0x7,0x05,0x02,0x23]
+    now[0] = 1.5
+    assert bus.read_i2c_block_data(0x6F,0x00,7) == [0x80,0x16,0x00,0x20|0x7,0x05,0x02,0x23]
+
+def test_rtc_stops_when_st_cleared():
+    now = [0.0]
+    bus = SimSMBus(devices=[SimMCP79410(running=True,clock=lambda: now[0])])
+    bus.write_byte_data(0x6F,0x00,0x00)
+    now[0] = 10
+    assert bus.read_byte_data(0x6F,0x00) == 0x00
+    assert bus.read_byte_data(0x6F,0x03) & 0x20 == 0 #OSCRUN clear
+
+def test_missing_device():
+    bus = SimSMBus()
+    with pytest.raises(OSError):
+        bus.read_byte_data(0x50,0x00)
+
+def test_fail_next():
+    bus = SimSMBus()
+    bus.fail_next(1,address=0x18)
+    bus.read_byte_data(0x6F,0x00)
+    with pytest.raises(OSError):
+        bus.read_i2c_block_data(0x18,0x05,2)
+    assert bus.read_i2c_block_data(0x18,0x05,2) == [0xC1,0x40] #20 C, above the critical and upper limits (0 C)
+
+def test_latency():
+    bus = SimSMBus(latency=0.01)
+    start = time.monotonic()
+    bus.read_byte_data(0x6F,0x00)
+    assert time.monotonic() - start >= 0.01
+
+def test_block_limit():
+    bus = SimSMBus()
+    with pytest.raises(OverflowError):
+        bus.write_i2c_block_data(0x15,0x00,[0]*33)
+
+def test_stm32_echo():
+    bus = SimSMBus()
+    bus.write_i2c_block_data(0x15,0,[0x2])
+    bus.write_i2c_block_data(0x15,0,[0x0,5,7,21,8])
+    bus.write_i2c_block_data(0x15,0,[0x3])
+    assert bus.read_i2c_block_data(0x15,0,6)[2:] == [5,7,21,8]
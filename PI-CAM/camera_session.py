@@ -0,0 +1,349 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+class Frame:
+    '''
+    One captured image
+
+    Attributes:
+        index (int): capture number within the session
+        timestamp (datetime): wall clock time of the capture
+        data (bytes): encoded image
+        extension (str): file extension of the encoding, e.g. 'jpg'
+        path (str): file the frame was written to, set by the writer thread
+        hash (int): perceptual hash, set when the session has a FrameDeduplicator (see frame_dedup.py)
+        duplicate_of (int): index of the earlier frame a demoted duplicate matched
+    '''
+    __slots__ = ('index', 'timestamp', 'data', 'extension', 'path', 'hash', 'duplicate_of')
+
+    def __init__(self, index, timestamp, data, extension):
+        self.index = index
+        self.timestamp = timestamp
+        self.data = data
+        self.extension = extension
+        self.path = None
+        self.hash = None
+        self.duplicate_of = None
+
+class PiCameraBackend:
+    '''
+    Frames from a Raspberry Pi camera through picamera
+
+    The camera is opened once, left to settle for settle_time seconds and then, with lock_exposure, has its shutter speed,
+    gains and white balance fixed so every frame of a burst is exposed the same way. Frames are JPEGs captured from the
+    video port, which skips the mode switch and warm-up of a still capture.
+    '''
+    extension = 'jpg'
+
+    def __init__(self, camera = None, resolution = None, framerate = None, settle_time = 2, lock_exposure = True):
+        '''
+        Initialization of PiCameraBackend class
+
+        Args:
+            camera (PiCamera): camera that is already open (e.g. PiCam.camera), opened on open() if not given
+            resolution (tuple): (width, height), the camera default if not given
+            framerate (int): sensor frame rate, an upper bound on the continuous capture rate
+            settle_time (float): seconds for the automatic exposure and white balance to settle
+            lock_exposure (bool): fix exposure and white balance after settling
+        '''
+        self.camera = camera
+        self.resolution = resolution
+        self.framerate = framerate
+        self.settle_time = settle_time
+        self.lock_exposure = lock_exposure
+
+    def open(self):
+        if self.camera is None:
+            from picamera import PiCamera
+            self.camera = PiCamera()
+        if self.resolution is not None:
+            self.camera.resolution = self.resolution
+        if self.framerate is not None:
+            self.camera.framerate = self.framerate
+        time.sleep(self.settle_time)
+        if self.lock_exposure:
+            self.camera.shutter_speed = self.camera.exposure_speed
+            self.camera.exposure_mode = 'off'
+            gains = self.camera.awb_gains
+            self.camera.awb_mode = 'off'
+            self.camera.awb_gains = gains
+
+    def frames(self):
+        import io
+        stream = io.BytesIO()
+        for _ in self.camera.capture_continuous(stream, format='jpeg', use_video_port=True):
+            yield stream.getvalue()
+            stream.seek(0)
+            stream.truncate()
+
+    def close(self):
+        self.camera.close()
+
+class SyntheticBackend:
+    '''
+    Frames generated with NumPy, for tests and benchmarks without a camera
+
+    Frames are binary PPM images (readable by PIL and most viewers). scene(index) returns the RGB uint8 array of a frame,
+    by default a gradient that drifts one pixel per frame with a little sensor noise.
+    '''
+    extension = 'ppm'
+
+    def __init__(self, resolution = (320, 240), scene = None, settle_time = 0.0, capture_time = 0.0, seed = 0):
+        '''
+        Initialization of SyntheticBackend class
+
+        Args:
+            resolution (tuple): (width, height)
+            scene (function): index -> (height, width, 3) uint8 array
+            settle_time (float): seconds open() takes, like the camera warm-up
+            capture_time (float): seconds each frame takes
+        '''
+        self.resolution = resolution
+        self.scene = scene
+        self.settle_time = settle_time
+        self.capture_time = capture_time
+        self.seed = seed
+        self.opened = 0
+        self.closed = 0
+
+    def open(self):
+        self.opened += 1
+        time.sleep(self.settle_time)
+
+    def _default_scene(self, index):
+        import numpy as np
+        width, height = self.resolution
+        x = np.arange(width)[None, :] + index
+        y = np.arange(height)[:, None]
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[..., 0] = (x * 255 // max(width, 1)) % 256
+        image[..., 1] = (y * 255 // max(height, 1))
+        image[..., 2] = ((x + y) * 2) % 256
+        noise = np.random.default_rng(self.seed + index).integers(0, 4, image.shape, dtype=np.uint8)
+        return image + noise
+
+    @staticmethod
+    def encode(image):
+        '''
+        Return the binary PPM encoding of an RGB uint8 array
+        '''
+        height, width = image.shape[:2]
+        return b'P6 %d %d 255\n' % (width, height) + image.tobytes()
+
+    def frames(self):
+        index = 0
+        while True:
+            if self.capture_time:
+                time.sleep(self.capture_time)
+            image = self.scene(index) if self.scene else self._default_scene(index)
+            yield self.encode(image)
+            index += 1
+
+    def close(self):
+        self.closed += 1
+
+class CameraSession:
+    '''
+    Camera kept open between captures, with frames written to disk by a background thread
+
+    Functionality:
+    - Open and settle the camera once, then take any number of shots, bursts or continuous captures
+    - Bounded queue between capture and the writer thread, so slow storage never stalls the camera for long
+    - Continuous capture at a target rate, frames that do not fit in the queue are dropped and counted
+    - Pluggable backend (PiCameraBackend, SyntheticBackend, ...) with open(), frames() and close()
+    - Optional near duplicate filter, duplicates are dropped before queueing or written to output_dir/demoted
+    '''
+
+    def __init__(self, backend, output_dir, queue_size = 8, prefix = 'image', on_write = None, dedup = None):
+        '''
+        Initialization of CameraSession class
+
+        Args:
+            backend: frame source with open(), frames() and close() and an extension attribute
+            output_dir (str): directory the frames are written to, created if missing
+            queue_size (int): frames waiting to be written before capture blocks (burst) or drops (continuous)
+            prefix (str): file name prefix, files are named {prefix}_{UTC timestamp}_{index}.{extension}
+            on_write (function): called with each Frame from the writer thread once it is on disk,
+                e.g. to feed a CompressionPipeline queue. Exceptions it raises are printed and counted in callback_errors
+            dedup (FrameDeduplicator): checks every frame of a burst or continuous capture against recent frames
+        '''
+        self.backend = backend
+        self.output_dir = os.path.expanduser(output_dir)
+        self.prefix = prefix
+        self.on_write = on_write
+        self.dedup = dedup
+        self.queue = queue.Queue(queue_size)
+        self.stats = {'captured': 0, 'written': 0, 'dropped': 0, 'deduplicated': 0, 'write_errors': 0, 'callback_errors': 0,
+                      'bytes_written': 0, 'warmup_time': 0.0, 'capture_time': 0.0, 'write_time': 0.0}
+        self._frames = None
+        self._writer = None
+        self._index = 0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    @property
+    def is_open(self):
+        return self._frames is not None
+
+    def open(self):
+        '''
+        Open the backend and start the writer thread, the warm-up is only paid here
+        '''
+        if self.is_open:
+            return self
+        os.makedirs(self.output_dir, exist_ok=True)
+        start = time.monotonic()
+        self.backend.open()
+        self._frames = self.backend.frames()
+        self.stats['warmup_time'] = time.monotonic() - start
+        self._writer = threading.Thread(target=self._write_frames, name='camera-writer', daemon=True)
+        self._writer.start()
+        return self
+
+    def close(self):
+        '''
+        Write the frames still queued, stop the writer thread and close the backend
+        '''
+        if not self.is_open:
+            return
+        self.queue.put(None)
+        self._writer.join()
+        self._frames.close()
+        self._frames = None
+        self.backend.close()
+
+    def flush(self):
+        '''
+        Block until every queued frame has been written
+        '''
+        self.queue.join()
+
+    def _write_frames(self):
+        while True:
+            frame = self.queue.get()
+            try:
+                if frame is None:
+                    return
+                start = time.monotonic()
+                name = f"{self.prefix}_{frame.timestamp:%Y%m%dT%H%M%S.%f}_{frame.index:05d}.{frame.extension}"
+                directory = self.output_dir if frame.duplicate_of is None else os.path.join(self.output_dir, 'demoted')
+                path = os.path.join(directory, name)
+                try:
+                    if frame.duplicate_of is not None:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(path + '.tmp', 'wb') as file:
+                        file.write(frame.data)
+                    os.replace(path + '.tmp', path) #Readers of output_dir never see a partial image
+                except OSError as error:
+                    self.stats['write_errors'] += 1
+                    print(f"Unable to write {path}: {error}", flush=True)
+                else:
+                    frame.path = path
+                    self.stats['written'] += 1
+                    self.stats['bytes_written'] += len(frame.data)
+                self.stats['write_time'] += time.monotonic() - start
+                if frame.path is not None and self.on_write is not None:
+                    try:
+                        self.on_write(frame)
+                    except Exception as error:
+                        self.stats['callback_errors'] += 1 #Keep draining the queue, burst() would block on a dead writer
+                        print(f"on_write failed for {frame.path}: {error}", flush=True)
+            finally:
+                self.queue.task_done()
+
+    def capture(self):
+        '''
+        Capture one frame without queueing it
+
+        Raises:
+            RuntimeError: "Camera session is not open"
+        '''
+        if not self.is_open:
+            raise RuntimeError("Camera session is not open")
+        start = time.monotonic()
+        data = next(self._frames)
+        self.stats['capture_time'] += time.monotonic() - start
+        self.stats['captured'] += 1
+        frame = Frame(self._index, datetime.now(timezone.utc), data, self.backend.extension)
+        self._index += 1
+        return frame
+
+    def _keep(self, frame):
+        # Frames dropped by the dedup filter are never queued
+        if self.dedup is None or self.dedup.check(frame):
+            return True
+        self.stats['deduplicated'] += 1
+        return False
+
+    def burst(self, count):
+        '''
+        Capture count frames back to back and queue them for writing, waiting for queue space when storage is slower
+
+        Returns:
+            list : the captured Frames not dropped as duplicates, their path is set once written (see flush())
+        '''
+        frames = []
+        for _ in range(count):
+            frame = self.capture()
+            if not self._keep(frame):
+                continue
+            self.queue.put(frame)
+            frames.append(frame)
+        return frames
+
+    def continuous(self, rate, duration = None, count = None, stop_event = None):
+        '''
+        Capture at rate frames per second until duration seconds, count captures or stop_event is set
+
+        Captures are started on a fixed grid so the rate does not drift, a capture that runs late skips the missed slots.
+        Frames arriving while the queue is full are dropped rather than delaying the next capture.
+
+        Returns:
+            list : the captured Frames that were queued for writing
+        '''
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+        if duration is None and count is None and stop_event is None:
+            raise ValueError("continuous capture needs a duration, count or stop_event")
+        period = 1 / rate
+        start = time.monotonic()
+        frames = []
+        captured = 0
+        slot = 0
+        while count is None or captured < count:
+            deadline = start + slot * period
+            if duration is not None and deadline >= start + duration:
+                break
+            delay = deadline - time.monotonic()
+            if stop_event is not None:
+                if stop_event.wait(max(delay, 0)):
+                    break
+            elif delay > 0:
+                time.sleep(delay)
+            frame = self.capture()
+            captured += 1
+            if self._keep(frame):
+                try:
+                    self.queue.put_nowait(frame)
+                    frames.append(frame)
+                except queue.Full:
+                    self.stats['dropped'] += 1
+            slot = max(slot + 1, int((time.monotonic() - start) / period) + 1)
+        return frames
+
+    def format_stats(self):
+        stats = self.stats
+        captured = stats['captured']
+        capture_ms = stats['capture_time'] / captured * 1000 if captured else 0.0
+        write_ms = stats['write_time'] / stats['written'] * 1000 if stats['written'] else 0.0
+        return (f"Camera session: warm-up {stats['warmup_time']:.3f} s, {captured} captured ({capture_ms:.2f} ms each), "
+                f"{stats['written']} written ({write_ms:.2f} ms each, {stats['bytes_written']} bytes), "
+                f"{stats['dropped']} dropped, {stats['deduplicated']} duplicates dropped, {stats['write_errors']} write errors, "
+                f"{stats['callback_errors']} callback errors")
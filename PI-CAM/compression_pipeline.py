@@ -0,0 +1,258 @@
+'''
+Parallel compression of captured images into downlink products
+
+Usage:
+    python compression_pipeline.py ~/images [--output ~/images/products] [--budget 20000] [--workers 4] [--deadline 600]
+
+Every image becomes one file per product (see PRODUCTS): a small thumbnail, a downlink image searched to fit a byte budget
+and a full resolution archive copy. Images are processed in a process pool, and with a deadline (e.g. the seconds until the
+next ground contact) images not started in time are left for the next pass.
+'''
+import argparse
+import concurrent.futures
+import glob
+import io
+import os
+import time
+
+# Product name: options
+#   thumbnail: max_size (width, height) keeping the aspect ratio, quality
+#   budget: target size in bytes, quality and scale are searched (see fit_budget)
+#   archive: quality at full resolution
+PRODUCTS = {
+    'thumbnail' : {'max_size': (160, 120), 'quality': 70},
+    'downlink' : {'budget': 20000, 'min_quality': 20, 'max_quality': 90, 'scale_quality': 60, 'min_scale': 0.1},
+    'archive' : {'quality': 95},
+}
+SCALE_STEPS = 64 #Resolution of the scale search, scales are multiples of 1/SCALE_STEPS
+
+def _search(low, high, fits):
+    # Return the highest value in [low, high] for which fits(value) is True, or None
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best = middle
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+def fit_budget(encode, budget, min_quality = 20, max_quality = 90, scale_quality = 60, min_scale = 0.1):
+    '''
+    Find the encoding that best uses a byte budget
+
+    Full resolution is kept while the image fits at scale_quality or better, searching the highest quality that fits.
+    Otherwise the largest scale that fits at scale_quality is searched, and if even min_scale does not fit, the highest
+    quality down to min_quality at min_scale. Every step is a binary search, so an image takes about 15 encodes at most.
+
+    Args:
+        encode (function): (quality, scale) -> encoded bytes
+        budget (int): target size in bytes
+
+    Returns:
+        dict : data, quality, scale, size, fits (False if nothing fits, data is then the smallest encoding tried), encodes
+    '''
+    results = {}
+
+    def fits(quality, scale):
+        if (quality, scale) not in results:
+            results[quality, scale] = encode(quality, scale)
+        return len(results[quality, scale]) <= budget
+
+    def result(quality, scale, fit = True):
+        data = results[quality, scale]
+        return {'data': data, 'quality': quality, 'scale': scale, 'size': len(data), 'fits': fit, 'encodes': len(results)}
+
+    scale_quality = max(min_quality, min(scale_quality, max_quality))
+    if fits(scale_quality, 1.0):
+        quality = _search(scale_quality, max_quality, lambda quality: fits(quality, 1.0))
+        return result(quality, 1.0)
+    min_step = max(1, int(round(min_scale * SCALE_STEPS)))
+    step = _search(min_step, SCALE_STEPS - 1, lambda step: fits(scale_quality, step / SCALE_STEPS))
+    if step is not None:
+        return result(scale_quality, step / SCALE_STEPS)
+    scale = min_step / SCALE_STEPS
+    quality = _search(min_quality, scale_quality - 1, lambda quality: fits(quality, scale))
+    if quality is not None:
+        return result(quality, scale)
+    fits(min_quality, scale)
+    return result(min_quality, scale, False)
+
+def _jpeg(image, quality):
+    stream = io.BytesIO()
+    image.save(stream, format='JPEG', quality=quality, optimize=True)
+    return stream.getvalue()
+
+def _resample():
+    from PIL import Image
+    return getattr(Image, 'Resampling', Image).LANCZOS
+
+def make_product(image, options):
+    '''
+    Encode one product of a PIL image
+
+    Returns:
+        dict : data, quality, scale, size and fits
+    '''
+    if 'budget' in options:
+        resized = {}
+
+        def encode(quality, scale):
+            if scale not in resized:
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                resized[scale] = image if scale == 1.0 else image.resize(size, _resample())
+            return _jpeg(resized[scale], quality)
+        settings = {name: options[name] for name in ('min_quality', 'max_quality', 'scale_quality', 'min_scale') if name in options}
+        return fit_budget(encode, options['budget'], **settings)
+    scale = 1.0
+    if 'max_size' in options:
+        thumbnail = image.copy()
+        thumbnail.thumbnail(options['max_size'], _resample())
+        scale = thumbnail.width / image.width
+        image = thumbnail
+    data = _jpeg(image, options.get('quality', 85))
+    return {'data': data, 'quality': options.get('quality', 85), 'scale': scale, 'size': len(data), 'fits': True}
+
+def process_image(path, output_dir, products = PRODUCTS):
+    '''
+    Write every product of the image at path to output_dir as {name}.{product}.jpg, runs in a worker process
+
+    Returns:
+        dict : source, source_size, time (seconds) and products {name: path, size, ratio, quality, scale, fits}
+    '''
+    from PIL import Image
+    start = time.perf_counter()
+    source_size = os.path.getsize(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    with Image.open(path) as opened:
+        image = opened.convert('RGB')
+    report = {'source': path, 'source_size': source_size, 'products': {}}
+    for name, options in products.items():
+        product = make_product(image, options)
+        product_path = os.path.join(output_dir, f"{stem}.{name}.jpg")
+        with open(product_path + '.tmp', 'wb') as file:
+            file.write(product.pop('data'))
+        os.replace(product_path + '.tmp', product_path)
+        product['path'] = product_path
+        product['ratio'] = source_size / product['size']
+        report['products'][name] = product
+    report['time'] = time.perf_counter() - start
+    return report
+
+class CompressionPipeline:
+    '''
+    Compress captured images into their products with a pool of worker processes
+
+    Functionality:
+    - Products per image from PRODUCTS (thumbnail, downlink fitted to a byte budget, archive)
+    - Images from a list, a directory (e.g. a CameraSession output_dir) or a queue fed while capturing
+    - Deadline after which images not yet started are deferred to the next pass
+    - Per image time and compression ratio report
+    '''
+
+    def __init__(self, output_dir, products = None, workers = None):
+        '''
+        Initialization of CompressionPipeline class
+
+        Args:
+            output_dir (str): directory the products are written to, created if missing
+            products (dict): product name -> options, PRODUCTS if not given
+            workers (int): worker processes, one per CPU if not given
+        '''
+        self.output_dir = os.path.expanduser(output_dir)
+        self.products = PRODUCTS if products is None else products
+        self.workers = workers
+        self.reports = []
+        self.failed = []
+        self.deferred = []
+
+    def run(self, paths, deadline = None):
+        '''
+        Compress every image in paths, returns the reports of the images processed
+
+        Args:
+            deadline (float): seconds from now after which images that have not started are deferred
+        '''
+        return self._run(iter(paths), deadline)
+
+    def run_directory(self, directory, patterns = ('*.jpg', '*.jpeg', '*.ppm', '*.png'), deadline = None):
+        '''
+        Compress the images in directory, oldest first
+        '''
+        directory = os.path.expanduser(directory)
+        paths = sorted({path for pattern in patterns for path in glob.glob(os.path.join(directory, pattern))}, key=os.path.getmtime)
+        return self.run(paths, deadline)
+
+    def run_queue(self, image_queue, deadline = None):
+        '''
+        Compress image paths taken from image_queue until None is taken, e.g. paths of Frames written by a CameraSession
+        '''
+        return self._run(iter(image_queue.get, None), deadline)
+
+    def _run(self, paths, deadline):
+        os.makedirs(self.output_dir, exist_ok=True)
+        end = None if deadline is None else time.monotonic() + deadline
+        reports = []
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+            futures = {}
+            for path in paths:
+                if end is not None and time.monotonic() >= end:
+                    self.deferred.append(path)
+                    continue
+                futures[pool.submit(process_image, path, self.output_dir, self.products)] = path
+            if end is not None:
+                concurrent.futures.wait(futures, timeout=max(0, end - time.monotonic()))
+                for future, path in futures.items():
+                    if future.cancel():
+                        self.deferred.append(path)
+            for future, path in futures.items():
+                if future.cancelled():
+                    continue
+                try:
+                    reports.append(future.result())
+                except Exception as error:
+                    self.failed.append((path, str(error)))
+        self.reports.extend(reports)
+        return reports
+
+    def format_report(self, reports = None):
+        '''
+        Return the time and compression ratio of every image and product as printable text
+        '''
+        reports = self.reports if reports is None else reports
+        names = list(self.products)
+        lines = [f"{'image':<40} {'time [s]':>9} " + " ".join(f"{name + ' bytes':>16} {'ratio':>7}" for name in names)]
+        for report in reports:
+            line = f"{os.path.basename(report['source']):<40} {report['time']:>9.3f} "
+            line += " ".join(f"{report['products'][name]['size']:>16} {report['products'][name]['ratio']:>7.1f}" for name in names)
+            lines.append(line)
+        if reports:
+            total_time = sum(report['time'] for report in reports)
+            over_budget = sum(not product['fits'] for report in reports for product in report['products'].values())
+            lines.append(f"{len(reports)} images, {total_time:.3f} s of worker time, {over_budget} products over budget")
+        if self.deferred:
+            lines.append(f"{len(self.deferred)} images deferred to the next pass")
+        for path, error in self.failed:
+            lines.append(f"Failed {path}: {error}")
+        return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', help='directory of captured images')
+    parser.add_argument('--output', help='directory for the products, defaults to directory/products')
+    parser.add_argument('--budget', type=int, default=PRODUCTS['downlink']['budget'], help='downlink product size in bytes')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--deadline', type=float, help='seconds until the next contact, later images are deferred')
+    args = parser.parse_args()
+
+    products = dict(PRODUCTS)
+    products['downlink'] = dict(PRODUCTS['downlink'], budget=args.budget)
+    pipeline = CompressionPipeline(args.output or os.path.join(os.path.expanduser(args.directory), 'products'), products, args.workers)
+    start = time.perf_counter()
+    pipeline.run_directory(args.directory, deadline=args.deadline)
+    print(pipeline.format_report())
+    print(f"Wall time: {time.perf_counter() - start:.3f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+'''
+Perceptual hashing of captured frames to skip near duplicates
+
+The hash is the pHash construction: luminance averaged down to 32x32, a 2D DCT, and one bit per coefficient of the
+lowest 8x8 frequencies set when the coefficient is above their median. Small changes (noise, compression, slight
+exposure drift) flip few bits, so the Hamming distance between hashes measures how different two scenes look.
+'''
+import collections
+import io
+import re
+import time
+
+PPM_HEADER = re.compile(rb'(P[56])\s+(\d+)\s+(\d+)\s+(\d+)\s')
+LUMA = (0.299, 0.587, 0.114)
+
+def luminance(data, extension):
+    '''
+    Decode an encoded frame to a 2D float array of luminance
+
+    PPM/PGM frames (SyntheticBackend) are decoded with NumPy. Other formats are decoded with PIL, JPEGs at a reduced
+    size straight from their DCT coefficients, since the hash only needs a 32x32 image.
+    '''
+    import numpy as np
+    if extension in ('ppm', 'pgm'):
+        header = PPM_HEADER.match(data)
+        if header is None or int(header.group(4)) > 255:
+            raise ValueError("Unsupported PPM frame")
+        magic, width, height = header.group(1), int(header.group(2)), int(header.group(3))
+        channels = 3 if magic == b'P6' else 1
+        pixels = np.frombuffer(data, dtype=np.uint8, count=width * height * channels, offset=header.end())
+        if channels == 1:
+            return pixels.reshape(height, width).astype(np.float32)
+        return pixels.reshape(height, width, 3) @ np.array(LUMA, dtype=np.float32)
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('L', (128, 128))
+        return np.asarray(image.convert('L'), dtype=np.float32)
+
+def _shrink(image, size):
+    # Average image down to size x size (nearest pixels when it is smaller)
+    import numpy as np
+    height, width = image.shape
+    if height < size or width < size:
+        return image[np.arange(size) * height // size][:, np.arange(size) * width // size]
+    rows = np.add.reduceat(image, np.arange(size) * height // size, axis=0)
+    cells = np.add.reduceat(rows, np.arange(size) * width // size, axis=1)
+    row_counts = np.diff(np.append(np.arange(size) * height // size, height))
+    column_counts = np.diff(np.append(np.arange(size) * width // size, width))
+    return cells / np.outer(row_counts, column_counts)
+
+_dct_matrices = {}
+
+def _dct_matrix(size):
+    # Orthonormal DCT-II matrix, the 2D DCT of X is M @ X @ M.T
+    import numpy as np
+    if size not in _dct_matrices:
+        n = np.arange(size)
+        matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+        matrix[0] /= np.sqrt(2)
+        _dct_matrices[size] = matrix
+    return _dct_matrices[size]
+
+def phash(image, hash_size = 8, highfreq_factor = 4):
+    '''
+    Return the perceptual hash of a 2D luminance array as an int of hash_size**2 bits
+    '''
+    import numpy as np
+    size = hash_size * highfreq_factor
+    matrix = _dct_matrix(size)
+    coefficients = (matrix @ _shrink(image, size) @ matrix.T)[:hash_size, :hash_size]
+    low = coefficients.ravel()
+    bits = low > np.median(low[1:]) #The DC term only measures overall brightness
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class FrameDeduplicator:
+    '''
+    Drop or demote frames that look like a recent frame
+
+    Functionality:
+    - Perceptual hash of every frame, computed when it is captured
+    - Index of the hashes of the last window unique frames, searched with vectorised XOR and popcount
+    - Frames within threshold bits of an indexed frame are duplicates: dropped, or demoted (written to a demoted/
+      subdirectory that the compression pipeline does not pick up)
+    - Statistics of frames seen, duplicates, bytes saved and hashing time
+    '''
+
+    def __init__(self, threshold = 6, window = 256, action = 'drop', hash_size = 8):
+        '''
+        Initialization of FrameDeduplicator class
+
+        Args:
+            threshold (int): largest Hamming distance (of hash_size**2 bits) counted as a duplicate
+            window (int): unique frames kept in the index
+            action (str): 'drop' or 'demote' duplicates
+            hash_size (int): hash_size x hash_size DCT coefficients are hashed, at most 8 (64 bit hashes)
+
+        Raises:
+            ValueError: f"Invalid dedup action: {action}"
+        '''
+        import numpy as np
+        if action not in ('drop', 'demote'):
+            raise ValueError(f"Invalid dedup action: {action}")
+        if not 1 < hash_size <= 8:
+            raise ValueError(f"Invalid hash size: {hash_size}")
+        self.threshold = threshold
+        self.action = action
+        self.hash_size = hash_size
+        self._hashes = np.zeros(window, dtype=np.uint64)
+        self._indexes = collections.deque(maxlen=window) #Frame index of each hash, oldest first
+        self._next = 0
+        self.stats = {'frames': 0, 'unique': 0, 'duplicates': 0, 'bytes_saved': 0, 'hash_time': 0.0, 'errors': 0}
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def nearest(self, frame_hash):
+        '''
+        Return (distance, frame index) of the closest hash in the index, or (None, None) when it is empty
+        '''
+        import numpy as np
+        count = len(self._indexes)
+        if not count:
+            return None, None
+        distances = np.bitwise_count(self._hashes[:count] ^ np.uint64(frame_hash))
+        slot = int(np.argmin(distances))
+        # Slots are filled round robin, the oldest entry of a full index is at self._next
+        age_order = (slot - self._next) % count if count == len(self._hashes) else slot
+        return int(distances[slot]), self._indexes[age_order]
+
+    def add(self, frame_hash, index):
+        self._hashes[self._next] = frame_hash
+        self._indexes.append(index)
+        self._next = (self._next + 1) % len(self._hashes)
+
+    def check(self, frame):
+        '''
+        Hash frame and decide if it is a duplicate, the hash and match are stored on the frame
+
+        Returns:
+            bool : True if the frame should be kept (unique, or a duplicate that is demoted)
+        '''
+        start = time.perf_counter()
+        self.stats['frames'] += 1
+        try:
+            frame.hash = phash(luminance(frame.data, frame.extension), self.hash_size)
+        except Exception:
+            self.stats['errors'] += 1 #Frames that cannot be hashed are always kept
+            return True
+        finally:
+            self.stats['hash_time'] += time.perf_counter() - start
+        distance, match = self.nearest(frame.hash)
+        if distance is None or distance > self.threshold:
+            self.stats['unique'] += 1
+            self.add(frame.hash, frame.index)
+            return True
+        frame.duplicate_of = match
+        self.stats['duplicates'] += 1
+        if self.action == 'demote':
+            return True
+        self.stats['bytes_saved'] += len(frame.data)
+        return False
+
+    def format_stats(self):
+        stats = self.stats
+        hash_ms = stats['hash_time'] / stats['frames'] * 1000 if stats['frames'] else 0.0
+        action = 'dropped' if self.action == 'drop' else 'demoted'
+        return (f"Frame dedup: {stats['frames']} frames, {stats['unique']} unique, {stats['duplicates']} duplicates {action} "
+                f"(threshold {self.threshold} bits), {stats['bytes_saved']} bytes saved, {hash_ms:.2f} ms per hash")
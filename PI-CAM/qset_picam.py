@@ -1,17 +1,29 @@
-from picamera import PiCamera
 from time import sleep
 from datetime import datetime
-from PIL import Image
-from matplotlib import image
-from matplotlib import pyplot as plt
 import os
 
-class PiCam(PiCamera):
-    
+class PiCam:
+    # picamera, PIL and matplotlib are imported on first use so importing this module stays cheap
+
     def __init__(self,results_dir):
-        super().__init__()
+        from picamera import PiCamera
+        self.camera = PiCamera()
         self.results_dir = results_dir
 
+    def __getattr__(self,name):
+        # Expose the PiCamera interface (capture, start_preview, close, ...) of the wrapped camera
+        if name == 'camera':
+            raise AttributeError(name)
+        return getattr(self.camera,name)
+
+    def session(self,output_dir:str=None,queue_size:int=8,dedup=None,**backend_options):
+        # Keep the camera open for bursts and continuous capture, see camera_session.py
+        try:
+            from .camera_session import CameraSession, PiCameraBackend
+        except ImportError:
+            from camera_session import CameraSession, PiCameraBackend
+        return CameraSession(PiCameraBackend(self.camera,**backend_options),output_dir or self.results_dir,queue_size,dedup=dedup)
+
     def shot(self,filename:str='image.jpg'):
         if ".jpg" not in filename:
             raise Exception("File must be a .jpg")
@@ -21,20 +33,23 @@ class PiCam(PiCamera):
         self.stop_preview()
         self.close()
 
-    def compress_image(self,image_path:str):
+    def compress_image(self,image_path:str,budget:int=None):
+        # Write the downlink product of one image to results_dir, fitted to budget bytes (see compression_pipeline.py)
         if ".jpg" not in image_path:
             raise Exception("File specified is not a .jpg")
-        img = Image.open(image_path)
-        width, height = img.size
-        scale_factor = 10
-        img_compressed = img.resize((int(width / scale_factor), int(height / scale_factor)))
-        img_compressed.save(compressed_image_path)
-        img_size = os.path.getsize(image_path)
-        img_compressed_size = os.path.getsize(compressed_image_path)
+        try:
+            from .compression_pipeline import PRODUCTS, process_image
+        except ImportError:
+            from compression_pipeline import PRODUCTS, process_image
+        downlink = dict(PRODUCTS['downlink'])
+        if budget is not None:
+            downlink['budget'] = budget
+        return process_image(os.path.expanduser(image_path),os.path.expanduser(self.results_dir),{'downlink': downlink})['products']['downlink']
     
     def plot(self,image_path:str):
         if ".jpg" not in "image_path":
             raise Exception("File specified is not a .jpg")
+        from matplotlib import pyplot as plt
         plt.figure(figsize=(15,12))
 
         plt.subplot(121)
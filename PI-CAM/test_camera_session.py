@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+import pytest
+from camera_session import CameraSession, SyntheticBackend
+
+def test_burst_writes_every_frame(tmp_path):
+    backend = SyntheticBackend(resolution=(32,24),settle_time=0.05)
+    with CameraSession(backend,str(tmp_path),queue_size=2) as session:
+        frames = session.burst(10)
+        frames += session.burst(5) #Same session, no second warm-up
+        session.flush()
+        assert all(frame.path for frame in frames)
+    assert backend.opened == backend.closed == 1
+    assert len(os.listdir(tmp_path)) == 15
+    with open(frames[0].path,'rb') as file:
+        assert file.read().startswith(b'P6 32 24 255\n')
+    assert session.stats['written'] == 15
+    assert session.stats['dropped'] == 0
+
+def test_on_write_errors_do_not_stop_the_writer(tmp_path, capsys):
+    written = []
+
+    def on_write(frame):
+        if frame.index == 0:
+            raise RuntimeError("Compression queue closed")
+        written.append(frame.index)
+    with CameraSession(SyntheticBackend(resolution=(8,8)),str(tmp_path),queue_size=1,on_write=on_write) as session:
+        session.burst(4) #Blocks forever if the writer thread died on the first frame
+        session.flush()
+    assert written == [1,2,3]
+    assert session.stats['written'] == 4
+    assert session.stats['callback_errors'] == 1
+    assert "Compression queue closed" in capsys.readouterr().out
+
+def test_continuous_rate_and_drops(tmp_path):
+    backend = SyntheticBackend(resolution=(16,16))
+    with CameraSession(backend,str(tmp_path)) as session:
+        start = time.monotonic()
+        frames = session.continuous(50,duration=0.2)
+        assert 0.18 < time.monotonic() - start < 0.3
+        assert 9 <= len(frames) <= 11
+
+    assert session.stats['dropped'] == 0
+
+def test_continuous_drops_when_storage_is_slow(tmp_path, monkeypatch):
+    import camera_session
+    replace = os.replace
+    def slow_replace(source, destination):
+        time.sleep(0.05)
+        replace(source, destination)
+    monkeypatch.setattr(camera_session.os,'replace',slow_replace)
+    with CameraSession(SyntheticBackend(resolution=(16,16)),str(tmp_path),queue_size=1) as session:
+        frames = session.continuous(100,count=20)
+    assert session.stats['captured'] == 20
+    assert session.stats['dropped'] > 0
+    assert session.stats['written'] == len(frames) == 20 - session.stats['dropped']
+
+def test_continuous_stop_event(tmp_path):
+    stop = threading.Event()
+    threading.Timer(0.1,stop.set).start()
+    with CameraSession(SyntheticBackend(resolution=(8,8)),str(tmp_path)) as session:
+        start = time.monotonic()
+        session.continuous(20,stop_event=stop)
+        assert time.monotonic() - start < 0.2
+
+def test_capture_requires_open_session(tmp_path):
+    session = CameraSession(SyntheticBackend(),str(tmp_path))
+    with pytest.raises(RuntimeError):
+        session.capture()
+    with pytest.raises(ValueError):
+        session.continuous(1)
@@ -0,0 +1,53 @@
+import os
+import queue
+import pytest
+from compression_pipeline import CompressionPipeline, fit_budget
+
+def fake_encode(quality, scale):
+    #Size grows with quality and with the number of pixels, like a JPEG encoder
+    return bytes(int(100000 * scale * scale * (0.2 + quality / 100)))
+
+@pytest.mark.parametrize("budget, quality, scale", [
+    (200000, 90, 1.0), #Everything fits, best quality at full resolution
+    (95000, 75, 1.0), #Highest quality that fits at full resolution
+    (40000, 60, 45 / 64), #Scaled down at scale_quality
+    (700, 24, 0.125), #Minimum scale, quality searched down towards min_quality
+])
+def test_fit_budget(budget, quality, scale):
+    result = fit_budget(fake_encode, budget, min_quality=20, max_quality=90, scale_quality=60, min_scale=0.125)
+    assert result['fits']
+    assert (result['quality'], result['scale']) == (quality, scale)
+    assert result['size'] == len(result['data']) <= budget
+    assert result['encodes'] <= 15
+
+def test_fit_budget_reports_a_miss():
+    result = fit_budget(fake_encode, 10, min_scale=0.125)
+    assert not result['fits']
+    assert (result['quality'], result['scale']) == (20, 0.125)
+
+def test_pipeline_products(tmp_path):
+    pytest.importorskip('PIL')
+    from camera_session import CameraSession, SyntheticBackend
+    written = queue.Queue()
+    with CameraSession(SyntheticBackend(resolution=(640,480)),str(tmp_path / 'images'),on_write=lambda frame: written.put(frame.path)) as session:
+        session.burst(4)
+    written.put(None)
+
+    products = {
+        'thumbnail': {'max_size': (80, 60), 'quality': 70},
+        'downlink': {'budget': 8000, 'min_quality': 20, 'max_quality': 90, 'scale_quality': 60, 'min_scale': 0.1},
+        'archive': {'quality': 95},
+    }
+    pipeline = CompressionPipeline(str(tmp_path / 'products'),products,workers=2)
+    reports = pipeline.run_queue(written)
+    assert len(reports) == 4
+    for report in reports:
+        assert report['products']['downlink']['size'] <= 8000
+        assert report['products']['thumbnail']['scale'] == 80 / 640
+        assert all(os.path.exists(product['path']) for product in report['products'].values())
+    assert 'archive bytes' in pipeline.format_report()
+
+def test_pipeline_deadline_defers_images(tmp_path):
+    pipeline = CompressionPipeline(str(tmp_path),workers=1)
+    assert pipeline.run(['a.jpg','b.jpg'],deadline=0) == []
+    assert pipeline.deferred == ['a.jpg','b.jpg']
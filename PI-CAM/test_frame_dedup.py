@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import pytest
+from camera_session import CameraSession, Frame, SyntheticBackend
+from frame_dedup import FrameDeduplicator, hamming, luminance, phash
+
+def scene(seed, shift = 0, noise = 0):
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (6, 8, 3)).repeat(20, axis=0).repeat(20, axis=1)
+    image = np.roll(blocks, shift, axis=1).astype(np.int16)
+    if noise:
+        image += np.random.default_rng(seed + shift + 1000).integers(-noise, noise + 1, image.shape, dtype=np.int16)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def frame_of(index, image):
+    return Frame(index, None, SyntheticBackend.encode(image), 'ppm')
+
+def image_hash(image):
+    return phash(luminance(SyntheticBackend.encode(image), 'ppm'))
+
+def test_luminance_decodes_ppm():
+    image = scene(1)
+    gray = luminance(SyntheticBackend.encode(image), 'ppm')
+    assert gray.shape == (120, 160)
+    assert gray[0, 0] == pytest.approx(image[0, 0] @ np.array([0.299, 0.587, 0.114]), abs=0.01)
+    with pytest.raises(ValueError):
+        luminance(b'P6 2 2 65535\n' + bytes(24), 'ppm')
+
+def test_hash_distance():
+    base = image_hash(scene(1))
+    assert image_hash(scene(1)) == base
+    assert hamming(base, image_hash(scene(1, noise=8))) <= 4
+    assert hamming(base, image_hash(scene(1, shift=2))) <= 6
+    assert hamming(base, image_hash(scene(2))) > 16
+
+def test_drop_duplicates():
+    dedup = FrameDeduplicator()
+    frames = [frame_of(0, scene(1)), frame_of(1, scene(1, noise=6)), frame_of(2, scene(2)), frame_of(3, scene(1, shift=1))]
+    assert [dedup.check(frame) for frame in frames] == [True, False, True, False]
+    assert frames[1].duplicate_of == 0 and frames[3].duplicate_of == 0
+    assert frames[2].duplicate_of is None
+    assert dedup.stats['unique'] == 2 and dedup.stats['duplicates'] == 2
+    assert dedup.stats['bytes_saved'] == len(frames[1].data) + len(frames[3].data)
+    assert "2 duplicates dropped" in dedup.format_stats()
+
+def test_demote_keeps_frames():
+    dedup = FrameDeduplicator(action='demote')
+    frames = [frame_of(0, scene(1)), frame_of(1, scene(1, noise=6))]
+    assert [dedup.check(frame) for frame in frames] == [True, True]
+    assert frames[1].duplicate_of == 0
+    assert dedup.stats['bytes_saved'] == 0
+    with pytest.raises(ValueError):
+        FrameDeduplicator(action='delete')
+
+def test_undecodable_frames_are_kept():
+    dedup = FrameDeduplicator()
+    assert dedup.check(Frame(0, None, b'not an image', 'ppm'))
+    assert dedup.stats['errors'] == 1 and len(dedup) == 0
+
+def test_window_wraps():
+    dedup = FrameDeduplicator(window=4)
+    for index in range(6):
+        dedup.add(1 << index, index)
+    assert len(dedup) == 4
+    assert dedup.nearest(1 << 5) == (0, 5)
+    assert dedup.nearest(1 << 2) == (0, 2)
+    assert dedup.nearest(1 << 0)[0] == 2 #Evicted, only near the other single bit hashes
+
+def test_session_drops_and_demotes(tmp_path):
+    images = [scene(1), scene(1, noise=6), scene(2), scene(2, noise=6), scene(3)]
+    backend = SyntheticBackend(resolution=(160, 120), scene=lambda index: images[index % len(images)])
+    with CameraSession(backend, str(tmp_path / 'drop'), dedup=FrameDeduplicator()) as session:
+        frames = session.burst(5)
+        session.flush()
+    assert [frame.index for frame in frames] == [0, 2, 4]
+    assert session.stats['deduplicated'] == 2
+    assert len(os.listdir(tmp_path / 'drop')) == 3
+
+    backend = SyntheticBackend(resolution=(160, 120), scene=lambda index: images[index % len(images)])
+    with CameraSession(backend, str(tmp_path / 'demote'), dedup=FrameDeduplicator(action='demote')) as session:
+        frames = session.continuous(200, count=5)
+        session.flush()
+    assert len(frames) == 5
+    assert session.stats['deduplicated'] == 0
+    assert sorted(os.listdir(tmp_path / 'demote' / 'demoted')) == sorted(os.path.basename(frames[index].path) for index in (1, 3))
+    assert len(os.listdir(tmp_path / 'demote')) == 4 #3 unique frames and the demoted directory
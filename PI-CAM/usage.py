@@ -3,3 +3,10 @@ from qset_picam import PiCam
 img_path = "~/"
 cam = PiCam("~/PI-OBC/PI-CAM")
 cam.shot()
+
+#Keep the camera open: one warm-up, then a burst and 10 s of continuous capture at 2 frames per second
+with PiCam("~/PI-OBC/PI-CAM").session("~/images") as session:
+    session.burst(5)
+    session.continuous(2,duration=10)
+    session.flush()
+    print(session.format_stats())
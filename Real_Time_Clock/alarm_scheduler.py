@@ -0,0 +1,110 @@
+"""Event scheduled work driven by the MCP79410 alarm, in place of a cron job that polls every minute
+
+Between runs the process blocks on the MFP line (through an edge source, see GPIO/edge_source.py) with the alarm set to
+the next due time, so nothing runs and the bus is idle until the RTC wakes it.
+"""
+import datetime
+
+class AlarmScheduler:
+    '''
+    Run a callback on a grid of due times, sleeping on an RTC alarm in between
+
+    Functionality:
+        -Default period (e.g. hourly) and windows with their own period (e.g. every 10 s during ground passes)
+        -Due times are multiples of the period since the epoch, so restarts keep the same grid
+        -One alarm write, one edge wait and one alarm read and acknowledge per run, no polling
+        -An edge that never arrives is caught by a timeout grace seconds after the due time
+    '''
+
+    def __init__(self, rtc, edge_source, period = 3600, alarm = 0, grace = 2, name = 'alarm'):
+        """Initialization of AlarmScheduler class
+
+        Args:
+            rtc (RTC): clock whose alarm wakes the scheduler
+            edge_source: MFP line, an object with a wait(timeout) method returning True on an edge
+            period (int): seconds between runs outside the windows, at least 1 (the alarm resolution)
+            alarm (int): RTC alarm to use, 0 or 1
+            grace (float): seconds after the due time before a missing edge is assumed
+            name (str): task name used when reporting failed runs, as in the daemon's scheduler
+
+        Raises:
+            ValueError: f"Invalid period: {period}"
+        """
+        if period < 1:
+            raise ValueError(f"Invalid period: {period}")
+        self.rtc = rtc
+        self.edge_source = edge_source
+        self.period = period
+        self.alarm = alarm
+        self.grace = grace
+        self.name = name
+        self.windows = []
+        self.stats = {'runs': 0, 'missed_edges': 0, 'errors': 0}
+
+    def add_window(self, start, end, period):
+        """Run every period seconds from start until end (seconds since the epoch), e.g. a ground pass
+
+        Raises:
+            ValueError: f"Invalid period: {period}" or f"Invalid window: {start} to {end}"
+        """
+        if period < 1:
+            raise ValueError(f"Invalid period: {period}")
+        if end <= start:
+            raise ValueError(f"Invalid window: {start} to {end}")
+        self.windows.append((start, end, period))
+
+    def next_due(self, now):
+        """Return the first due time after now (seconds since the epoch)"""
+        candidates = [(now // self.period + 1) * self.period]
+        for start, end, period in self.windows:
+            if start > now:
+                candidates.append(start)
+            elif now < end:
+                due = (now // period + 1) * period
+                if due < end:
+                    candidates.append(due)
+        return min(candidates)
+
+    def _now(self):
+        return self.rtc.timestamp.replace(tzinfo=datetime.timezone.utc).timestamp() #The RTC keeps UTC
+
+    def wait(self):
+        """Set the alarm to the next due time and block until it fires
+
+        Returns:
+            float : the due time reached, seconds since the epoch
+        """
+        while True:
+            now = self._now()
+            due = self.next_due(now)
+            when = datetime.datetime.fromtimestamp(due, datetime.timezone.utc).replace(tzinfo=None)
+            self.rtc.set_alarm(self.alarm, when, 'all')
+            fired = self.rtc.wait_for_alarm(self.edge_source, due - now + self.grace)
+            if fired and self.alarm in fired:
+                return due
+            if fired is None and self._now() >= due:
+                self.stats['missed_edges'] += 1
+                self.rtc.acknowledge_alarm(self.alarm)
+                return due
+            #An edge without a flag (e.g. another device on the line) or an early timeout, set the alarm again
+
+    def run(self, callback, count = None):
+        """Call callback(due datetime) at every due time, count times or until interrupted. The alarm is disabled on exit
+
+        Exceptions raised by callback are counted and reported like the daemon's scheduler does (Telemetry/scheduler.py), the schedule continues.
+        """
+        try:
+            while count is None or self.stats['runs'] < count:
+                due = self.wait()
+                self.stats['runs'] += 1
+                try:
+                    callback(datetime.datetime.fromtimestamp(due, datetime.timezone.utc).replace(tzinfo=None))
+                except Exception as error:
+                    self.stats['errors'] += 1
+                    print(f"{self.name} failed: {error}", flush=True)
+        finally:
+            self.rtc.clear_alarm(self.alarm)
+
+    def format_stats(self):
+        stats = self.stats
+        return f"{self.name}: period {self.period}s, runs {stats['runs']}, missed edges {stats['missed_edges']}, errors {stats['errors']}"
@@ -0,0 +1,315 @@
+"""Telemetry checkpoints and boot counters kept in the MCP79410 SRAM and EEPROM
+
+Layout (every block carries a CRC-16/CCITT so torn or erased blocks are skipped on recovery):
+    SRAM 0x20-0x2F (RTC slave 0x6F): header, magic, version, flags, boot count, unclean boot count
+    SRAM 0x30-0x5F: staging for the last STAGING_SLOTS records, one block write per checkpoint
+    EEPROM 0x00-0x0F (slave 0x57): copy of the header, for boards without a backup battery
+    EEPROM 0x10-0x7F: ring of RING_SLOTS records, written in whole 8 byte pages
+
+Checkpoints are written to the battery backed SRAM first and copied to the EEPROM batch records at a time, so every
+EEPROM write is a full page and each page is written once per RING_SLOTS records. The end of an EEPROM write cycle is
+found by ACK polling rather than a fixed delay. Recovery reads both memories in bulk: the SMBus block read limit of 32 bytes
+makes that 2 SRAM and 4 EEPROM reads.
+"""
+import binascii
+import contextlib
+import struct
+import time
+
+SRAM_START = 0x20
+SRAM_SIZE = 0x40
+EEPROM_ADDRESS = 0x57
+EEPROM_SIZE = 0x80
+PAGE_SIZE = 8
+BLOCK_SIZE = 32 #Longest SMBus block read or write
+
+HEADER = struct.Struct('>2sBBIH4xH') #magic, version, flags, boot count, unclean boots, CRC
+RECORD = struct.Struct('>IIhhhH') #sequence, timestamp, minimum, maximum, mean (hundredths of a degree), CRC
+MAGIC = b'CK'
+VERSION = 1
+CLEAN = 0x01 #Header flag, set by close() and cleared by boot()
+MISSING = -0x8000 #Encoded value of a missing temperature
+
+SRAM_HEADER = SRAM_START
+SRAM_STAGING = SRAM_START + HEADER.size
+STAGING_SLOTS = (SRAM_SIZE - HEADER.size) // RECORD.size
+EEPROM_HEADER = 0x00
+EEPROM_RING = HEADER.size
+RING_SLOTS = (EEPROM_SIZE - EEPROM_RING) // RECORD.size
+
+def _crc(data):
+    return binascii.crc_hqx(bytes(data), 0xFFFF)
+
+def _encode_value(value):
+    if value is None or value != value: #None or NaN
+        return MISSING
+    return max(-0x7FFF, min(0x7FFF, round(value * 100)))
+
+def _decode_value(raw):
+    return None if raw == MISSING else raw / 100
+
+def pack_header(boot_count, unclean_boots, clean):
+    body = HEADER.pack(MAGIC, VERSION, CLEAN if clean else 0, boot_count & 0xFFFFFFFF, unclean_boots & 0xFFFF, 0)[:-2]
+    return body + _crc(body).to_bytes(2, 'big')
+
+def unpack_header(data):
+    '''
+    Return {'boot_count', 'unclean_boots', 'clean'} of a header block, or None if it is erased, corrupt or another version
+    '''
+    data = bytes(data)
+    magic, version, flags, boot_count, unclean_boots, crc = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION or _crc(data[:-2]) != crc:
+        return None
+    return {'boot_count': boot_count, 'unclean_boots': unclean_boots, 'clean': bool(flags & CLEAN)}
+
+def pack_record(seq, timestamp, minimum, maximum, mean):
+    body = RECORD.pack(seq, int(timestamp), _encode_value(minimum), _encode_value(maximum), _encode_value(mean), 0)[:-2]
+    return body + _crc(body).to_bytes(2, 'big')
+
+def unpack_record(data):
+    '''
+    Return {'seq', 'timestamp', 'minimum', 'maximum', 'mean'} of a record block, or None if it is erased or corrupt
+    '''
+    data = bytes(data)
+    seq, timestamp, minimum, maximum, mean, crc = RECORD.unpack(data)
+    if seq == 0 or _crc(data[:-2]) != crc:
+        return None
+    return {'seq': seq, 'timestamp': timestamp, 'minimum': _decode_value(minimum),
+            'maximum': _decode_value(maximum), 'mean': _decode_value(mean)}
+
+class CheckpointStore:
+    '''
+    Ring of telemetry summaries and boot counters that survives power loss, in the SRAM and EEPROM of the MCP79410
+
+    Functionality:
+        -Boot and unclean boot (no close() before power was lost, e.g. a brown-out) counters
+        -Last RING_SLOTS summaries (time, minimum, maximum and mean) in the EEPROM, the newest ones staged in SRAM
+        -SRAM updates are single block writes, EEPROM writes are whole pages finished by ACK polling
+        -Recovery of all of it from one bulk read of each memory
+        -Summary of the samples added between checkpoints
+    '''
+
+    def __init__(self, rtc, batch = STAGING_SLOTS, write_timeout = 0.02, poll_interval = 0.0005,
+                 clock = time.monotonic, sleep = time.sleep):
+        """Initialization of CheckpointStore class, nothing is read until recover() or boot()
+
+        Args:
+            rtc (RTC): driver of the MCP79410, its bus (and bus transactions) are shared
+            batch (int): records staged in SRAM before they are copied to the EEPROM, 1 to STAGING_SLOTS
+            write_timeout (float): seconds an EEPROM write cycle may take (5 ms on the data sheet)
+            poll_interval (float): seconds between ACK polls
+            clock (function): monotonic clock in seconds
+            sleep (function): used between ACK polls
+
+        Raises:
+            ValueError: f"Invalid batch: {batch}"
+        """
+        if not 1 <= batch <= STAGING_SLOTS:
+            raise ValueError(f"Invalid batch: {batch}")
+        self.rtc = rtc
+        self.batch = batch
+        self.write_timeout = write_timeout
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.boot_count = 0
+        self.unclean_boots = 0
+        self.clean = True
+        self.records = [] #Newest RING_SLOTS records, oldest first
+        self.staged = [] #Records in SRAM that are not in the EEPROM yet
+        self.next_seq = 1
+        self._samples = []
+        self.stats = {'block_reads': 0, 'sram_writes': 0, 'page_writes': 0, 'ack_polls': 0, 'flushes': 0, 'refused': 0}
+
+    @property
+    def bus(self):
+        return self.rtc.i2c_bus
+
+    @contextlib.contextmanager
+    def _writing(self):
+        # Hold the bus over the whole update and report bus errors like the RTC driver does
+        try:
+            with self.rtc._transaction():
+                yield
+        except OSError:
+            raise RuntimeError("Unable to Write Checkpoints")
+
+    def _read(self, address, start, length):
+        data = []
+        for offset in range(0, length, BLOCK_SIZE):
+            data += self.bus.read_i2c_block_data(address, start + offset, min(BLOCK_SIZE, length - offset))
+            self.stats['block_reads'] += 1
+        return bytes(data)
+
+    def _write_sram(self, register, data):
+        self.bus.write_i2c_block_data(self.rtc.registers['slave'], register, list(data))
+        self.stats['sram_writes'] += 1
+
+    def _wait_write_cycle(self):
+        # The EEPROM does not acknowledge its address until the write cycle is over
+        deadline = self.clock() + self.write_timeout
+        while True:
+            self.stats['ack_polls'] += 1
+            try:
+                self.bus.read_byte(EEPROM_ADDRESS)
+                return
+            except OSError:
+                if self.clock() >= deadline:
+                    raise RuntimeError("EEPROM write cycle did not complete")
+            self.sleep(self.poll_interval)
+
+    def _write_eeprom(self, register, data):
+        # Whole aligned pages only, a write that crosses a page boundary wraps around within the page
+        for offset in range(0, len(data), PAGE_SIZE):
+            self.bus.write_i2c_block_data(EEPROM_ADDRESS, register + offset, list(data[offset:offset + PAGE_SIZE]))
+            self.stats['page_writes'] += 1
+            self._wait_write_cycle()
+
+    def _write_header(self):
+        header = pack_header(self.boot_count, self.unclean_boots, self.clean)
+        self._write_sram(SRAM_HEADER, header)
+        self._write_eeprom(EEPROM_HEADER, header)
+
+    def recover(self):
+        """Read the SRAM and EEPROM and restore the counters and records, e.g. after a brown-out
+
+        Raises:
+            RuntimeError: "Unable to Read Checkpoints"
+
+        Returns:
+            dict : boot_count, unclean_boots, clean (the last run called close()), header ('sram', 'eeprom' or None when
+                neither holds a valid header), records (list of dicts, oldest first) and staged (records only in SRAM)
+        """
+        try:
+            with self.rtc._transaction():
+                sram = self._read(self.rtc.registers['slave'], SRAM_START, SRAM_SIZE)
+                eeprom = self._read(EEPROM_ADDRESS, 0, EEPROM_SIZE)
+        except OSError:
+            raise RuntimeError("Unable to Read Checkpoints")
+        header, source = unpack_header(sram[:HEADER.size]), 'sram'
+        if header is None:
+            header, source = unpack_header(eeprom[EEPROM_HEADER:EEPROM_HEADER + HEADER.size]), 'eeprom'
+        if header is None:
+            header, source = {'boot_count': 0, 'unclean_boots': 0, 'clean': True}, None
+
+        def blocks(data, start, slots):
+            for slot in range(slots):
+                record = unpack_record(data[start + slot * RECORD.size:start + (slot + 1) * RECORD.size])
+                if record is not None:
+                    yield record
+        ring = {record['seq']: record for record in blocks(eeprom, EEPROM_RING, RING_SLOTS)}
+        last_written = max(ring, default=0)
+        staged = {record['seq']: record for record in blocks(sram, SRAM_STAGING - SRAM_START, STAGING_SLOTS)
+                  if record['seq'] > last_written}
+        records = sorted({**ring, **staged}.values(), key=lambda record: record['seq'])[-RING_SLOTS:]
+
+        self.boot_count = header['boot_count']
+        self.unclean_boots = header['unclean_boots']
+        self.clean = header['clean']
+        self.records = records
+        self.staged = [pack_record(**record) for record in records if record['seq'] in staged]
+        self.next_seq = records[-1]['seq'] + 1 if records else 1
+        return dict(header, header=source, records=records, staged=len(self.staged))
+
+    def boot(self):
+        """Recover the previous state and count this boot, a previous run that did not close() counts as unclean
+
+        Raises:
+            RuntimeError: "Unable to Read Checkpoints" or "Unable to Write Checkpoints"
+
+        Returns:
+            dict : the recovered state (see recover()) with the updated counters
+        """
+        state = self.recover()
+        with self._writing():
+            self.boot_count += 1
+            if state['header'] is not None and not state['clean']:
+                self.unclean_boots += 1
+            self.clean = False
+            self._write_header()
+        state.update(boot_count=self.boot_count, unclean_boots=self.unclean_boots)
+        return state
+
+    def checkpoint(self, timestamp, minimum, maximum, mean):
+        """Stage a summary in SRAM with one block write, the staged records are copied to the EEPROM every batch records
+
+        Args:
+            timestamp (float): seconds since the epoch
+            minimum, maximum, mean (float): temperatures in C, None when there were no samples
+
+        Staged records that could not be copied are retried on the next checkpoint. Once all STAGING_SLOTS are in use the
+        copy must succeed before a new record is staged, otherwise the record is refused so no staged record is overwritten.
+
+        Raises:
+            RuntimeError: "Unable to Write Checkpoints" or "EEPROM write cycle did not complete", the record stays staged
+                if only the EEPROM copy failed, or "Unable to Write Checkpoints, staging is full", the record was not written
+
+        Returns:
+            int : sequence number of the record
+        """
+        seq = self.next_seq
+        record = pack_record(seq, timestamp, minimum, maximum, mean)
+        with self._writing():
+            if len(self.staged) >= STAGING_SLOTS:
+                try:
+                    self.flush()
+                except RuntimeError:
+                    self.stats['refused'] += 1
+                    raise RuntimeError("Unable to Write Checkpoints, staging is full")
+            self._write_sram(SRAM_STAGING + seq % STAGING_SLOTS * RECORD.size, record)
+            self.next_seq += 1
+            self.staged.append(record)
+            self.records = (self.records + [unpack_record(record)])[-RING_SLOTS:]
+            if len(self.staged) >= self.batch:
+                self.flush()
+        return seq
+
+    def add_sample(self, value):
+        """Add a temperature to the summary written by the next checkpoint_samples(), None for a failed read"""
+        if value is not None:
+            self._samples.append(value)
+
+    def checkpoint_samples(self, timestamp):
+        """Checkpoint the minimum, maximum and mean of the samples added since the last call
+
+        Returns:
+            int : sequence number of the record
+        """
+        samples, self._samples = self._samples, []
+        if not samples:
+            return self.checkpoint(timestamp, None, None, None)
+        return self.checkpoint(timestamp, min(samples), max(samples), sum(samples) / len(samples))
+
+    def flush(self):
+        """Copy the staged records to their EEPROM ring slots"""
+        if not self.staged:
+            return
+        with self._writing():
+            for record in self.staged:
+                seq = RECORD.unpack(record)[0]
+                self._write_eeprom(EEPROM_RING + seq % RING_SLOTS * RECORD.size, record)
+            self.staged = []
+            self.stats['flushes'] += 1
+
+    def close(self):
+        """Flush the staged records and mark the shutdown as clean"""
+        with self._writing():
+            self.flush()
+            self.clean = True
+            self._write_header()
+
+    def format_state(self, state = None):
+        """Return the counters and records as printable text
+
+        Args:
+            state (dict): from recover() or boot(), the current state if not given
+        """
+        import datetime
+        if state is None:
+            state = {'boot_count': self.boot_count, 'unclean_boots': self.unclean_boots, 'records': self.records}
+        lines = [f"Boots: {state['boot_count']}, unclean: {state['unclean_boots']}"]
+        for record in state['records']:
+            time_text = datetime.datetime.fromtimestamp(record['timestamp'], datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            values = " ".join(f"{name} {'-' if record[name] is None else f'{record[name]:.2f}'}" for name in ('minimum', 'maximum', 'mean'))
+            lines.append(f"  #{record['seq']} {time_text} {values}")
+        return "\n".join(lines)
@@ -1,7 +1,7 @@
 #Maintainer Harrison Gordon
 import time
-from   smbus import SMBus
 import datetime
+import contextlib
 
 class RTC:
     '''
@@ -13,8 +13,10 @@ class RTC:
         -Get Date and Time from Clock
         -Enable/Disable Backup Battery
         -Reset Clock
+        -Program, acknowledge and wait for the two alarms (ALM0/ALM1) on the MFP output
     '''
-    i2c_bus = SMBus(1)
+    i2c_bus_number = 1
+    _i2c_bus = None
     registers = {
         'slave' : 0x6F,
         'second': 0x00,
@@ -23,8 +25,60 @@ class RTC:
         'wkday' : 0x3, #Register only utilized by battery
         'day' : 0x04,
         'month': 0x05,
-        'year' : 0x06
+        'year' : 0x06,
+        'control' : 0x07,
+        'alm0' : 0x0A, #ALM0SEC, ALM0MIN, ALM0HOUR, ALM0WKDAY, ALM0DATE, ALM0MTH
+        'alm1' : 0x11, #ALM1SEC to ALM1MTH, same layout
     }
+    bits = {
+        'st' : 0b10000000, #Start oscillator bit, second register
+        'oscrun' : 0b00100000, #Oscillator running status bit, wkday register
+        'pwrfail' : 0b00010000, #Power failure status bit, wkday register
+        'vbaten' : 0b00001000, #Backup battery enable bit, wkday register
+        'alm0en' : 0b00010000, #Alarm 0 enable bit, control register
+        'alm1en' : 0b00100000, #Alarm 1 enable bit, control register
+        'almpol' : 0b10000000, #MFP polarity while an alarm is asserted, ALM0WKDAY register (applies to both alarms)
+        'almif' : 0b00001000, #Alarm interrupt flag, ALMxWKDAY register
+    }
+    # Fields an alarm compares against the clock, ALMxMSK bits 6:4 of the ALMxWKDAY register
+    alarm_masks = {
+        'second' : 0b000,
+        'minute' : 0b001,
+        'hour' : 0b010,
+        'weekday' : 0b011,
+        'date' : 0b100,
+        'all' : 0b111, #Second, minute, hour, weekday, date and month
+    }
+    alarm_polarity = 0 #0 = MFP pulled low while an alarm is asserted (open drain), 1 = high
+    tick_check = 'oscrun' #'oscrun' polls the OSCRUN status bit, 'sleep' waits and compares seconds
+    oscrun_timeout = 1.0 #Seconds to wait for the oscillator to change state
+    oscrun_poll_interval = 0.01 #Seconds between OSCRUN reads
+    tick_sleep = 3 #Seconds waited by the 'sleep' tick check
+
+    @property
+    def i2c_bus(self):
+        """SMBus handle used by the RTC. The bus is opened on first use and shared by every RTC instance
+
+        Returns:
+            SMBus : handle for bus i2c_bus_number
+        """
+        if self._i2c_bus is None:
+            from smbus import SMBus
+            RTC._i2c_bus = SMBus(self.i2c_bus_number)
+        return self._i2c_bus
+
+    @i2c_bus.setter
+    def i2c_bus(self,bus):
+        self._i2c_bus = bus
+
+    def _transaction(self):
+        """Hold the bus over several I2C transactions when it is shared through I2C_Bus.bus_manager
+
+        Returns:
+            context manager : bus transaction, or a no-op for a plain SMBus handle
+        """
+        transaction = getattr(self.i2c_bus,'transaction',None)
+        return transaction() if transaction else contextlib.nullcontext()
 
     @staticmethod
     def status_verbose():
@@ -47,44 +101,117 @@ class RTC:
         tens = int(value / 10)
         return (tens<<4 | ones)
 
+    @staticmethod
+    def _decode(value):
+        """Decodes binary values from the RTC's registers into integers
+
+        Args:
+            value (int): value read from an RTC register, with any control bits already removed
+
+        Returns:
+            int: Decoded integer value
+        """
+        return (value>>4)*10 + (value & 0b00001111)
+
+    @staticmethod
+    def _decode_timekeeping(raw):
+        """Decodes a burst read of the timekeeping registers (0x00-0x06)
+
+        Args:
+            raw (list): the 7 register values starting at the second register
+
+        Returns:
+            tuple : (year, month, day, hour, minute, second)
+        """
+        second = RTC._decode(raw[0] & 0b01111111) #Remove the start oscillation bit
+        minute = RTC._decode(raw[1] & 0b01111111) #Remove uninitialized bit
+        hour = RTC._decode(raw[2] & 0b00111111) #Remove 12/24 hour format bit
+        day = RTC._decode(raw[4] & 0b00111111) #Remove unused bits
+        month = RTC._decode(raw[5] & 0b00011111) #Remove leap year bit
+        year = RTC._decode(raw[6]) + 2000
+        return (year, month, day, hour, minute, second)
+
     def _check_tick(self,clock_state):
-        """Verify that the clock is acting im accordance to it's desired state
+        """Verify that the clock is acting im accordance to it's desired state.
+        In 'oscrun' mode the OSCRUN status bit is polled and the check returns as soon as the oscillator state is confirmed.
+        In 'sleep' mode the seconds register is compared before and after waiting tick_sleep seconds.
 
         Args:
             clock_state (bool): State of clock (0=OFF,1=ON) 
 
+        Raises:
+            ValueError: f"Invalid tick check: {self.tick_check}"
+
         Returns:
             int : -1 if clock is in an undesirable state, 0 if clock is in desired state
         """
-        second_start = self._second
-        time.sleep(3)
-        time_diff = self._second - second_start
-        if clock_state == 1:
-            if time_diff > 0:
-                return 0
-            else:
-                return -1
-        elif clock_state == 0:
-            if time_diff == 0:
+        if self.tick_check == 'oscrun':
+            if self._wait_oscrun(clock_state,self.oscrun_timeout,self.oscrun_poll_interval):
                 return 0
-            else:
-                return -1
+            return -1
+        elif self.tick_check != 'sleep':
+            raise ValueError(f"Invalid tick check: {self.tick_check}")
+        second_start = self._second
+        time.sleep(self.tick_sleep)
+        return 0 if RTC._ticked_as_expected(clock_state,self._second - second_start) else -1
+
+    @staticmethod
+    def _ticked_as_expected(clock_state,time_diff):
+        """Return True if the seconds register advanced by time_diff over tick_sleep matches clock_state (0=OFF,1=ON)"""
+        return time_diff > 0 if clock_state == 1 else time_diff == 0
 
-    def __init__(self, battery_state = None, clock_state = None, i2c_status = None, datetime_value = None):
+    def _read_oscrun(self):
+        """Return the OSCRUN status bit, True while the oscillator is running"""
+        weekday_raw = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['wkday'])
+        return bool(weekday_raw & self.bits['oscrun'])
+
+    def _wait_oscrun(self,state,timeout,poll_interval):
+        """Poll the OSCRUN status bit until it reports the desired oscillator state
+
+        Args:
+            state (bool): State to wait for (0=Oscillator stopped,1=Oscillator running)
+            timeout (float): Seconds to wait before giving up
+            poll_interval (float): Seconds between reads of the wkday register
+
+        Returns:
+            bool : True if the oscillator reached the desired state, False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._read_oscrun() == bool(state):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+
+    def __init__(self, battery_state = None, clock_state = None, i2c_status = None, datetime_value = None,
+                 tick_check = None, oscrun_timeout = None, oscrun_poll_interval = None, i2c_bus = None):
         """Initialization of RTC class
 
         Args:
             battery_state (boolean): 0 = backup battery off, 1 = backup battery on
             clock_state (boolean): clock off, 1 = clock on 
+            tick_check (string): method used to verify the clock state, 'oscrun' or 'sleep'
+            oscrun_timeout (float): seconds to wait for OSCRUN to confirm the clock state
+            oscrun_poll_interval (float): seconds between OSCRUN reads
+            i2c_bus (SMBus): bus to use instead of opening SMBus(i2c_bus_number), e.g. BusManager().bus(1)
 
         Raises:
             RuntimeError: Initial communication failed, please verify setup.
         """
+        if i2c_bus is not None:
+            self.i2c_bus = i2c_bus
         try:
             self._second
         except:
             raise RuntimeError("Initial communication failed, please verify setup.")
 
+        if tick_check is not None:
+            self.tick_check = tick_check
+        if oscrun_timeout is not None:
+            self.oscrun_timeout = oscrun_timeout
+        if oscrun_poll_interval is not None:
+            self.oscrun_poll_interval = oscrun_poll_interval
         if battery_state:
             self.battery = battery_state
         if clock_state:
@@ -96,7 +223,7 @@ class RTC:
 
     def reset(self):
         """Reset the clock's time to 0:0:0 January 1 2000, battery to zero, and stop clock"""
-        self.datetime = "0-1-1-0-0-0" 
+        self.datetime = "2000-1-1-0-0-0"
         self.battery = 0 
         self.clock = 0 
         self.i2c_status = 0
@@ -123,19 +250,32 @@ class RTC:
             RuntimeError: "Clock unable to stop"
             RuntimeError: "Clock unable to start"
         """
-        second_raw = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['second'])
-        if state == 1:
-            clock_state = 0b10000000 | second_raw
-        elif state == 0:
-            clock_state = 0b01111111 & second_raw
-        else:
-            raise ValueError(f"Unable to set Clock. Invalid state:{state}")
-        self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['second'],clock_state)
+        self._write_st(state)
         if (self._check_tick(state) == -1):
-            if state == 0: 
-                raise RuntimeError("Clock unable to Stop")
-            if state == 1: 
-                raise RuntimeError("Clock unable to Start")
+            raise RTC._clock_error(state)
+
+    @staticmethod
+    def _clock_error(state):
+        return RuntimeError("Clock unable to Start" if state == 1 else "Clock unable to Stop")
+
+    def _write_st(self,state):
+        """Set or clear the start oscillator bit, keeping the seconds value
+
+        Args:
+            state (boolean): 0 = Turn clock off, 1 = Turn clock on
+
+        Raises:
+            ValueError: f"Unable to set Clock. Invalid state:{state}"
+        """
+        if not (state == 0 or state == 1):
+            raise ValueError(f"Unable to set Clock. Invalid state:{state}")
+        with self._transaction():
+            second_raw = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['second'])
+            if state == 1:
+                clock_state = 0b10000000 | second_raw
+            else:
+                clock_state = 0b01111111 & second_raw
+            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['second'],clock_state)
 
     @property
     def battery(self):
@@ -167,12 +307,13 @@ class RTC:
         if not (state == 0 or state == 1):
             raise RuntimeError(f"Invalid state: {state}")
         try:
-            weekday_raw = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['wkday'])
-            if state == 0:
-                battery_state = weekday_raw& 0b11110111
-            else:
-                battery_state = weekday_raw | 0b1000
-            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['wkday'],battery_state)
+            with self._transaction():
+                weekday_raw = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['wkday'])
+                if state == 0:
+                    battery_state = weekday_raw& 0b11110111
+                else:
+                    battery_state = weekday_raw | 0b1000
+                self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['wkday'],battery_state)
         except:
             raise RuntimeError("Unable to Set Battery")
 
@@ -204,8 +345,9 @@ class RTC:
             RuntimeError: "Unable to Set Second"
         """
         try:
-            second_encoded = self.clock << 7 | RTC._encode(value)
-            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['second'],second_encoded)
+            with self._transaction():
+                second_encoded = self.clock << 7 | RTC._encode(value)
+                self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['second'],second_encoded)
         except:
             raise RuntimeError("Unable to Set Second")
 
@@ -270,8 +412,9 @@ class RTC:
             RuntimeError: "Unable to Set Hours"
         """
         try:
-            hour_encoded =  (self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['hour']) & 0b1 << 7 ) | RTC._encode(value)
-            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['hour'],hour_encoded)
+            with self._transaction():
+                hour_encoded =  (self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['hour']) & 0b1 << 7 ) | RTC._encode(value)
+                self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['hour'],hour_encoded)
         except:
             raise RuntimeError("Unable to Set Hours")
 
@@ -360,8 +503,9 @@ class RTC:
             RuntimeError: "Unable to Set Month"
         """
         try:
-            month_encoded = RTC._encode(value) | (self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['month']) & 0b11100000)
-            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['month'],month_encoded)
+            with self._transaction():
+                month_encoded = RTC._encode(value) | (self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['month']) & 0b11100000)
+                self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['month'],month_encoded)
         except:
             raise RuntimeError("Unable to Set Month")
 
@@ -397,38 +541,266 @@ class RTC:
         except:
             raise RuntimeError("Unable to Get Year")
 
+    def _read_timekeeping(self):
+        """Read every timekeeping register (0x00-0x06) in a single I2C block read.
+        Reading them together keeps the values consistent across a rollover (e.g. 59s then minute++)
+
+        Raises:
+            RuntimeError: "Unable to Read Timekeeping Registers"
+
+        Returns:
+            list : the 7 raw register values starting at the second register
+        """
+        try:
+            return self.i2c_bus.read_i2c_block_data(self.registers['slave'],self.registers['second'],7)
+        except:
+            raise RuntimeError("Unable to Read Timekeeping Registers")
+
+    @property
+    def snapshot(self):
+        """Get Current datetime from RTC as a tuple, using one I2C transaction
+
+        Returns:
+            tuple : (year, month, day, hour, minute, second)
+        """
+        return RTC._decode_timekeeping(self._read_timekeeping())
+
+    @property
+    def timestamp(self):
+        """Get Current datetime from RTC as a datetime object, using one I2C transaction
+
+        Raises:
+            RuntimeError: f"Invalid datetime: {snapshot}"
+
+        Returns:
+            datetime.datetime : current datetime of the RTC
+        """
+        snapshot = self.snapshot
+        try:
+            return datetime.datetime(*snapshot)
+        except ValueError:
+            raise RuntimeError(f"Invalid datetime: {snapshot}")
+
     @property
     def datetime(self):
-        """Get Current datetime from RTC
+        """Get Current datetime from RTC, using one I2C transaction
 
         Returns:
             string: datetime in format year-month-day-hour-minute-second
         """
-        return f"{self._year}-{self._month}-{self._day}-{self._hour}-{self._minute}-{self._second}" 
+        return "{}-{}-{}-{}-{}-{}".format(*self.snapshot)
 
-    @datetime.setter
-    def datetime(self,datetime_raw):
-        """Checks if datetime_raw entered is valid datetime. Sets the datetime of the RTC in terms of years, months, days, hours, minutes, and seconds
+    def read_state(self):
+        """Read the clock, battery and datetime together in one block read of the timekeeping registers
+
+        Returns:
+            dict : {'clock': 0/1, 'battery': 0/1, 'datetime': datetime.datetime, or None if the registers do not hold a valid date}
+        """
+        raw = self._read_timekeeping()
+        try:
+            value = datetime.datetime(*RTC._decode_timekeeping(raw))
+        except ValueError:
+            value = None
+        return {
+            'clock' : raw[0] >> 7,
+            'battery' : (raw[3] & self.bits['vbaten']) >> 3,
+            'datetime' : value,
+        }
+
+    @staticmethod
+    def parse_datetime(datetime_raw):
+        """Parse a datetime in format "year-month-day-hour-minute-second"
 
         Args:
-            datetime_raw (string): datetime in format "%Y-%m-%d %H:%M:%S" 
+            datetime_raw (string or datetime.datetime): datetime to parse, a datetime object is returned unchanged
 
         Raises:
             RuntimeError: f"Invalid datetime: {datetime_raw}"
+
+        Returns:
+            datetime.datetime : parsed datetime (year 2000-2099)
         """
         try:
-            datetime_split = datetime_raw.split('-')
-            datetime_split = [int(i) for i in datetime_split]
-            datetime.datetime(datetime_split[0],datetime_split[1],datetime_split[2],datetime_split[3],datetime_split[4],datetime_split[5],0)
+            if isinstance(datetime_raw,datetime.datetime):
+                value = datetime_raw
+            else:
+                datetime_split = datetime_raw.split('-')
+                datetime_split = [int(i) for i in datetime_split]
+                value = datetime.datetime(datetime_split[0],datetime_split[1],datetime_split[2],datetime_split[3],datetime_split[4],datetime_split[5],0)
         except:
             raise RuntimeError(f"Invalid datetime: {datetime_raw}")
+        if not 2000 <= value.year <= 2099:
+            raise RuntimeError(f"Invalid datetime: {datetime_raw}")
+        return value
+
+    def _write_timekeeping(self,value):
+        """Write every timekeeping register (0x00-0x06) in a single I2C block write.
+        The control and status bits are preserved from one burst read. If the oscillator is running it is
+        stopped and OSCRUN is polled until clear before the new time is loaded, as recommended by the data sheet.
+        The block write restores the start oscillator bit, restarting the clock with the new time.
+        The bus is held for the read and stop write, then for the block write, but not while OSCRUN is polled.
+
+        Args:
+            value (datetime.datetime): datetime to load into the RTC (year 2000-2099)
+
+        Raises:
+            RuntimeError: "Clock unable to Stop"
+        """
+        with self._transaction():
+            raw = self._read_timekeeping()
+            if raw[0] & self.bits['st']:
+                self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['second'],raw[0] & 0b01111111)
+        #Other devices on the bus are not held up while the oscillator stops (up to oscrun_timeout)
+        if raw[0] & self.bits['st'] and not self._wait_oscrun(0,self.oscrun_timeout,self.oscrun_poll_interval):
+            raise RuntimeError("Clock unable to Stop")
+        image = [
+            RTC._encode(value.second) | (raw[0] & self.bits['st']),
+            RTC._encode(value.minute),
+            RTC._encode(value.hour), #24 hour format
+            (raw[3] & (self.bits['pwrfail'] | self.bits['vbaten'])) | value.isoweekday(),
+            RTC._encode(value.day),
+            RTC._encode(value.month) | (raw[5] & 0b11100000),
+            RTC._encode(value.year - 2000),
+        ]
+        with self._transaction():
+            self.i2c_bus.write_i2c_block_data(self.registers['slave'],self.registers['second'],image)
+
+    @datetime.setter
+    def datetime(self,datetime_raw):
+        """Checks if datetime_raw entered is valid datetime. Sets the datetime of the RTC in terms of years, months, days, hours, minutes, and seconds
+        using a single block write of the timekeeping registers
+
+        Args:
+            datetime_raw (string or datetime.datetime): datetime in format "year-month-day-hour-minute-second" or a datetime object
+
+        Raises:
+            RuntimeError: f"Invalid datetime: {datetime_raw}", "Clock unable to Stop" or "Unable to Set Datetime", i2c_status is set to 1 on a failed write
+        """
+        value = RTC.parse_datetime(datetime_raw)
         try:
-            self._second = datetime_split[5]
-            self._minute = datetime_split[4]
-            self._hour = datetime_split[3]
-            self._day = datetime_split[2]
-            self._month = datetime_split[1]
-            self._year = datetime_split[0]
-            self.i2c_status = 0
-        except:
+            self._write_timekeeping(value)
+        except RuntimeError:
+            self.i2c_status = 1
+            raise
+        except Exception:
             self.i2c_status = 1
+            raise RuntimeError("Unable to Set Datetime")
+        self.i2c_status = 0
+
+    def _alarm_register(self,alarm):
+        if alarm not in (0,1):
+            raise ValueError(f"Invalid alarm: {alarm}")
+        return self.registers[f'alm{alarm}']
+
+    def set_alarm(self,alarm,when,match = 'all',enable = True):
+        """Program the match condition of an alarm with one block write of its six registers, clearing its flag,
+        then enable it in the control register if it is not already enabled
+
+        Args:
+            alarm (int): 0 or 1
+            when (string or datetime.datetime): time to match, in format "year-month-day-hour-minute-second" (the year is ignored)
+            match (string): fields compared, one of alarm_masks ('all' fires once at when)
+            enable (bool): enable the alarm on the MFP output
+
+        Raises:
+            ValueError: f"Invalid alarm: {alarm}" or f"Invalid alarm match: {match}"
+            RuntimeError: f"Invalid datetime: {when}" or "Unable to Set Alarm"
+        """
+        register = self._alarm_register(alarm)
+        if match not in self.alarm_masks:
+            raise ValueError(f"Invalid alarm match: {match}")
+        value = RTC.parse_datetime(when)
+        weekday = self.alarm_masks[match] << 4 | value.isoweekday() #ALMxIF written as 0 clears the flag
+        if alarm == 0 and self.alarm_polarity:
+            weekday |= self.bits['almpol']
+        image = [RTC._encode(value.second),RTC._encode(value.minute),RTC._encode(value.hour),weekday,
+                 RTC._encode(value.day),RTC._encode(value.month)]
+        try:
+            with self._transaction():
+                self.i2c_bus.write_i2c_block_data(self.registers['slave'],register,image)
+                self._set_alarm_enable(alarm,enable)
+        except OSError:
+            raise RuntimeError("Unable to Set Alarm")
+
+    def _set_alarm_enable(self,alarm,enable):
+        bit = self.bits[f'alm{alarm}en']
+        control = self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['control'])
+        updated = control | bit if enable else control & ~bit
+        if updated != control:
+            self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['control'],updated)
+
+    def read_alarms(self):
+        """Read the control register and both alarms in one block read (0x07-0x16)
+
+        Raises:
+            RuntimeError: "Unable to Read Alarms"
+
+        Returns:
+            dict : {0: alarm, 1: alarm}, each a dict of enabled, flag, match and (month, day, hour, minute, second, weekday)
+        """
+        start = self.registers['control']
+        try:
+            raw = self.i2c_bus.read_i2c_block_data(self.registers['slave'],start,self.registers['alm1'] + 6 - start)
+        except OSError:
+            raise RuntimeError("Unable to Read Alarms")
+        masks = {value: name for name, value in self.alarm_masks.items()}
+        alarms = {}
+        for alarm in (0,1):
+            second, minute, hour, weekday, day, month = raw[self.registers[f'alm{alarm}'] - start:][:6]
+            alarms[alarm] = {
+                'enabled' : bool(raw[0] & self.bits[f'alm{alarm}en']),
+                'flag' : bool(weekday & self.bits['almif']),
+                'match' : masks.get(weekday >> 4 & 0b111),
+                'time' : (RTC._decode(month & 0b00011111),RTC._decode(day & 0b00111111),RTC._decode(hour & 0b00111111),
+                          RTC._decode(minute & 0b01111111),RTC._decode(second & 0b01111111),weekday & 0b111),
+            }
+        return alarms
+
+    def acknowledge_alarm(self,alarm):
+        """Clear the interrupt flag of an alarm, which releases the MFP output, keeping its match condition and enable
+
+        Raises:
+            ValueError: f"Invalid alarm: {alarm}"
+            RuntimeError: "Unable to Acknowledge Alarm"
+        """
+        register = self._alarm_register(alarm) + 3 #ALMxWKDAY
+        try:
+            with self._transaction():
+                weekday = self.i2c_bus.read_byte_data(self.registers['slave'],register)
+                if weekday & self.bits['almif']:
+                    self.i2c_bus.write_byte_data(self.registers['slave'],register,weekday & ~self.bits['almif'])
+        except OSError:
+            raise RuntimeError("Unable to Acknowledge Alarm")
+
+    def clear_alarm(self,alarm):
+        """Disable an alarm and clear its flag
+
+        Raises:
+            ValueError: f"Invalid alarm: {alarm}"
+            RuntimeError: "Unable to Clear Alarm"
+        """
+        self._alarm_register(alarm)
+        try:
+            with self._transaction():
+                self._set_alarm_enable(alarm,False)
+                self.acknowledge_alarm(alarm)
+        except (OSError,RuntimeError):
+            raise RuntimeError("Unable to Clear Alarm")
+
+    def wait_for_alarm(self,edge_source,timeout = None):
+        """Block on the MFP line without touching the bus, then read and acknowledge the alarms that fired
+
+        Args:
+            edge_source: object with a wait(timeout) method returning True on an edge, see GPIO/edge_source.py
+                ('falling' edges with the default alarm_polarity)
+            timeout (float): seconds to wait, None to wait forever
+
+        Returns:
+            list : the alarms (0 and/or 1) whose flag was set, empty for an edge without a flag, or None on timeout
+        """
+        if not edge_source.wait(timeout):
+            return None
+        fired = [alarm for alarm, state in self.read_alarms().items() if state['flag']]
+        for alarm in fired:
+            self.acknowledge_alarm(alarm)
+        return fired
@@ -0,0 +1,82 @@
+import datetime
+import pytest
+from alarm_scheduler import AlarmScheduler
+from rtc import RTC
+from I2C_Bus.sim_smbus import SimMCP79410, SimSMBus
+
+START = datetime.datetime(2023,2,5,0,0,0)
+EPOCH = START.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+class SimulatedMFP:
+    '''Edge source stand-in that lets simulated time pass while it waits, one second at a time'''
+    def __init__(self,device,now):
+        self.device = device
+        self.now = now
+        self.edges = 0
+        self.waited = 0.0
+        device.mfp_output = self._edge
+
+    def _edge(self):
+        self.edges += 1
+
+    def wait(self,timeout = None):
+        end = self.now[0] + timeout
+        while self.now[0] < end:
+            step = min(1.0,end - self.now[0])
+            self.now[0] += step
+            self.waited += step
+            self.device.update_alarms()
+            if self.edges:
+                self.edges -= 1
+                return True
+        return False
+
+def make_scheduler(period = 3600,mfp = True):
+    now = [0.5]
+    device = SimMCP79410(START,running=True,clock=lambda: now[0])
+    bus = SimSMBus(devices=[device])
+    source = SimulatedMFP(device,now)
+    if not mfp:
+        device.mfp_output = None
+    return AlarmScheduler(RTC(i2c_bus=bus),source,period), bus, now
+
+def test_next_due():
+    scheduler, _, _ = make_scheduler()
+    assert scheduler.next_due(EPOCH + 10) == EPOCH + 3600
+    scheduler.add_window(EPOCH + 600,EPOCH + 900,10)
+    assert scheduler.next_due(EPOCH + 10) == EPOCH + 600
+    assert scheduler.next_due(EPOCH + 600) == EPOCH + 610
+    assert scheduler.next_due(EPOCH + 895) == EPOCH + 3600 #The window ends before its next run
+    with pytest.raises(ValueError):
+        scheduler.add_window(EPOCH + 900,EPOCH + 600,10)
+    with pytest.raises(ValueError):
+        AlarmScheduler(None,None,0.5)
+
+def test_runs_on_alarms_without_polling():
+    scheduler, bus, now = make_scheduler()
+    scheduler.add_window(EPOCH + 7200,EPOCH + 7230,10)
+    runs = []
+    count = bus.transaction_count
+    scheduler.run(lambda due: runs.append((due,now[0])),count=5)
+    assert [due.strftime('%H:%M:%S') for due, _ in runs] == ['01:00:00','02:00:00','02:00:10','02:00:20','03:00:00']
+    assert all(0 < elapsed - (due - START).total_seconds() < 1 for due, elapsed in runs) #Within the second of the alarm
+    assert scheduler.stats == {'runs': 5, 'missed_edges': 0, 'errors': 0}
+    assert (bus.transaction_count - count) / 5 < 10 #A handful of transactions per run, however long the wait
+    assert not scheduler.rtc.read_alarms()[0]['enabled'] #Disabled on exit
+
+def test_missed_edge_is_caught_by_timeout():
+    scheduler, _, now = make_scheduler(period=60,mfp=False)
+    runs = []
+    scheduler.run(runs.append,count=2)
+    assert [due.strftime('%H:%M:%S') for due in runs] == ['00:01:00','00:02:00']
+    assert scheduler.stats['missed_edges'] == 2
+
+def test_callback_errors_do_not_stop_the_schedule(capsys):
+    scheduler, _, _ = make_scheduler(period=10)
+
+    def fail(due):
+        raise RuntimeError("Unable to Get Temperature")
+    scheduler.run(fail,count=3)
+    assert scheduler.stats['errors'] == 3
+    assert capsys.readouterr().out.splitlines() == ["alarm failed: Unable to Get Temperature"] * 3 #As reported by the daemon's scheduler
+    assert scheduler.format_stats() == "alarm: period 10s, runs 3, missed edges 0, errors 3"
@@ -0,0 +1,140 @@
+import pytest
+import checkpoint
+from checkpoint import CheckpointStore, RING_SLOTS, STAGING_SLOTS
+from rtc import RTC
+from I2C_Bus.sim_smbus import SimMCP79410, SimMCP79410EEPROM, SimSMBus
+
+class CountingBus:
+    '''Count the SMBus calls of the wrapped bus by name'''
+    def __init__(self,bus):
+        self.bus = bus
+        self.calls = {}
+
+    def __getattr__(self,name):
+        function = getattr(self.bus,name)
+
+        def call(*args):
+            self.calls[name] = self.calls.get(name,0) + 1
+            return function(*args)
+        return call
+
+def make_store(bus,**options):
+    return CheckpointStore(RTC(i2c_bus=bus),**options)
+
+def test_record_round_trip():
+    record = checkpoint.pack_record(7,1675556134,-5.25,40.5,None)
+    assert len(record) == checkpoint.RECORD.size == 16
+    assert checkpoint.unpack_record(record) == {'seq': 7, 'timestamp': 1675556134, 'minimum': -5.25, 'maximum': 40.5, 'mean': None}
+    corrupt = bytearray(record)
+    corrupt[5] ^= 0x01
+    assert checkpoint.unpack_record(corrupt) is None
+    assert checkpoint.unpack_record(bytes([0xFF] * 16)) is None #Erased EEPROM
+    assert checkpoint.unpack_header(checkpoint.pack_header(3,1,False)) == {'boot_count': 3, 'unclean_boots': 1, 'clean': False}
+
+def test_boot_counts_and_unclean_boots(sim_bus):
+    store = make_store(sim_bus)
+    state = store.boot()
+    assert (state['header'], state['boot_count'], state['unclean_boots']) == (None, 1, 0)
+    store.close()
+    state = make_store(sim_bus).boot() #Clean shutdown before
+    assert (state['header'], state['boot_count'], state['unclean_boots']) == ('sram', 2, 0)
+    state = make_store(sim_bus).boot() #Power lost without close()
+    assert (state['boot_count'], state['unclean_boots'], state['clean']) == (3, 1, False)
+
+def test_checkpoints_are_coalesced_into_pages():
+    bus = CountingBus(SimSMBus())
+    store = make_store(bus,batch=3)
+    store.boot()
+    eeprom = bus.bus.devices[0x57]
+    cycles = eeprom.write_cycles
+    writes = bus.calls['write_i2c_block_data']
+    for index in range(2):
+        store.checkpoint(1675556134 + index,20,21,20.5)
+    assert bus.calls['write_i2c_block_data'] - writes == 2 #One SRAM block write each
+    assert eeprom.write_cycles == cycles
+    store.checkpoint(1675556136,20,21,20.5)
+    assert eeprom.write_cycles - cycles == 6 #Three records of two whole pages
+    assert store.stats['page_writes'] == 2 + 6 #Plus the header copy written by boot()
+    assert store.staged == []
+
+def test_ack_polling_instead_of_fixed_delay():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+    bus = SimSMBus(devices=[SimMCP79410(),SimMCP79410EEPROM(write_time=0.004,clock=lambda: now[0])])
+    store = make_store(bus,batch=1,poll_interval=0.001,clock=lambda: now[0],sleep=sleep)
+    store.boot()
+    assert now[0] == pytest.approx(2 * 0.004) #Each page waited for its own write cycle and no longer
+    assert store.stats['ack_polls'] == 2 * 5
+
+    bus.devices[0x57].write_time = 1.0
+    with pytest.raises(RuntimeError):
+        store.checkpoint(1675556134,20,21,20.5)
+    assert len(store.staged) == 1 #Kept in SRAM and retried on the next flush
+
+def test_full_staging_refuses_records_instead_of_overwriting():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+    bus = SimSMBus(devices=[SimMCP79410(),SimMCP79410EEPROM(write_time=1.0,clock=lambda: now[0])])
+    store = make_store(bus,batch=1,clock=lambda: now[0],sleep=sleep)
+    for index in range(STAGING_SLOTS):
+        with pytest.raises(RuntimeError): #The EEPROM never finishes its write cycle
+            store.checkpoint(1675556134 + index,20,21,20.5)
+    with pytest.raises(RuntimeError, match="staging is full"):
+        store.checkpoint(1675556200,20,21,20.5)
+    assert store.stats['refused'] == 1
+    now[0] += 1.0 #Let the last EEPROM write cycle finish so it answers the recovery reads
+    assert make_store(bus).recover()['staged'] == STAGING_SLOTS #The oldest staged record was not overwritten
+
+    bus.devices[0x57].write_time = 0.0
+    store.checkpoint(1675556200,20,21,20.5)
+    assert store.staged == []
+    assert [record['seq'] for record in make_store(bus).recover()['records']] == list(range(1,STAGING_SLOTS + 2))
+
+def test_ring_and_recovery_from_one_bulk_read():
+    bus = CountingBus(SimSMBus())
+    store = make_store(bus,batch=2)
+    store.boot()
+    for index in range(RING_SLOTS + 4):
+        store.checkpoint(1675556134 + 60 * index,index,index + 1,index + 0.5)
+    # Brown-out: no close(), the last record is only in SRAM
+    recovered = make_store(bus)
+    bus.calls.clear()
+    state = recovered.recover()
+    assert bus.calls == {'read_i2c_block_data': 2 + 4} #64 bytes of SRAM and 128 bytes of EEPROM in 32 byte blocks
+    assert [record['seq'] for record in state['records']] == list(range(5,RING_SLOTS + 5))
+    assert state['records'][-1]['mean'] == pytest.approx(RING_SLOTS + 3.5)
+    assert state['staged'] == 1
+    recovered.flush()
+    assert recovered.recover()['staged'] == 0
+    assert recovered.next_seq == RING_SLOTS + 5
+    assert "#11" in recovered.format_state()
+
+def test_recovery_without_backup_battery():
+    bus = SimSMBus()
+    store = make_store(bus,batch=1)
+    store.boot()
+    store.checkpoint(1675556134,20,21,20.5)
+    store.close()
+    bus.devices[0x6F].registers[0x20:0x60] = bytes(0x40) #SRAM lost with the power
+    state = make_store(bus).boot()
+    assert state['header'] == 'eeprom'
+    assert state['boot_count'] == 2
+    assert [record['seq'] for record in state['records']] == [1]
+
+def test_invalid_batch(sim_bus):
+    with pytest.raises(ValueError):
+        make_store(sim_bus,batch=STAGING_SLOTS + 1)
+
+def test_checkpoint_samples(sim_bus):
+    store = make_store(sim_bus,batch=1)
+    store.boot()
+    for value in (20.0,None,22.5,21.0):
+        store.add_sample(value)
+    store.checkpoint_samples(1675556134)
+    store.checkpoint_samples(1675556194)
+    assert store.records[-2] == {'seq': 1, 'timestamp': 1675556134, 'minimum': 20.0, 'maximum': 22.5, 'mean': 21.17}
+    assert store.records[-1]['mean'] is None
@@ -1,10 +1,146 @@
 import rtc
+import datetime
 import time
 import pytest
 
+@pytest.mark.parametrize("raw,expected", [
+    ([0x00,0x00,0x00,0x01,0x01,0x01,0x00], "2000-1-1-0-0-0"),
+    ([0xB4,0x15,0x00,0x2D,0x05,0x22,0x23], "2023-2-5-0-15-34"), #ST, OSCRUN, VBATEN set
+    ([0xD9,0x59,0x23,0x07,0x31,0x32,0x99], "2099-12-31-23-59-59"), #LPYR set
+])
 def test_date_time(raw,expected):
-    pass
+    assert "{}-{}-{}-{}-{}-{}".format(*rtc.RTC._decode_timekeeping(raw)) == expected
+
+class WeekdayBus:
+    def __init__(self,weekday_raw):
+        self.weekday_raw = weekday_raw
+
+    def read_byte_data(self,address,register):
+        assert register == rtc.RTC.registers['wkday']
+        return self.weekday_raw
+
+@pytest.mark.parametrize("raw,expected", [
+    ((0b00100000,1), 0), #OSCRUN set, clock should be on
+    ((0b00000000,1), -1),
+    ((0b00000000,0), 0), #OSCRUN clear, clock should be off
+    ((0b00101000,0), -1),
+])
 def test_check_tick(raw,expected):
-    pass
+    weekday_raw, clock_state = raw
+    clock = rtc.RTC.__new__(rtc.RTC)
+    clock.i2c_bus = WeekdayBus(weekday_raw)
+    clock.oscrun_timeout = 0.05
+    clock.oscrun_poll_interval = 0.01
+    start = time.monotonic()
+    assert clock._check_tick(clock_state) == expected
+    assert time.monotonic() - start < 1
+
+@pytest.mark.parametrize("raw,expected", [
+    (0, 0x00),
+    (9, 0x09),
+    (10, 0x10),
+    (34, 0x34),
+    (59, 0x59),
+    (99, 0x99),
+])
 def test_encode(raw,expected):
-    pass
+    assert rtc.RTC._encode(raw) == expected
+    assert rtc.RTC._decode(expected) == raw
+
+def test_init_with_sim_bus(sim_bus):
+    clock = rtc.RTC(1,1,0,"2023-2-5-0-15-34",i2c_bus=sim_bus)
+    assert clock.datetime == "2023-2-5-0-15-34"
+    assert clock.timestamp.year == 2023
+    assert clock.battery == 1
+    assert clock.clock == 1
+    assert clock.i2c_status == 0
+
+def test_failed_datetime_write_raises(sim_bus):
+    clock = rtc.RTC(i2c_bus=sim_bus)
+    sim_bus.fail_next(1)
+    with pytest.raises(RuntimeError, match="Unable to Read Timekeeping Registers"):
+        clock.datetime = "2023-2-5-0-15-34"
+    assert clock.i2c_status == 1
+    clock.datetime = "2023-2-5-0-15-34"
+    assert clock.i2c_status == 0
+
+def test_datetime_is_one_transaction(sim_bus):
+    clock = rtc.RTC(i2c_bus=sim_bus)
+    count = sim_bus.transaction_count
+    clock.datetime
+    assert sim_bus.transaction_count == count + 1
+
+def test_datetime_does_not_hold_the_bus_while_stopping():
+    import threading
+    from I2C_Bus.bus_manager import BusManager
+    from I2C_Bus.sim_smbus import SimMCP79410, SimSMBus
+    bus = BusManager(lambda bus_number: SimSMBus(devices=[SimMCP79410(running=True)])).bus(1)
+    clock = rtc.RTC(i2c_bus=bus)
+    wait_oscrun = clock._wait_oscrun
+    other_device = []
+
+    def wait_with_other_device(*args):
+        thread = threading.Thread(target=lambda: other_device.append(bus.submit([('read_byte_data',0x6F,0x03)])))
+        thread.start()
+        thread.join(1) #Blocks for the whole timeout if the bus is still held
+        return wait_oscrun(*args)
+    clock._wait_oscrun = wait_with_other_device
+    clock.datetime = "2023-2-5-0-15-34"
+    assert len(other_device) == 1
+    assert clock.datetime == "2023-2-5-0-15-34"
+
+def test_reset(sim_bus):
+    clock = rtc.RTC(1,1,0,"2023-2-5-0-15-34",i2c_bus=sim_bus)
+    clock.reset()
+    assert clock.datetime == "2000-1-1-0-0-0"
+    assert clock.clock == 0
+    assert clock.battery == 0
+
+def test_read_state(sim_bus):
+    clock = rtc.RTC(i2c_bus=sim_bus)
+    assert clock.read_state() == {'clock': 0, 'battery': 0, 'datetime': datetime.datetime(2000,1,1)}
+    clock.battery = 1
+    clock.datetime = "2023-2-5-0-15-34"
+    state = clock.read_state()
+    assert (state['battery'], state['datetime']) == (1, datetime.datetime(2023,2,5,0,15,34))
+
+def test_set_alarm_is_one_block_write(sim_bus):
+    clock = rtc.RTC(1,1,0,"2023-2-5-0-15-34",i2c_bus=sim_bus)
+    count = sim_bus.transaction_count
+    clock.set_alarm(1,"2023-2-5-0-16-0",'all')
+    assert sim_bus.transaction_count - count == 3 #Alarm block, then read and write the control register
+    count = sim_bus.transaction_count
+    clock.set_alarm(1,"2023-2-5-0-17-0",'minute')
+    assert sim_bus.transaction_count - count == 2 #Already enabled
+    alarms = clock.read_alarms()
+    assert alarms[1] == {'enabled': True, 'flag': False, 'match': 'minute', 'time': (2,5,0,17,0,7)}
+    assert not alarms[0]['enabled']
+    with pytest.raises(ValueError):
+        clock.set_alarm(2,"2023-2-5-0-17-0")
+    with pytest.raises(ValueError):
+        clock.set_alarm(0,"2023-2-5-0-17-0",'year')
+
+def test_wait_for_alarm():
+    from GPIO.edge_source import PipeEdgeSource
+    from I2C_Bus.sim_smbus import SimMCP79410, SimSMBus
+    now = [0.0]
+    source = PipeEdgeSource()
+    device = SimMCP79410(datetime.datetime(2023,2,5,0,15,34),running=True,clock=lambda: now[0],mfp_output=source.trigger)
+    bus = SimSMBus(devices=[device])
+    clock = rtc.RTC(i2c_bus=bus)
+    clock.set_alarm(0,"2023-2-5-0-15-40",'second')
+    assert clock.wait_for_alarm(source,timeout=0.01) is None
+    now[0] = 6.5
+    device.update_alarms()
+    count = bus.transaction_count
+    assert clock.wait_for_alarm(source,timeout=1) == [0]
+    assert bus.transaction_count - count == 3 #Read both alarms, then acknowledge
+    assert not clock.read_alarms()[0]['flag']
+    now[0] = 66.5 #Second matches again a minute later
+    device.update_alarms()
+    assert clock.wait_for_alarm(source,timeout=1) == [0]
+    clock.clear_alarm(0)
+    now[0] = 126.5
+    device.update_alarms()
+    assert clock.wait_for_alarm(source,timeout=0.01) is None
+    source.close()
@@ -0,0 +1,85 @@
+import datetime
+import pytest
+from rtc import RTC
+from time_service import TimeService
+from I2C_Bus.sim_smbus import SimMCP79410, SimSMBus
+
+START = datetime.datetime(2023,2,5,0,15,34)
+
+def make_service(clock,rtc_rate = 1.0,wall_rate = 1.0,**options):
+    rtc_clock = lambda: clock.now * rtc_rate
+    start = clock.now - 0.3 #The RTC ticks at 0.7 s past each second of clock
+    clock.now = start
+    bus = SimSMBus(devices=[SimMCP79410(START,running=True,clock=rtc_clock)])
+    service = TimeService(RTC(i2c_bus=bus),clock=clock,wall_clock=lambda: 1.6e9 + clock.now * wall_rate,sleep=clock.sleep,**options)
+    clock.now = start + 0.3
+    return service, bus
+
+def test_aligned_anchor(fake_clock):
+    service, _ = make_service(fake_clock,poll_interval=0.002)
+    assert service.time() == pytest.approx(TimeService._epoch(START.timetuple()[:6]) + 1,abs=0.003)
+    assert service.anchor[0] == pytest.approx(0.7,abs=0.002)
+    assert service.uncertainty <= 0.002
+    fake_clock.now = 10.0
+    assert service.time() == pytest.approx(TimeService._epoch(START.timetuple()[:6]) + 10.3,abs=0.002)
+    assert service.datetime == "2023-2-5-0-15-44"
+
+def test_unaligned_anchor(fake_clock):
+    fake_clock.now = 0.2
+    service, _ = make_service(fake_clock,align=False)
+    assert service.timestamp == START + datetime.timedelta(seconds=0.5) #Read half way through the second on average
+    assert service.uncertainty == 0.5
+    assert service.stats['rtc_reads'] == 1
+
+def test_reads_only_on_resync(fake_clock):
+    service, bus = make_service(fake_clock,resync_interval=60,poll_interval=0.01)
+    service.time()
+    reads = service.stats['rtc_reads']
+    count = bus.transaction_count
+    for _ in range(1000):
+        fake_clock.sleep(0.05)
+        service.time()
+    assert bus.transaction_count == count #50 s of timestamps from memory
+    fake_clock.sleep(11)
+    service.time()
+    assert service.stats['syncs'] == 2
+    assert service.stats['rtc_reads'] - reads <= 5 #Polling starts just before the expected tick
+    assert abs(service.stats['last_correction']) < 0.01
+
+def test_resync_interval_zero_reads_every_time(fake_clock):
+    service, _ = make_service(fake_clock,resync_interval=0)
+    for _ in range(5):
+        service.time()
+    assert service.stats['rtc_reads'] == service.stats['syncs'] == 5
+
+def test_drift(fake_clock):
+    service, _ = make_service(fake_clock,rtc_rate=1 + 100e-6,wall_rate=1 - 50e-6,resync_interval=60,poll_interval=0.001)
+    assert service.drift()['monotonic_ppm'] is None
+    for _ in range(60):
+        service.time()
+        fake_clock.sleep(60)
+    drift = service.drift()
+    assert drift['monotonic_ppm'] == pytest.approx(100,abs=5)
+    assert drift['system_ppm'] == pytest.approx(150,abs=5)
+    assert drift['span'] > 3500
+    assert service.stats['last_correction'] == pytest.approx(0.006,abs=0.002) #100 ppm of 60 s
+    assert "ppm vs monotonic" in service.format_stats()
+
+def test_failed_resync_keeps_anchor(fake_clock):
+    service, bus = make_service(fake_clock,resync_interval=60,retry_interval=1,align=False)
+    first = service.time()
+    fake_clock.sleep(61)
+    bus.fail_next(1)
+    assert service.time() == pytest.approx(first + 61)
+    assert service.stats['sync_errors'] == 1
+    service.time()
+    assert service.stats['syncs'] == 1 #Retried only after retry_interval
+    fake_clock.sleep(1)
+    service.time()
+    assert service.stats['syncs'] == 2
+
+def test_first_sync_failure_raises(fake_clock):
+    service, bus = make_service(fake_clock)
+    bus.fail_next(1)
+    with pytest.raises(RuntimeError):
+        service.time()
@@ -0,0 +1,205 @@
+"""Timestamps from the RTC without an I2C read per sample
+
+The RTC is read once and anchored to time.monotonic(), timestamps in between are extrapolated from the anchor in memory
+and the RTC is read again every resync_interval seconds. Every read is also compared with the anchor and with the system
+clock, which gives the drift of the RTC against both.
+"""
+import collections
+import datetime
+import time
+
+class TimeService:
+    '''
+    Cached RTC time for high rate sampling
+
+    Functionality:
+        -Extrapolated timestamps from a monotonic anchor, with the same timestamp and datetime properties as RTC
+        -Resync from the RTC every resync_interval seconds, aligned to the tick of the seconds register
+        -Drift of the RTC against the monotonic clock and the system clock, from a least squares fit over recent syncs
+        -Failed resyncs keep the previous anchor and are retried after retry_interval seconds
+    '''
+    history_length = 64
+    tick_guard = 0.02 #Seconds before the expected tick that aligned polling starts, covers the drift between syncs
+
+    def __init__(self, rtc, resync_interval = 60, align = True, poll_interval = 0.005, retry_interval = 1,
+                 clock = time.monotonic, wall_clock = time.time, sleep = time.sleep):
+        """Initialization of TimeService class, the RTC is not read until the first timestamp
+
+        Args:
+            rtc (RTC): clock to read, only its snapshot property is used
+            resync_interval (float): seconds between RTC reads, 0 reads the RTC for every timestamp
+            align (bool): poll the RTC until its seconds register ticks when syncing, which anchors the sub-second phase
+                to about poll_interval instead of +-0.5 s, at the cost of waiting up to one second per sync. Once anchored,
+                polling starts just before the expected tick. Not used when resync_interval is 0
+            poll_interval (float): seconds between reads while waiting for the tick
+            retry_interval (float): seconds before a failed sync is retried
+            clock (function): monotonic clock in seconds
+            wall_clock (function): system clock in seconds since the epoch, for the drift report
+            sleep (function): used between polls
+        """
+        self.rtc = rtc
+        self.resync_interval = resync_interval
+        self.align = align
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.sleep = sleep
+        self.anchor = None #(monotonic time, RTC time as seconds since the epoch)
+        self.uncertainty = None
+        self.history = collections.deque(maxlen=self.history_length) #(monotonic, RTC epoch, system epoch) per sync
+        self.stats = {'timestamps': 0, 'syncs': 0, 'sync_errors': 0, 'rtc_reads': 0, 'last_correction': None, 'max_correction': 0.0}
+        self._next_sync = None
+
+    @staticmethod
+    def _epoch(snapshot):
+        return datetime.datetime(*snapshot).replace(tzinfo=datetime.timezone.utc).timestamp() #The RTC keeps UTC
+
+    def _read(self):
+        start = self.clock()
+        snapshot = self.rtc.snapshot
+        end = self.clock()
+        self.stats['rtc_reads'] += 1
+        return snapshot, start, end
+
+    def sync(self):
+        """Read the RTC and move the anchor to it
+
+        Raises:
+            RuntimeError: the RTC could not be read or holds an invalid datetime
+
+        Returns:
+            float : correction in seconds applied to the extrapolated time, None on the first sync
+        """
+        if self.align and self.resync_interval and self.anchor is not None:
+            # Sleep until just before the expected tick instead of polling for the whole second
+            guard = self.tick_guard + 2 * self.uncertainty
+            wait = 1 - self._extrapolate(self.clock()) % 1 - guard
+            if wait > 0:
+                self.sleep(wait)
+        snapshot, start, end = self._read()
+        if self.align and self.resync_interval:
+            # The seconds register ticked between two reads, the tick time is known to within the poll interval
+            previous = (start + end) / 2
+            deadline = end + 1.1
+            while True:
+                self.sleep(self.poll_interval)
+                current, start, end = self._read()
+                middle = (start + end) / 2
+                if current != snapshot:
+                    snapshot, anchor_time, uncertainty = current, (previous + middle) / 2, (middle - previous) / 2
+                    break
+                if end >= deadline:
+                    # The seconds register is not ticking (e.g. the oscillator is stopped), fall back to one read
+                    anchor_time, uncertainty = (start + end) / 2 - 0.5, 0.5
+                    break
+                previous = middle
+        else:
+            anchor_time, uncertainty = (start + end) / 2 - 0.5, 0.5 #The read is on average half way through the second
+        try:
+            rtc_epoch = TimeService._epoch(snapshot)
+        except ValueError:
+            raise RuntimeError(f"Invalid datetime: {snapshot}")
+        wall_epoch = self.wall_clock() - (self.clock() - anchor_time)
+
+        correction = None
+        if self.anchor is not None:
+            correction = rtc_epoch - self._extrapolate(anchor_time)
+            self.stats['last_correction'] = correction
+            self.stats['max_correction'] = max(self.stats['max_correction'], abs(correction))
+        self.anchor = (anchor_time, rtc_epoch)
+        self.uncertainty = uncertainty
+        self.history.append((anchor_time, rtc_epoch, wall_epoch))
+        self.stats['syncs'] += 1
+        self._next_sync = self.clock() + self.resync_interval
+        return correction
+
+    def _extrapolate(self, monotonic_time):
+        anchor_time, rtc_epoch = self.anchor
+        return rtc_epoch + (monotonic_time - anchor_time)
+
+    def time(self):
+        """Get the current RTC time as seconds since the epoch, reading the RTC only when a resync is due
+
+        Raises:
+            RuntimeError: the RTC could not be read and there is no earlier anchor to extrapolate from
+
+        Returns:
+            float : seconds since the epoch
+        """
+        now = self.clock()
+        if self.anchor is None or now >= self._next_sync:
+            try:
+                self.sync()
+            except RuntimeError:
+                self.stats['sync_errors'] += 1
+                if self.anchor is None:
+                    raise
+                self._next_sync = now + min(self.retry_interval, self.resync_interval)
+            now = self.clock()
+        self.stats['timestamps'] += 1
+        return self._extrapolate(now)
+
+    @property
+    def timestamp(self):
+        """Get the current RTC time as a datetime object, like RTC.timestamp
+
+        Returns:
+            datetime.datetime : current datetime of the RTC (UTC, without tzinfo)
+        """
+        return datetime.datetime.fromtimestamp(self.time(), datetime.timezone.utc).replace(tzinfo=None)
+
+    @property
+    def datetime(self):
+        """Get the current RTC time like RTC.datetime
+
+        Returns:
+            string: datetime in format year-month-day-hour-minute-second
+        """
+        return "{}-{}-{}-{}-{}-{}".format(*self.timestamp.timetuple()[:6])
+
+    @staticmethod
+    def _slope(points):
+        # Least squares slope of y over x, None with fewer than two distinct x
+        if len(points) < 2:
+            return None
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        variance = sum((x - mean_x) ** 2 for x, _ in points)
+        if not variance:
+            return None
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+    def drift(self):
+        """Get the drift of the RTC from the recent syncs
+
+        Returns:
+            dict : offset (RTC minus system clock in seconds at the last sync), monotonic_ppm and system_ppm
+                (how many microseconds the RTC gains per second of each clock, None until two syncs), span (seconds of syncs fitted)
+        """
+        history = list(self.history)
+        if not history:
+            return {'offset': None, 'monotonic_ppm': None, 'system_ppm': None, 'span': 0.0}
+        start = history[0][0]
+        monotonic = TimeService._slope([(anchor - start, rtc - anchor) for anchor, rtc, _ in history])
+        system = TimeService._slope([(anchor - start, rtc - wall) for anchor, rtc, wall in history])
+        return {
+            'offset': history[-1][1] - history[-1][2],
+            'monotonic_ppm': None if monotonic is None else monotonic * 1e6,
+            'system_ppm': None if system is None else system * 1e6,
+            'span': history[-1][0] - start,
+        }
+
+    def format_stats(self):
+        stats = self.stats
+        drift = self.drift()
+        text = (f"RTC time service: {stats['timestamps']} timestamps from {stats['rtc_reads']} RTC reads, "
+                f"{stats['syncs']} syncs, {stats['sync_errors']} sync errors")
+        if drift['offset'] is not None:
+            text += f", offset to system clock {drift['offset']:+.3f} s"
+        if drift['monotonic_ppm'] is not None:
+            text += (f", drift {drift['monotonic_ppm']:+.1f} ppm vs monotonic, {drift['system_ppm']:+.1f} ppm vs system clock "
+                     f"over {drift['span']:.0f} s")
+        if stats['last_correction'] is not None:
+            text += f", last correction {stats['last_correction']*1000:+.1f} ms"
+        return text
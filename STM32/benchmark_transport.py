@@ -0,0 +1,55 @@
+'''
+Throughput benchmark of the framed STM32 transport against the simulated STM32
+
+Usage (from the repository root):
+    python -m STM32.benchmark_transport [--size 16384] [--windows 1 4 8 16] [--clock 100000] [--corrupt-rate 0.0]
+
+The simulated bus charges the time of every byte at the given I2C clock (9 clock cycles per byte) plus the
+start/address overhead of each transaction, so the results track what the windowed acknowledgements save on the wire.
+'''
+import argparse
+import os
+import time
+from I2C_Bus.sim_smbus import SimSMBus, SimSTM32
+from STM32.stm32 import STM32
+from STM32.framed_transport import FramedTransport, MAX_PAYLOAD
+
+def run(size, window, byte_time, latency, corrupt_rate):
+    peer = SimSTM32(corrupt_rate=corrupt_rate, seed=1)
+    bus = SimSMBus(devices=[peer], latency=latency, byte_time=byte_time)
+    transport = FramedTransport(STM32(SimSTM32.address, bus=bus), window=window)
+    data = os.urandom(size)
+
+    start = time.perf_counter()
+    transport.send(data)
+    upload = time.perf_counter() - start
+    assert peer.messages == [data]
+
+    peer.queue_message(data)
+    start = time.perf_counter()
+    assert transport.receive() == data
+    download = time.perf_counter() - start
+    return upload, download, transport
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=16384, help='bytes transferred in each direction')
+    parser.add_argument('--windows', type=int, nargs='+', default=[1, 4, 8, 16], help='window sizes to compare, 1 is stop-and-wait')
+    parser.add_argument('--clock', type=int, default=100000, help='I2C clock in Hz')
+    parser.add_argument('--latency', type=float, default=0.0001, help='seconds of overhead per transaction')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='fraction of frames corrupted in each direction')
+    args = parser.parse_args()
+
+    byte_time = 9 / args.clock
+    frames = -(-args.size // MAX_PAYLOAD)
+    print(f"{args.size} bytes in {frames} frames each way, {args.clock / 1000:g} kHz I2C, corrupt rate {args.corrupt_rate}")
+    print(f"Legacy STM32.transmit (2 s sleep per 31 byte block): {-(-args.size // 31) * 2:.0f} s per direction")
+    print(f"{'window':>6} {'upload KiB/s':>13} {'download KiB/s':>15} {'acks':>6} {'resent':>7} {'CRC errors':>11}")
+    for window in args.windows:
+        upload, download, transport = run(args.size, window, byte_time, args.latency, args.corrupt_rate)
+        stats = transport.stats
+        print(f"{window:>6} {args.size / upload / 1024:>13.2f} {args.size / download / 1024:>15.2f} {stats['acks']:>6} "
+              f"{stats['retransmits']:>7} {stats['crc_errors']:>11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+'''
+Framed, CRC checked transfers over the STM32 I2C link
+
+Every frame is one SMBus block of at most 32 bytes:
+    seq (1 byte), flags (1 byte), payload length (1 byte), payload (0-27 bytes), CRC-16/CCITT of the header and payload (2 bytes, big endian)
+Messages larger than one frame are split into frames flagged START ... END.
+
+The bus is driven by the host, so the sliding window is go-back-N with cumulative acknowledgements: up to window frames
+are sent (or read) before the STM32's next expected sequence number is exchanged, instead of one acknowledgement per frame.
+Frames after a lost or corrupted one are resent from the first one the STM32 is missing.
+'''
+import binascii
+import time
+
+REGISTERS = {
+    'FRAME' : 0x10, #Host writes a frame
+    'ACK' : 0x11, #Host reads [next expected seq, messages received] or writes [next expected seq]
+    'READ_FRAME' : 0x12, #Host reads the next frame queued by the STM32
+    'RESET' : 0x13, #Restart both sequence numbers
+}
+FLAGS = {
+    'START' : 0x01,
+    'END' : 0x02,
+    'IDLE' : 0x04, #Nothing queued, sent by the STM32 instead of a frame
+}
+HEADER_SIZE = 3
+CRC_SIZE = 2
+MAX_FRAME_SIZE = 32 #SMBus block limit
+MAX_PAYLOAD = MAX_FRAME_SIZE - HEADER_SIZE - CRC_SIZE
+
+def crc16(data):
+    return binascii.crc_hqx(bytes(data), 0xFFFF)
+
+def encode_frame(seq, flags, payload):
+    '''
+    Return the block of bytes for one frame
+
+    Raises:
+        ValueError: f"Frame payload too large: {len(payload)} > {MAX_PAYLOAD}"
+    '''
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Frame payload too large: {len(payload)} > {MAX_PAYLOAD}")
+    body = bytes([seq & 0xFF, flags, len(payload)]) + bytes(payload)
+    return list(body + crc16(body).to_bytes(CRC_SIZE, 'big'))
+
+def decode_frame(block):
+    '''
+    Return (seq, flags, payload) of a frame, or None if it is truncated or fails the CRC
+    '''
+    if len(block) < HEADER_SIZE + CRC_SIZE or block[2] > min(MAX_PAYLOAD, len(block) - HEADER_SIZE - CRC_SIZE):
+        return None
+    end = HEADER_SIZE + block[2]
+    if crc16(block[:end]) != int.from_bytes(bytes(block[end:end + CRC_SIZE]), 'big'):
+        return None
+    return block[0], block[1], bytes(block[HEADER_SIZE:end])
+
+def split_message(data):
+    '''
+    Return the (flags, payload) of the frames carrying data
+    '''
+    chunks = [data[i:i + MAX_PAYLOAD] for i in range(0, len(data), MAX_PAYLOAD)] or [b'']
+    return [((FLAGS['START'] if index == 0 else 0) | (FLAGS['END'] if index == len(chunks) - 1 else 0), chunk)
+            for index, chunk in enumerate(chunks)]
+
+class FramedTransport:
+    '''
+    Framed bulk transfers to and from an STM32
+
+    Functionality:
+    - Split messages of any size into CRC checked frames that fit the 32 byte SMBus block limit
+    - Keep up to window frames outstanding between acknowledgements (window=1 is stop-and-wait)
+    - Resend lost or corrupted frames (go-back-N)
+    - Count frames, retransmissions, CRC errors and throughput
+    '''
+
+    def __init__(self, stm32, window = 8, timeout = 1.0):
+        '''
+        Initialization of FramedTransport class, restarts the STM32's sequence numbers
+
+        Args:
+            stm32 (STM32): link to the STM32, its bus, slave_address and timeout_thershold are used
+            window (int): frames sent or read between acknowledgements (1-127)
+            timeout (float): seconds send() and receive() wait without any frame getting through before giving up
+        '''
+        if not 1 <= window <= 127:
+            raise ValueError(f"Invalid window: {window}")
+        self.stm32 = stm32
+        self.window = window
+        self.timeout = timeout
+        self.stats = {'frames_sent': 0, 'frames_received': 0, 'retransmits': 0, 'crc_errors': 0, 'acks': 0,
+                      'bus_errors': 0, 'bytes_sent': 0, 'bytes_received': 0, 'elapsed': 0.0}
+        self._call(self.stm32.bus.write_i2c_block_data, self.stm32.slave_address, REGISTERS['RESET'], [0])
+        self.tx_seq = 0
+        self.rx_seq = 0
+
+    def _call(self, function, *args):
+        # Retry a bus transaction up to the STM32's timeout_thershold
+        retries = 0
+        while True:
+            try:
+                return function(*args)
+            except OSError:
+                self.stats['bus_errors'] += 1
+                retries += 1
+                if retries > self.stm32.timeout_thershold:
+                    raise RuntimeError(f"STM32 {hex(self.stm32.slave_address)} not responding")
+
+    def send(self, data):
+        '''
+        Send data as one framed message, returns when the STM32 has acknowledged every frame
+
+        Raises:
+            RuntimeError: the STM32 stopped responding, accepted no frame within timeout seconds or acknowledged frames that were not sent
+        '''
+        start = time.monotonic()
+        deadline = start + self.timeout
+        bus, address = self.stm32.bus, self.stm32.slave_address
+        frames = [encode_frame(self.tx_seq + index, flags, chunk) for index, (flags, chunk) in enumerate(split_message(data))]
+        base = 0 #First frame not acknowledged
+        sent = 0 #Next frame to send
+        highest = 0 #Frames sent at least once
+        while base < len(frames):
+            while sent < len(frames) and sent - base < self.window:
+                try:
+                    bus.write_i2c_block_data(address, REGISTERS['FRAME'], frames[sent])
+                except OSError:
+                    self.stats['bus_errors'] += 1 #Resent after the acknowledgement shows it missing
+                self.stats['frames_sent'] += 1
+                if sent < highest:
+                    self.stats['retransmits'] += 1
+                sent += 1
+                highest = max(highest, sent)
+            expected = self._call(bus.read_i2c_block_data, address, REGISTERS['ACK'], 2)[0]
+            self.stats['acks'] += 1
+            acked = (expected - self.tx_seq - base) & 0xFF
+            if acked > sent - base:
+                raise RuntimeError(f"STM32 acknowledged unsent frame {expected}")
+            base += acked
+            sent = base
+            if acked:
+                deadline = time.monotonic() + self.timeout
+            elif time.monotonic() >= deadline:
+                raise RuntimeError(f"STM32 accepted no frame within {self.timeout} s")
+        self.tx_seq = (self.tx_seq + len(frames)) & 0xFF
+        self.stats['bytes_sent'] += len(data)
+        self.stats['elapsed'] += time.monotonic() - start
+
+    def receive(self):
+        '''
+        Read the next framed message queued by the STM32
+
+        Raises:
+            RuntimeError: f"No message from STM32 within {self.timeout} s"
+        '''
+        start = time.monotonic()
+        deadline = start + self.timeout
+        bus, address = self.stm32.bus, self.stm32.slave_address
+        chunks = []
+        while True:
+            complete = False
+            idle = False
+            received = self.stats['frames_received']
+            for _ in range(self.window):
+                try:
+                    block = bus.read_i2c_block_data(address, REGISTERS['READ_FRAME'], MAX_FRAME_SIZE)
+                except OSError:
+                    self.stats['bus_errors'] += 1
+                    break
+                frame = decode_frame(block)
+                if frame is None:
+                    self.stats['crc_errors'] += 1
+                    break
+                seq, flags, payload = frame
+                if flags & FLAGS['IDLE']:
+                    idle = True
+                    break
+                if seq != self.rx_seq:
+                    break #A frame before this one was lost, the STM32 goes back to rx_seq after the acknowledgement
+                self.stats['frames_received'] += 1
+                self.rx_seq = (self.rx_seq + 1) & 0xFF
+                if flags & FLAGS['START']:
+                    chunks = []
+                chunks.append(payload)
+                if flags & FLAGS['END']:
+                    complete = True
+                    break
+            self._call(bus.write_i2c_block_data, address, REGISTERS['ACK'], [self.rx_seq])
+            self.stats['acks'] += 1
+            if complete:
+                data = b''.join(chunks)
+                self.stats['bytes_received'] += len(data)
+                self.stats['elapsed'] += time.monotonic() - start
+                return data
+            if self.stats['frames_received'] != received:
+                deadline = time.monotonic() + self.timeout
+            elif time.monotonic() >= deadline: #Idle, or only corrupted and out of sequence frames
+                raise RuntimeError(f"No message from STM32 within {self.timeout} s")
+            if idle:
+                time.sleep(self.stm32.ready_backoff)
+
+    def format_stats(self):
+        stats = self.stats
+        transferred = stats['bytes_sent'] + stats['bytes_received']
+        throughput = transferred / stats['elapsed'] / 1024 if stats['elapsed'] else 0.0
+        return (f"Framed transport (window {self.window}): {stats['frames_sent']} frames sent, {stats['frames_received']} received, "
+                f"{stats['retransmits']} retransmitted, {stats['crc_errors']} CRC errors, {stats['acks']} acknowledgements, "
+                f"{transferred} bytes at {throughput:.2f} KiB/s")
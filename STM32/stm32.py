@@ -1,53 +1,164 @@
+import contextlib
 import time
-from colorama import Fore, Back, Style
-import smbus
 
 class STM32:
     defined_bits = {
             'BAD_BYTE' : 0x0,
+            'READY' : 0x1, #Status byte returned once the STM32 can take the data phase of a command
             'WRITE' : 0x2,
             'READ' : 0x3,
             }
 
-    bus = smbus.SMBus(1)
+    bus_number = 1
+    _bus = None
     timeout_thershold = 3
-    
-    def __init__(self,slave_address):
+    handshake = 'sleep' #'sleep' waits command_delay after each command, 'ready' polls the status byte
+    command_delay = 2 #Seconds waited by the 'sleep' handshake
+    ready_timeout = 0.5 #Seconds to wait for the READY status before the command is retried
+    ready_backoff = 0.0005 #First delay between status polls, doubled after every poll
+    ready_backoff_max = 0.02 #Longest delay between status polls
+
+    def __init__(self,slave_address,bus = None,handshake = None,ready_timeout = None):
+        # bus can be given to use a shared bus (e.g. BusManager().bus(1)) instead of opening SMBus(bus_number)
         self.slave_address = slave_address
+        if bus is not None:
+            self.bus = bus
+        if handshake is not None:
+            if handshake not in ('sleep','ready'):
+                raise ValueError(f"Invalid handshake: {handshake}")
+            self.handshake = handshake
+        if ready_timeout is not None:
+            self.ready_timeout = ready_timeout
+        self.last_transaction = None
+        self.totals = {'transactions': 0, 'failures': 0, 'retries': 0, 'polls': 0, 'latency_total': 0.0, 'latency_max': 0.0}
 
-    def transmit(self,data):
-        print(f"Transmitting {data} to address " + hex(self.slave_address))
-        data[:0] = [self.defined_bits.get('BAD_BYTE')]
-        cmd_data = [self.defined_bits.get('WRITE')]
-        timeout = 0 
+    @property
+    def bus(self):
+        # Opened on first use and shared by every STM32 instance
+        if self._bus is None:
+            import smbus
+            STM32._bus = smbus.SMBus(self.bus_number)
+        return self._bus
+
+    @bus.setter
+    def bus(self,bus):
+        self._bus = bus
+
+    def _transaction(self):
+        # Hold a bus shared through I2C_Bus.bus_manager for a whole exchange, a no-op for a plain SMBus handle
+        transaction = getattr(self.bus,'transaction',None)
+        return transaction() if transaction else contextlib.nullcontext()
+
+    @staticmethod
+    def _warn(message):
+        # colorama only colours the warning, it is imported here so the driver works without it
+        try:
+            from colorama import Fore
+            message = Fore.RED + message
+        except ImportError:
+            pass
+        print(message)
+
+    # The helpers below hold the handshake decisions shared with AsyncSTM32 (obc_async.py), which only replaces the waits
+
+    def _read_ready(self):
+        # Read the status byte, True once the STM32 reports READY
+        try:
+            return self.bus.read_byte(self.slave_address) == self.defined_bits['READY']
+        except OSError:
+            return False #A busy STM32 may NACK the status read
+
+    def _backoff(self):
+        # Delays between status polls, ready_backoff doubled after every poll up to ready_backoff_max
+        delay = self.ready_backoff
         while True:
-            try:
-                self.bus.write_i2c_block_data(0x15,0,cmd_data)
-            except:
-                time.sleep(2)
-                timeout += 1
-                if timeout > timeout_thershold:
-                    print(Fore.RED +"WARNING: I2C Bus is likely Bad, Power Cycle to fix")
-                    return
-            else:
-                break
-        time.sleep(2)
-        data = self.bus.write_i2c_block_data(self.slave_address,0x0,data)
+            yield delay
+            delay = min(delay * 2,self.ready_backoff_max)
 
-    def recieve(self,expected_bytes):
-        cmd_data = [self.defined_bits.get('READ')]
-        timeout = 0 
+    def _give_up(self,retries):
+        # Called after each failed command attempt with the retries so far, True once timeout_thershold is exceeded
+        if retries > self.timeout_thershold:
+            self._warn("WARNING: I2C Bus is likely Bad, Power Cycle to fix")
+            return True
+        return False
+
+    def _wait_ready(self):
+        # Poll the status byte with an exponential backoff until READY or ready_timeout, returns (ready, polls)
+        deadline = time.monotonic() + self.ready_timeout
+        delays = self._backoff()
+        polls = 0
+        while True:
+            polls += 1
+            if self._read_ready():
+                return True, polls
+            now = time.monotonic()
+            if now >= deadline:
+                return False, polls
+            time.sleep(min(next(delays),deadline - now))
+
+    def _command(self,command):
+        # Send a command byte and wait until the data phase can start, returns (ok, retries, polls)
+        retries = 0
+        polls = 0
         while True:
             try:
-                self.bus.write_i2c_block_data(0x15,0,cmd_data)
-            except:
-                time.sleep(2)
-                timeout += 1 
-                if timeout > self.timeout_thershold:
-                    print(Fore.RED +"WARNING: I2C Bus is likely Bad, Power Cycle to fix")
-                    return
-            else:
-                break
-        time.sleep(2)
-        data = self.bus.read_i2c_block_data(self.slave_address,0x0,expected_bytes+2)
-        return(data[2:])
+                self.bus.write_i2c_block_data(self.slave_address,0,[command])
+                if self.handshake == 'ready':
+                    ready, command_polls = self._wait_ready()
+                    polls += command_polls
+                else:
+                    time.sleep(self.command_delay)
+                    ready = True
+            except OSError:
+                ready = False
+            if ready:
+                return True, retries, polls
+            retries += 1
+            if self._give_up(retries):
+                return False, retries, polls
+            if self.handshake == 'sleep':
+                time.sleep(self.command_delay)
+
+    def _record(self,name,start,ok,retries,polls):
+        latency = time.monotonic() - start
+        self.last_transaction = {'command': name, 'ok': ok, 'latency': latency, 'retries': retries, 'polls': polls}
+        self.totals['transactions'] += 1
+        self.totals['failures'] += not ok
+        self.totals['retries'] += retries
+        self.totals['polls'] += polls
+        self.totals['latency_total'] += latency
+        self.totals['latency_max'] = max(self.totals['latency_max'],latency)
+
+    def stats(self):
+        # Totals over every transmit/recieve, latencies are in seconds
+        stats = dict(self.totals)
+        stats['latency_mean'] = stats.pop('latency_total') / stats['transactions'] if stats['transactions'] else 0.0
+        return stats
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f"STM32 {hex(self.slave_address)} ({self.handshake} handshake): {stats['transactions']} transactions, "
+                f"{stats['failures']} failed, {stats['retries']} retries, {stats['polls']} status polls, "
+                f"latency mean {stats['latency_mean']*1000:.3f} ms, max {stats['latency_max']*1000:.3f} ms")
+
+    # transmit and recieve hold the bus from the command byte to the end of the data phase, so another thread cannot
+    # start an exchange with the STM32 in between (the bus stays held during the handshake wait)
+
+    def transmit(self,data):
+        print(f"Transmitting {data} to address " + hex(self.slave_address))
+        with self._transaction():
+            start = time.monotonic()
+            ok, retries, polls = self._command(self.defined_bits.get('WRITE'))
+            if ok:
+                self.bus.write_i2c_block_data(self.slave_address,0x0,[self.defined_bits.get('BAD_BYTE')] + list(data))
+        self._record('WRITE',start,ok,retries,polls)
+
+    def recieve(self,expected_bytes):
+        data = None
+        with self._transaction():
+            start = time.monotonic()
+            ok, retries, polls = self._command(self.defined_bits.get('READ'))
+            if ok:
+                data = self.bus.read_i2c_block_data(self.slave_address,0x0,expected_bytes+2)[2:]
+        self._record('READ',start,ok,retries,polls)
+        return data
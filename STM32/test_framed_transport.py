@@ -0,0 +1,77 @@
+import pytest
+from stm32 import STM32
+from framed_transport import FramedTransport, MAX_PAYLOAD, decode_frame, encode_frame
+
+def test_frame_round_trip():
+    frame = encode_frame(300, 0x3, b'abc')
+    assert len(frame) == 3 + 3 + 2
+    assert decode_frame(frame + [0] * 10) == (300 & 0xFF, 0x3, b'abc')
+    frame[4] ^= 0x10
+    assert decode_frame(frame) is None
+    with pytest.raises(ValueError):
+        encode_frame(0, 0, bytes(MAX_PAYLOAD + 1))
+
+@pytest.mark.parametrize("size", [0, 1, MAX_PAYLOAD, MAX_PAYLOAD + 1, 5000])
+@pytest.mark.parametrize("window", [1, 8])
+def test_send_and_receive(sim_bus, size, window):
+    data = bytes(i * 7 & 0xFF for i in range(size))
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),window=window)
+    transport.send(data)
+    transport.send(data[::-1]) #Sequence numbers carry on across messages and wrap after 255 frames
+    assert sim_bus.devices[0x15].messages == [data, data[::-1]]
+    sim_bus.devices[0x15].queue_message(data)
+    assert transport.receive() == data
+    assert transport.stats['retransmits'] == 0
+
+def test_window_reduces_acknowledgements(sim_bus):
+    data = bytes(MAX_PAYLOAD * 64)
+    acks = {}
+    for window in (1, 16):
+        transport = FramedTransport(STM32(0x15,bus=sim_bus),window=window)
+        transport.send(data)
+        acks[window] = transport.stats['acks']
+    assert acks == {1: 64, 16: 4}
+
+def test_corrupted_frames_are_resent(sim_bus):
+    from I2C_Bus.sim_smbus import SimSTM32
+    peer = SimSTM32(corrupt_rate=0.2,seed=1)
+    sim_bus.devices[0x15] = peer
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),window=8)
+    data = bytes(range(256)) * 20
+    transport.send(data)
+    peer.queue_message(data[::-1])
+    assert transport.receive() == data[::-1]
+    assert peer.messages == [data]
+    assert peer.crc_errors > 0
+    assert transport.stats['crc_errors'] > 0
+    assert transport.stats['retransmits'] > 0
+
+def test_bus_faults_are_resent(sim_bus):
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),window=4)
+    sim_bus.fail_next(3,0x15)
+    transport.send(bytes(range(200)))
+    assert sim_bus.devices[0x15].messages == [bytes(range(200))]
+    assert transport.stats['bus_errors'] == 3
+
+def test_receive_timeout(sim_bus):
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),timeout=0.01)
+    with pytest.raises(RuntimeError, match="No message"):
+        transport.receive()
+
+def test_send_gives_up_when_no_frame_gets_through(sim_bus):
+    from I2C_Bus.sim_smbus import SimSTM32
+    sim_bus.devices[0x15] = SimSTM32(corrupt_rate=1.0)
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),timeout=0.05)
+    with pytest.raises(RuntimeError, match="accepted no frame"):
+        transport.send(bytes(100))
+    assert transport.stats['retransmits'] > 0
+
+def test_receive_times_out_on_corrupted_frames(sim_bus):
+    from I2C_Bus.sim_smbus import SimSTM32
+    peer = SimSTM32(corrupt_rate=1.0)
+    sim_bus.devices[0x15] = peer
+    transport = FramedTransport(STM32(0x15,bus=sim_bus),timeout=0.05)
+    peer.queue_message(bytes(100))
+    with pytest.raises(RuntimeError, match="No message"):
+        transport.receive()
+    assert transport.stats['crc_errors'] > 0
@@ -0,0 +1,57 @@
+import time
+import pytest
+from stm32 import STM32
+
+def test_ready_handshake_round_trip(sim_bus):
+    sim_bus.devices[0x15].ready_delay = 0.005
+    stm32 = STM32(0x15,bus=sim_bus,handshake='ready')
+    start = time.monotonic()
+    stm32.transmit([5,7,21,8])
+    assert stm32.recieve(4) == [5,7,21,8]
+    assert time.monotonic() - start < 0.2
+    stats = stm32.stats()
+    assert (stats['transactions'], stats['failures'], stats['retries']) == (2, 0, 0)
+    assert stats['polls'] > 2 #The first poll is made before ready_delay has passed
+    assert stm32.last_transaction['command'] == 'READ'
+
+def test_ready_handshake_retries_bus_faults(sim_bus):
+    stm32 = STM32(0x15,bus=sim_bus,handshake='ready')
+    sim_bus.fail_next(2,0x15)
+    stm32.transmit([1,2])
+    assert stm32.last_transaction['ok']
+    assert stm32.last_transaction['retries'] == 2
+    assert sim_bus.devices[0x15].inbox == [1,2]
+
+def test_ready_timeout(sim_bus):
+    sim_bus.devices[0x15].ready_delay = 10
+    stm32 = STM32(0x15,bus=sim_bus,handshake='ready',ready_timeout=0.01)
+    stm32.timeout_thershold = 1
+    assert stm32.recieve(4) is None
+    assert stm32.last_transaction['ok'] is False
+    assert stm32.stats()['failures'] == 1
+
+def test_sleep_handshake_uses_slave_address(sim_bus):
+    sim_bus.devices = {0x16: sim_bus.devices.pop(0x15)}
+    stm32 = STM32(0x16,bus=sim_bus)
+    stm32.command_delay = 0
+    stm32.transmit([3])
+    assert stm32.recieve(1) == [3]
+
+def test_exchanges_hold_the_shared_bus():
+    import threading
+    from I2C_Bus.bus_manager import BusManager
+    from I2C_Bus.sim_smbus import SimSTM32, SimSMBus
+    bus = BusManager(lambda bus_number: SimSMBus(devices=[SimSTM32()])).bus(1)
+    stm32 = STM32(0x15,bus=bus)
+    stm32.command_delay = 0.01
+    threads = [threading.Thread(target=stm32.transmit,args=([value],)) for value in (1,2,3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(bus.handle.devices[0x15].received) == [[1],[2],[3]] #No command byte lands inside another exchange
+    assert bus.stats()['acquisitions'] == 3
+
+def test_invalid_handshake():
+    with pytest.raises(ValueError):
+        STM32(0x15,handshake='fast')
@@ -9,3 +9,4 @@ data = [0x5,0x7,0x15,0x8]
 stm32.transmit(data)
 
 print(stm32.recieve(expected_bytes))
+print(stm32.format_stats())
@@ -0,0 +1,69 @@
+'''
+Benchmark of the downlink packet encoding on recorded telemetry
+
+Usage:
+    python benchmark_packets.py [~/telemetry.bin] [--max-size 255]
+
+Without a telemetry log a day of synthetic 1 Hz samples is used.
+'''
+import argparse
+import datetime
+import math
+import os
+import time
+from packets import encode_packets, decode_packet
+from telemetry_store import TelemetryReader, RECORD, DEVICE_IDS, CHANNEL_IDS, STATUS
+
+def recorded_samples(path):
+    with TelemetryReader(path) as reader:
+        return [(timestamp, value) for timestamp, device, channel, value, status in reader.iter_range()
+                if device == DEVICE_IDS['temperature_sensor'] and channel == CHANNEL_IDS['ambient_temperature'] and status == STATUS['ok']]
+
+def synthetic_samples(count = 86400):
+    start = 1675556134.0
+    return [(start + i, round((20 + 5 * math.sin(i / 3600)) * 16) / 16) for i in range(count)]
+
+def text_size(samples):
+    size = 0
+    for timestamp, temperature in samples:
+        moment = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+        size += len(f"Time: {moment.year}-{moment.month}-{moment.day}-{moment.hour}-{moment.minute}-{moment.second}\n".encode())
+        size += len(f"OBC Ambient Temperature: {temperature} °C\n".encode())
+    return size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', help='telemetry log written by TelemetryStore')
+    parser.add_argument('--max-size', type=int, default=255, help='maximum packet size in bytes')
+    args = parser.parse_args()
+
+    if args.path:
+        samples = recorded_samples(os.path.expanduser(args.path))
+        source = args.path
+    else:
+        samples = synthetic_samples()
+        source = 'synthetic 1 Hz samples'
+    if not samples:
+        print(f"No temperature samples in {source}")
+        return
+
+    start = time.perf_counter()
+    packets = encode_packets(samples, DEVICE_IDS['temperature_sensor'], CHANNEL_IDS['ambient_temperature'], args.max_size)
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decoded = [sample for packet in packets for sample in decode_packet(packet)[2]]
+    decode_time = time.perf_counter() - start
+    packet_bytes = sum(len(packet) for packet in packets)
+
+    print(f"Source: {source}")
+    print(f"Samples: {len(samples)}, packets: {len(packets)} (max {args.max_size} bytes)")
+    print(f"Packet bytes per sample: {packet_bytes / len(samples):.3f}")
+    print(f"Log record bytes per sample: {RECORD.size}")
+    print(f"Text log bytes per sample: {text_size(samples) / len(samples):.3f}")
+    print(f"Encode throughput: {len(samples) / encode_time:,.0f} samples/s")
+    print(f"Decode throughput: {len(samples) / decode_time:,.0f} samples/s")
+    lossless = all(abs(a[0] - b[0]) < 0.0005 and abs(a[1] - b[1]) < 0.03125 for a, b in zip(samples, decoded))
+    print(f"Round trip within resolution: {lossless and len(decoded) == len(samples)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import binascii
+import struct
+
+# Packet header: magic, version, device id, channel id, sample count, payload length, CRC-16/CCITT of header and payload
+HEADER = struct.Struct('<2sBBBHHH')
+MAGIC = b'OT'
+VERSION = 1
+MAX_PACKET_SIZE = 255 #Radio frame payload
+COUNTS_PER_DEGREE = 16 #MCP9808 raw temperature counts per C
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def write_varint(buffer, value):
+    '''
+    Append an unsigned LEB128 varint to buffer
+    '''
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def read_varint(data, offset):
+    '''
+    Return (value, next offset) of the unsigned LEB128 varint at offset
+
+    Raises:
+        ValueError: "Truncated varint"
+    '''
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+class PacketEncoder:
+    '''
+    Packs timestamped MCP9808 samples of one channel into downlink packets no larger than max_size
+
+    Payload:
+    - Timestamps in milliseconds: the first as a varint, the first delta and then the delta of deltas as zig-zag varints
+    - Temperatures as raw MCP9808 counts (1/16 C): the first and then the deltas as zig-zag varints
+
+    Regularly sampled telemetry costs about 2 bytes per sample.
+    '''
+
+    def __init__(self, device, channel, max_size = MAX_PACKET_SIZE):
+        if max_size <= HEADER.size + 4:
+            raise ValueError(f"Invalid packet size: {max_size}")
+        self.device = device
+        self.channel = channel
+        self.max_size = max_size
+        self.packets = []
+        self._start()
+
+    def _start(self):
+        self._timestamps = bytearray()
+        self._counts = bytearray()
+        self._count = 0
+        self._last_timestamp = None
+        self._last_delta = None
+        self._last_value = None
+
+    def add(self, timestamp, temperature):
+        '''
+        Add one sample, the current packet is finished first if the sample does not fit
+
+        Args:
+            timestamp (float): seconds since the epoch, sent with millisecond resolution
+            temperature (float): temperature in C, sent with the 0.0625 C MCP9808 resolution
+        '''
+        milliseconds = int(round(timestamp * 1000))
+        value = int(round(temperature * COUNTS_PER_DEGREE))
+        timestamp_bytes = bytearray()
+        value_bytes = bytearray()
+        if self._count == 0:
+            write_varint(timestamp_bytes, milliseconds)
+            write_varint(value_bytes, zigzag(value))
+        else:
+            delta = milliseconds - self._last_timestamp
+            write_varint(timestamp_bytes, zigzag(delta if self._last_delta is None else delta - self._last_delta))
+            write_varint(value_bytes, zigzag(value - self._last_value))
+        size = HEADER.size + len(self._timestamps) + len(self._counts) + len(timestamp_bytes) + len(value_bytes)
+        if self._count and size > self.max_size:
+            self.flush()
+            return self.add(timestamp, temperature)
+        if self._count:
+            self._last_delta = milliseconds - self._last_timestamp
+        self._timestamps += timestamp_bytes
+        self._counts += value_bytes
+        self._last_timestamp = milliseconds
+        self._last_value = value
+        self._count += 1
+
+    def flush(self):
+        '''
+        Finish the current packet, if it has any samples
+        '''
+        if self._count == 0:
+            return
+        payload = bytes(self._timestamps + self._counts)
+        header = HEADER.pack(MAGIC, VERSION, self.device, self.channel, self._count, len(payload), 0)
+        crc = binascii.crc_hqx(payload, binascii.crc_hqx(header, 0xFFFF))
+        self.packets.append(header[:-2] + struct.pack('<H', crc) + payload)
+        self._start()
+
+def encode_packets(samples, device, channel, max_size = MAX_PACKET_SIZE):
+    '''
+    Return the packets for an iterable of (timestamp, temperature) samples
+    '''
+    encoder = PacketEncoder(device, channel, max_size)
+    for timestamp, temperature in samples:
+        encoder.add(timestamp, temperature)
+    encoder.flush()
+    return encoder.packets
+
+def decode_packet(packet):
+    '''
+    Decode one packet
+
+    Raises:
+        ValueError: if the packet is truncated, has an unknown format or fails the CRC check
+
+    Returns:
+        tuple : (device id, channel id, list of (timestamp in seconds, temperature in C))
+    '''
+    if len(packet) < HEADER.size:
+        raise ValueError("Truncated packet")
+    magic, version, device, channel, count, length, crc = HEADER.unpack_from(packet)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unknown packet format")
+    if len(packet) != HEADER.size + length:
+        raise ValueError("Truncated packet")
+    header = bytes(packet[:HEADER.size - 2]) + b'\x00\x00'
+    if binascii.crc_hqx(packet[HEADER.size:], binascii.crc_hqx(header, 0xFFFF)) != crc:
+        raise ValueError("CRC mismatch")
+
+    offset = HEADER.size
+    timestamps = []
+    delta = None
+    for index in range(count):
+        value, offset = read_varint(packet, offset)
+        if index == 0:
+            timestamps.append(value)
+            continue
+        if delta is None:
+            delta = unzigzag(value)
+        else:
+            delta += unzigzag(value)
+        timestamps.append(timestamps[-1] + delta)
+    samples = []
+    counts = 0
+    for index in range(count):
+        value, offset = read_varint(packet, offset)
+        counts = unzigzag(value) if index == 0 else counts + unzigzag(value)
+        samples.append((timestamps[index] / 1000, counts / COUNTS_PER_DEGREE))
+    return device, channel, samples
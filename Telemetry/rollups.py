@@ -0,0 +1,236 @@
+import math
+import os
+import struct
+
+# File header: magic, format version, record size, resolution in seconds
+HEADER = struct.Struct('<4sHHI4x')
+MAGIC = b'OBCR'
+VERSION = 1
+# Record: bucket start (seconds since the epoch), device id, channel id, count, sum, min, max
+RECORD = struct.Struct('<qHHIddd')
+RESOLUTIONS = (60, 3600, 86400)
+# Records read back from the end of a file to resume the open buckets
+RESUME_RECORDS = 64
+
+def rollup_dtype():
+    '''
+    Return the NumPy dtype of a rollup record, numpy is imported on first use
+    '''
+    import numpy as np
+    return np.dtype([('bucket', '<i8'), ('device', '<u2'), ('channel', '<u2'), ('count', '<u4'),
+                     ('sum', '<f8'), ('min', '<f8'), ('max', '<f8')])
+
+class RollupFile:
+    '''
+    Rollup records of one resolution. Each (device, channel) has one open bucket that is updated in place until a sample
+    for a later bucket arrives, closed buckets are never rewritten.
+    '''
+
+    def __init__(self, path, resolution):
+        '''
+        Initialization of RollupFile class
+
+        Raises:
+            ValueError: f"{path} is not a rollup file of resolution {resolution}"
+        '''
+        self.path = path
+        self.resolution = resolution
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.size = os.fstat(self.fd).st_size
+        if self.size == 0:
+            os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, RECORD.size, resolution), 0)
+            self.size = HEADER.size
+        else:
+            magic, version, record_size, file_resolution = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+            if (magic, version, record_size, file_resolution) != (MAGIC, VERSION, RECORD.size, resolution):
+                os.close(self.fd)
+                raise ValueError(f"{path} is not a rollup file of resolution {resolution}")
+        count = (self.size - HEADER.size) // RECORD.size
+        self.size = HEADER.size + count * RECORD.size
+        os.ftruncate(self.fd, self.size)
+        # (device, channel) -> [bucket, offset, count, sum, min, max, dirty]
+        self.open_buckets = {}
+        first = max(0, count - RESUME_RECORDS)
+        tail = os.pread(self.fd, (count - first) * RECORD.size, HEADER.size + first * RECORD.size)
+        for number in range(count - first):
+            bucket, device, channel, samples, total, minimum, maximum = RECORD.unpack_from(tail, number * RECORD.size)
+            current = self.open_buckets.get((device, channel))
+            if current is None or bucket >= current[0]:
+                offset = HEADER.size + (first + number) * RECORD.size
+                self.open_buckets[(device, channel)] = [bucket, offset, samples, total, minimum, maximum, False]
+
+    def add(self, timestamp, device, channel, value):
+        bucket = int(timestamp // self.resolution) * self.resolution
+        current = self.open_buckets.get((device, channel))
+        if current is not None and bucket < current[0]:
+            #A sample older than the open bucket gets a record of its own, queries merge records of the same bucket
+            self._write([bucket, None, 1, value, value, value, True], device, channel)
+            return
+        if current is None or bucket > current[0]:
+            if current is not None and current[6]:
+                self._write(current, device, channel)
+            current = self.open_buckets[(device, channel)] = [bucket, None, 0, 0.0, value, value, True]
+        current[2] += 1
+        current[3] += value
+        current[4] = min(current[4], value)
+        current[5] = max(current[5], value)
+        current[6] = True
+
+    def _write(self, bucket_state, device, channel):
+        bucket, offset, samples, total, minimum, maximum, _ = bucket_state
+        if offset is None:
+            offset = bucket_state[1] = self.size
+            self.size += RECORD.size
+        os.pwrite(self.fd, RECORD.pack(bucket, device, channel, samples, total, minimum, maximum), offset)
+        bucket_state[6] = False
+
+    def flush(self):
+        for (device, channel), bucket_state in self.open_buckets.items():
+            if bucket_state[6]:
+                self._write(bucket_state, device, channel)
+
+    def fsync(self):
+        os.fsync(self.fd)
+
+    def records(self):
+        '''
+        Return every record of the file as a NumPy structured array
+        '''
+        import numpy as np
+        data = os.pread(self.fd, self.size - HEADER.size, HEADER.size)
+        return np.frombuffer(data, dtype=rollup_dtype())
+
+    def replace(self, records):
+        '''
+        Replace the contents of the file with records (a NumPy structured array sorted by bucket)
+        '''
+        os.ftruncate(self.fd, HEADER.size)
+        os.pwrite(self.fd, records.tobytes(), HEADER.size)
+        self.size = HEADER.size + len(records) * RECORD.size
+        self.open_buckets = {}
+        for number, record in enumerate(records):
+            key = (int(record['device']), int(record['channel']))
+            self.open_buckets[key] = [int(record['bucket']), HEADER.size + number * RECORD.size, int(record['count']),
+                                      float(record['sum']), float(record['min']), float(record['max']), False]
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+class RollupStore:
+    '''
+    Incremental min/max/mean rollups of telemetry at several resolutions
+
+    Functionality:
+    - Update the open bucket of every resolution as samples arrive
+    - Answer aggregation queries over any time range from the coarsest fitting resolution
+    - Rebuild every resolution from the raw TelemetryStore log with NumPy
+
+    Files are named {prefix}.{resolution}s.rollup
+    '''
+
+    def __init__(self, prefix, resolutions = RESOLUTIONS):
+        self.prefix = prefix
+        self.files = {resolution: RollupFile(f"{prefix}.{resolution}s.rollup", resolution) for resolution in sorted(resolutions)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, timestamp, device, channel, value):
+        '''
+        Add a sample to every resolution, NaN values (failed reads) are ignored
+        '''
+        if math.isnan(value):
+            return
+        for rollup_file in self.files.values():
+            rollup_file.add(timestamp, device, channel, value)
+
+    def flush(self):
+        for rollup_file in self.files.values():
+            rollup_file.flush()
+
+    def close(self):
+        for rollup_file in self.files.values():
+            rollup_file.close()
+
+    def resolution_for_step(self, step):
+        '''
+        Return the coarsest resolution that evenly divides step
+
+        Raises:
+            ValueError: f"Step must be a multiple of {min(self.files)} seconds: {step}"
+        '''
+        fitting = [resolution for resolution in self.files if step % resolution == 0]
+        if not fitting:
+            raise ValueError(f"Step must be a multiple of {min(self.files)} seconds: {step}")
+        return max(fitting)
+
+    def query(self, device, channel, start, end, step):
+        '''
+        Aggregate a channel over [start, end) in bins of step seconds
+
+        Args:
+            device (int): device id
+            channel (int): channel id
+            start (float): seconds since the epoch, rounded down to the resolution used
+            end (float): seconds since the epoch
+            step (int): bin width in seconds, a multiple of one of the resolutions
+
+        Returns:
+            list : (bin start, count, mean, min, max) for every bin with samples
+        '''
+        import numpy as np
+        resolution = self.resolution_for_step(step)
+        rollup_file = self.files[resolution]
+        rollup_file.flush()
+        start = int(start // resolution) * resolution
+        records = rollup_file.records()
+        selected = records[(records['device'] == device) & (records['channel'] == channel) &
+                           (records['bucket'] >= start) & (records['bucket'] < end)]
+        if len(selected) == 0:
+            return []
+        bins = (selected['bucket'] - start) // step
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+        selected = selected[order]
+        boundaries = np.flatnonzero(np.diff(bins)) + 1
+        starts = np.concatenate(([0], boundaries))
+        counts = np.add.reduceat(selected['count'].astype(np.int64), starts)
+        sums = np.add.reduceat(selected['sum'], starts)
+        minimums = np.minimum.reduceat(selected['min'], starts)
+        maximums = np.maximum.reduceat(selected['max'], starts)
+        return [(int(start + bins[first] * step), int(count), float(total / count), float(minimum), float(maximum))
+                for first, count, total, minimum, maximum in zip(starts, counts, sums, minimums, maximums)]
+
+    def rebuild(self, reader):
+        '''
+        Recompute every resolution from the raw log
+
+        Args:
+            reader (TelemetryReader): reader of the telemetry log
+        '''
+        import numpy as np
+        raw = reader.array()
+        raw = raw[(raw['status'] == 0) & ~np.isnan(raw['value'])]
+        for resolution, rollup_file in self.files.items():
+            buckets = (np.floor(raw['timestamp'] / resolution) * resolution).astype(np.int64)
+            order = np.lexsort((raw['channel'], raw['device'], buckets))
+            buckets = buckets[order]
+            devices = raw['device'][order]
+            channels = raw['channel'][order]
+            values = raw['value'][order]
+            changed = (np.diff(buckets) != 0) | (np.diff(devices) != 0) | (np.diff(channels) != 0)
+            starts = np.concatenate(([0], np.flatnonzero(changed) + 1)) if len(values) else np.array([], dtype=np.int64)
+            records = np.zeros(len(starts), dtype=rollup_dtype())
+            if len(starts):
+                records['bucket'] = buckets[starts]
+                records['device'] = devices[starts]
+                records['channel'] = channels[starts]
+                records['count'] = np.diff(np.concatenate((starts, [len(values)])))
+                records['sum'] = np.add.reduceat(values, starts)
+                records['min'] = np.minimum.reduceat(values, starts)
+                records['max'] = np.maximum.reduceat(values, starts)
+            rollup_file.replace(records)
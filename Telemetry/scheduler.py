@@ -0,0 +1,147 @@
+import heapq
+import threading
+import time
+
+class MultiRateScheduler:
+    '''
+    Multi-rate scheduler for long running telemetry collection
+
+    Functionality:
+    - Run each task on its own period
+    - Measure scheduling jitter (how late each run started) per task
+    - Stop cleanly from another thread or a signal handler
+    - Change periods and add or remove tasks while running (e.g. after a config reload)
+    '''
+
+    def __init__(self, clock = time.monotonic):
+        '''
+        Initialization of MultiRateScheduler class
+
+        Args:
+            clock (function): monotonic clock returning seconds
+        '''
+        self.clock = clock
+        self.tasks = {}
+        self._queue = []
+        self._stop_event = threading.Event()
+
+    def add_task(self, name, period, callback, report = True):
+        '''
+        Schedule callback to be called every period seconds, starting immediately.
+        Tasks added with report=False (e.g. the task printing the report) are left out of the jitter report
+
+        Raises:
+            ValueError: f"Invalid period for {name}: {period}"
+        '''
+        if period <= 0:
+            raise ValueError(f"Invalid period for {name}: {period}")
+        self.tasks[name] = {
+            'period' : period,
+            'callback' : callback,
+            'runs' : 0,
+            'missed' : 0,
+            'errors' : 0,
+            'jitter_total' : 0.0,
+            'jitter_max' : 0.0,
+            'due' : self.clock(),
+            'report' : report,
+        }
+        heapq.heappush(self._queue, (self.tasks[name]['due'], name))
+
+    def set_period(self, name, period):
+        '''
+        Change the period of a task, the next run is moved to one new period after the previous run
+
+        Raises:
+            ValueError: f"Invalid period for {name}: {period}"
+        '''
+        if period <= 0:
+            raise ValueError(f"Invalid period for {name}: {period}")
+        task = self.tasks[name]
+        task['due'] = max(self.clock(), task['due'] - task['period'] + period)
+        task['period'] = period
+        heapq.heappush(self._queue, (task['due'], name))
+
+    def remove_task(self, name):
+        '''
+        Stop running a task, its queued run is skipped
+        '''
+        del self.tasks[name]
+
+    def stop(self):
+        '''
+        Request the scheduler to stop, safe to call from a signal handler
+        '''
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self, duration = None):
+        '''
+        Run scheduled tasks until stop() is called or duration seconds have passed
+        '''
+        end = None if duration is None else self.clock() + duration
+        while self._queue and not self._stop_event.is_set():
+            now = self.clock()
+            if end is not None and now >= end:
+                break
+            due, name = self._queue[0]
+            if due > now:
+                self._stop_event.wait((due if end is None else min(due, end)) - now)
+                continue
+            heapq.heappop(self._queue)
+            task = self.tasks.get(name)
+            if task is None or task['due'] != due:
+                continue # Removed or rescheduled since this run was queued
+            lateness = now - due
+            task['runs'] += 1
+            task['jitter_total'] += lateness
+            task['jitter_max'] = max(task['jitter_max'], lateness)
+            try:
+                task['callback']()
+            except Exception as error:
+                task['errors'] += 1
+                print(f"{name} failed: {error}", flush=True)
+            next_due = due + task['period']
+            now = self.clock()
+            if next_due <= now:
+                # Skip the periods we have already missed rather than bursting to catch up
+                skipped = int((now - next_due) // task['period']) + 1
+                task['missed'] += skipped
+                next_due += skipped * task['period']
+            if self.tasks.get(name) is not task:
+                continue # Removed by its own callback
+            task['due'] = next_due
+            heapq.heappush(self._queue, (next_due, name))
+
+    def jitter_report(self):
+        '''
+        Return scheduling statistics per task, jitter values are in seconds
+        '''
+        report = {}
+        for name, task in self.tasks.items():
+            if not task['report']:
+                continue
+            runs = task['runs']
+            report[name] = {
+                'period' : task['period'],
+                'runs' : runs,
+                'missed' : task['missed'],
+                'errors' : task['errors'],
+                'jitter_mean' : task['jitter_total'] / runs if runs else 0.0,
+                'jitter_max' : task['jitter_max'],
+            }
+        return report
+
+    def format_jitter_report(self):
+        '''
+        Return the jitter report as printable text
+        '''
+        lines = ["Scheduler jitter report:"]
+        for name, stats in self.jitter_report().items():
+            lines.append(f"  {name}: period {stats['period']}s, runs {stats['runs']}, missed {stats['missed']}, "
+                         f"errors {stats['errors']}, jitter mean {stats['jitter_mean']*1000:.3f} ms, "
+                         f"max {stats['jitter_max']*1000:.3f} ms")
+        return "\n".join(lines)
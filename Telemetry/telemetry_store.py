@@ -0,0 +1,252 @@
+import bisect
+import mmap
+import os
+import struct
+
+# File header: magic, format version, record size
+HEADER = struct.Struct('<4sHH8x')
+MAGIC = b'OBCT'
+VERSION = 1
+# Record: timestamp (seconds since the epoch), device id, channel id, value, status
+RECORD = struct.Struct('<dHHdH2x')
+# Sparse index entry: timestamp, record number
+INDEX_ENTRY = struct.Struct('<dQ')
+INDEX_SUFFIX = '.idx'
+
+DEVICE_IDS = {
+    'rtc' : 1,
+    'temperature_sensor' : 2,
+    'stm32' : 3,
+}
+CHANNEL_IDS = {
+    'ambient_temperature' : 1,
+}
+STATUS = {
+    'ok' : 0,
+    'read_error' : 1,
+}
+
+def record_dtype():
+    '''
+    Return the NumPy dtype of a record, numpy is imported on first use
+    '''
+    import numpy as np
+    return np.dtype([('timestamp', '<f8'), ('device', '<u2'), ('channel', '<u2'), ('value', '<f8'), ('status', '<u2'), ('pad', 'V2')])
+
+class TelemetryStore:
+    '''
+    Append only store of fixed width binary telemetry records
+
+    Functionality:
+    - Records are packed into a preallocated batch buffer and written once batch_size records are buffered
+    - fsync policy: 'never', 'batch' (after every batch written) or 'close'
+    - A sparse index (path + '.idx') stores the timestamp of every index_interval-th record for TelemetryReader
+    - A record torn by a power loss is truncated when the store is reopened
+
+    Records are expected to be appended in time order.
+    '''
+
+    def __init__(self, path, batch_size = 64, fsync = 'batch', index_interval = 1024):
+        '''
+        Initialization of TelemetryStore class
+
+        Raises:
+            ValueError: f"Invalid fsync policy: {fsync}"
+            ValueError: f"{path} is not a telemetry store"
+        '''
+        if fsync not in ('never', 'batch', 'close'):
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.index_interval = index_interval
+        self._buffer = bytearray(RECORD.size * batch_size)
+        self._buffered = 0
+        self._index_entries = []
+
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+            size = HEADER.size
+        else:
+            self.file.seek(0)
+            magic, version, record_size = HEADER.unpack(self.file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                self.file.close()
+                raise ValueError(f"{path} is not a telemetry store")
+        self.count = (size - HEADER.size) // RECORD.size
+        if HEADER.size + self.count * RECORD.size != size:
+            self.file.truncate(HEADER.size + self.count * RECORD.size)
+        self.index_file = open(path + INDEX_SUFFIX, 'a+b')
+        self._truncate_index()
+
+    def _truncate_index(self):
+        # Drop index entries (and any torn entry) past the last whole record
+        self.index_file.seek(0)
+        index = self.index_file.read()
+        length = len(index) - len(index) % INDEX_ENTRY.size
+        for offset in range(0, length, INDEX_ENTRY.size):
+            if INDEX_ENTRY.unpack_from(index, offset)[1] >= self.count:
+                length = offset
+                break
+        if length != len(index):
+            self.index_file.truncate(length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, timestamp, device, channel, value, status = 0):
+        '''
+        Buffer one record, the batch is written once batch_size records are buffered
+
+        Args:
+            timestamp (float): seconds since the epoch
+            device (int): device id, see DEVICE_IDS
+            channel (int): channel id, see CHANNEL_IDS
+            value (float): sample value
+            status (int): status code, see STATUS
+        '''
+        RECORD.pack_into(self._buffer, self._buffered * RECORD.size, timestamp, device, channel, value, status)
+        record_number = self.count + self._buffered
+        if record_number % self.index_interval == 0:
+            self._index_entries.append(INDEX_ENTRY.pack(timestamp, record_number))
+        self._buffered += 1
+        if self._buffered == self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the buffered records
+        '''
+        if self._buffered:
+            self.file.write(memoryview(self._buffer)[:self._buffered * RECORD.size])
+            self.count += self._buffered
+            self._buffered = 0
+        self.file.flush()
+        if self._index_entries:
+            #Written after the records they point to, so the index never points past the end of the file
+            self.index_file.write(b''.join(self._index_entries))
+            self._index_entries = []
+        self.index_file.flush()
+        if self.fsync == 'batch':
+            os.fsync(self.file.fileno())
+            os.fsync(self.index_file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        if self.fsync == 'close':
+            os.fsync(self.file.fileno())
+            os.fsync(self.index_file.fileno())
+        self.file.close()
+        self.index_file.close()
+
+class TelemetryReader:
+    '''
+    Memory mapped reader of a TelemetryStore file
+
+    Functionality:
+    - Random access to records without reading the file into memory
+    - Time range lookups by binary search, narrowed by the sparse index
+    - Zero copy NumPy structured array views of a range of records
+    '''
+
+    def __init__(self, path):
+        '''
+        Initialization of TelemetryReader class
+
+        Raises:
+            ValueError: f"{path} is not a telemetry store"
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a telemetry store")
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a telemetry store")
+        self.count = (size - HEADER.size) // RECORD.size
+        self.index_timestamps = []
+        self.index_records = []
+        try:
+            with open(path + INDEX_SUFFIX, 'rb') as file:
+                index = file.read()
+        except FileNotFoundError:
+            index = b''
+        for offset in range(0, len(index) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+            timestamp, record_number = INDEX_ENTRY.unpack_from(index, offset)
+            if record_number < self.count:
+                self.index_timestamps.append(timestamp)
+                self.index_records.append(record_number)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def record(self, number):
+        '''
+        Return record number as (timestamp, device, channel, value, status)
+        '''
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        return RECORD.unpack_from(self.mmap, HEADER.size + number * RECORD.size)
+
+    def _timestamp(self, number):
+        return struct.unpack_from('<d', self.mmap, HEADER.size + number * RECORD.size)[0]
+
+    def find(self, timestamp):
+        '''
+        Return the number of the first record at or after timestamp (len(self) if there is none)
+        '''
+        position = bisect.bisect_left(self.index_timestamps, timestamp)
+        low = self.index_records[position - 1] if position > 0 else 0
+        high = self.index_records[position] if position < len(self.index_records) else self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start = None, end = None):
+        '''
+        Return the (first, stop) record numbers of records with start <= timestamp < end
+        '''
+        first = 0 if start is None else self.find(start)
+        stop = self.count if end is None else self.find(end)
+        return first, max(first, stop)
+
+    def iter_range(self, start = None, end = None):
+        '''
+        Yield the records with start <= timestamp < end as (timestamp, device, channel, value, status)
+        '''
+        first, stop = self.range(start, end)
+        for offset in range(HEADER.size + first * RECORD.size, HEADER.size + stop * RECORD.size, RECORD.size):
+            yield RECORD.unpack_from(self.mmap, offset)
+
+    def array(self, start = None, end = None):
+        '''
+        Return a zero copy NumPy structured array of the records with start <= timestamp < end.
+        The array is a view of the memory map, so it must be released before close().
+        '''
+        import numpy as np
+        first, stop = self.range(start, end)
+        return np.frombuffer(self.mmap, dtype=record_dtype(), count=stop - first, offset=HEADER.size + first * RECORD.size)
+
+    def close(self):
+        self.mmap.close()
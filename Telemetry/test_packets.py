@@ -0,0 +1,43 @@
+import pytest
+from packets import encode_packets, decode_packet, zigzag, unzigzag, HEADER
+
+@pytest.mark.parametrize("raw,expected", [(0,0),(-1,1),(1,2),(-2,3),(2,4),(-64,127),(64,128)])
+def test_zigzag(raw,expected):
+    assert zigzag(raw) == expected
+    assert unzigzag(expected) == raw
+
+def samples(count):
+    return [(1675556134.0 + i * 1.0 + (0.003 if i % 7 == 0 else 0), 20 + ((i * 3) % 11 - 5) * 0.0625 - (i // 50) * 30)
+            for i in range(count)]
+
+@pytest.mark.parametrize("max_size", [32, 255, 10000])
+def test_round_trip(max_size):
+    data = samples(1000)
+    packets = encode_packets(data, 2, 1, max_size)
+    assert all(len(packet) <= max_size for packet in packets)
+    decoded = []
+    for packet in packets:
+        device, channel, packet_samples = decode_packet(packet)
+        assert (device, channel) == (2, 1)
+        decoded += packet_samples
+    assert decoded == data
+
+def test_bytes_per_sample():
+    data = [(1675556134.0 + i, 21.5 + (i % 3) * 0.0625) for i in range(10000)]
+    packets = encode_packets(data, 2, 1, 255)
+    assert sum(len(packet) for packet in packets) / len(data) < 2.3
+
+def test_crc_detects_corruption():
+    packet = bytearray(encode_packets(samples(20), 2, 1)[0])
+    for index in range(len(packet)):
+        corrupted = bytearray(packet)
+        corrupted[index] ^= 0x10
+        with pytest.raises(ValueError):
+            decode_packet(bytes(corrupted))
+
+def test_truncated():
+    packet = encode_packets(samples(20), 2, 1)[0]
+    with pytest.raises(ValueError):
+        decode_packet(packet[:-1])
+    with pytest.raises(ValueError):
+        decode_packet(packet[:HEADER.size - 1])
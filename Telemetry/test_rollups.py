@@ -0,0 +1,60 @@
+import pytest
+np = pytest.importorskip("numpy")
+from rollups import RollupStore
+from telemetry_store import TelemetryStore, TelemetryReader
+
+DAY = 86400
+
+def samples(count, start = 10 * DAY, interval = 30):
+    return [(start + i * interval, 20 + (i % 10)) for i in range(count)]
+
+def expected(data, start, end, step):
+    bins = {}
+    for timestamp, value in data:
+        if start <= timestamp < end:
+            bins.setdefault(start + (timestamp - start) // step * step, []).append(value)
+    return [(bin_start, len(values), pytest.approx(sum(values) / len(values)), min(values), max(values))
+            for bin_start, values in sorted(bins.items())]
+
+@pytest.mark.parametrize("step", [60, 600, 3600, 7200, DAY])
+def test_query_matches_raw(tmp_path, step):
+    data = samples(2 * 24 * 120)
+    with RollupStore(str(tmp_path / "rollups")) as rollups:
+        for timestamp, value in data:
+            rollups.add(timestamp, 2, 1, value)
+        start, end = 10 * DAY, 12 * DAY
+        assert rollups.query(2, 1, start, end, step) == expected(data, start, end, step)
+        assert rollups.query(3, 1, start, end, step) == []
+
+def test_resume_across_processes(tmp_path):
+    data = samples(200)
+    for timestamp, value in data:
+        with RollupStore(str(tmp_path / "rollups")) as rollups:
+            rollups.add(timestamp, 2, 1, value)
+    with RollupStore(str(tmp_path / "rollups")) as rollups:
+        assert rollups.query(2, 1, 10 * DAY, 11 * DAY, 3600) == expected(data, 10 * DAY, 11 * DAY, 3600)
+        assert len(rollups.files[60].records()) == 100 #One record per minute, open buckets were updated in place
+
+def test_out_of_order_sample(tmp_path):
+    with RollupStore(str(tmp_path / "rollups")) as rollups:
+        rollups.add(10 * DAY + 3600, 2, 1, 30.0)
+        rollups.add(10 * DAY, 2, 1, 10.0)
+        rollups.add(10 * DAY + 3601, 2, 1, 20.0)
+        assert rollups.query(2, 1, 10 * DAY, 11 * DAY, DAY) == [(10 * DAY, 3, 20.0, 10.0, 30.0)]
+
+def test_invalid_step(tmp_path):
+    with RollupStore(str(tmp_path / "rollups")) as rollups:
+        with pytest.raises(ValueError):
+            rollups.query(2, 1, 0, DAY, 90)
+
+def test_rebuild(tmp_path):
+    data = samples(1000)
+    path = str(tmp_path / "telemetry.bin")
+    with TelemetryStore(path) as store:
+        for timestamp, value in data:
+            store.append(timestamp, 2, 1, value)
+        store.append(data[-1][0], 2, 1, float('nan'), 1)
+    with RollupStore(str(tmp_path / "rollups")) as rollups, TelemetryReader(path) as reader:
+        rollups.rebuild(reader)
+        for step in (60, 3600, DAY):
+            assert rollups.query(2, 1, 10 * DAY, 11 * DAY, step) == expected(data, 10 * DAY, 11 * DAY, step)
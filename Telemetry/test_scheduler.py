@@ -0,0 +1,71 @@
+from scheduler import MultiRateScheduler
+
+def make_scheduler(clock):
+    scheduler = MultiRateScheduler(clock)
+    scheduler._stop_event.wait = clock.sleep #Waiting for the next due time advances the fake clock
+    return scheduler
+
+def test_runs_in_due_time_order(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+    runs = []
+    scheduler.add_task('rtc', 2, lambda: runs.append(('rtc', fake_clock.now)))
+    scheduler.add_task('temperature_sensor', 0.5, lambda: runs.append(('temperature_sensor', fake_clock.now)))
+    scheduler.run(2.1)
+    assert runs == [('rtc', 0.0), ('temperature_sensor', 0.0), ('temperature_sensor', 0.5), ('temperature_sensor', 1.0),
+                    ('temperature_sensor', 1.5), ('rtc', 2.0), ('temperature_sensor', 2.0)]
+    assert fake_clock.now == 2.1
+
+def test_jitter_is_measured_per_task(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+    scheduler.add_task('rtc', 1, lambda: fake_clock.sleep(0.25))
+    scheduler.add_task('temperature_sensor', 1, lambda: None)
+    scheduler.run(2.5)
+    report = scheduler.jitter_report()
+    assert (report['rtc']['runs'], report['rtc']['jitter_max']) == (3, 0.0)
+    assert (report['temperature_sensor']['runs'], report['temperature_sensor']['jitter_max']) == (3, 0.25) #Started after rtc at each due time
+    assert report['temperature_sensor']['jitter_mean'] == 0.25
+    assert "temperature_sensor: period 1s, runs 3, missed 0" in scheduler.format_jitter_report()
+
+def test_missed_periods_are_skipped_not_burst(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+    runs = []
+
+    def overrun():
+        runs.append(fake_clock.now)
+        fake_clock.sleep(2.5 if len(runs) == 1 else 0)
+    scheduler.add_task('overrun', 1, overrun)
+    scheduler.run(5.5)
+    assert runs == [0.0, 3.0, 4.0, 5.0]
+    assert scheduler.jitter_report()['overrun']['missed'] == 2
+
+def test_tasks_can_be_left_out_of_the_report(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+    scheduler.add_task('rtc', 1, lambda: None)
+    scheduler.add_task('jitter_report', 1, lambda: None, report=False)
+    scheduler.run(1.5)
+    assert list(scheduler.jitter_report()) == ['rtc']
+    assert 'jitter_report' not in scheduler.format_jitter_report()
+    assert scheduler.tasks['jitter_report']['runs'] == 2
+
+def test_errors_are_counted_and_the_task_keeps_running(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+
+    def fail():
+        raise RuntimeError("Unable to Get Temperature")
+    scheduler.add_task('temperature_sensor', 1, fail)
+    scheduler.run(2.5)
+    assert scheduler.jitter_report()['temperature_sensor']['errors'] == 3
+
+def test_set_period_and_remove_task(fake_clock):
+    scheduler = make_scheduler(fake_clock)
+    runs = []
+    scheduler.add_task('fast', 1, lambda: runs.append(('fast', fake_clock.now)))
+    scheduler.add_task('slow', 10, lambda: runs.append(('slow', fake_clock.now)))
+
+    scheduler.run(2.5)
+    scheduler.set_period('slow', 1)
+    scheduler.remove_task('fast')
+    runs.clear()
+    scheduler.run(2.5)
+    assert runs == [('slow', 2.5), ('slow', 3.5), ('slow', 4.5)]
+    assert list(scheduler.tasks) == ['slow']
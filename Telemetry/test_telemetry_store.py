@@ -0,0 +1,76 @@
+import pytest
+from telemetry_store import TelemetryStore, TelemetryReader, RECORD, HEADER
+
+def fill(path, count, **options):
+    with TelemetryStore(path, **options) as store:
+        for i in range(count):
+            store.append(1000.0 + i, 2, 1, i * 0.5, 0)
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 100, batch_size=7, index_interval=10)
+    with TelemetryReader(path) as reader:
+        assert len(reader) == 100
+        assert reader.record(42) == (1042.0, 2, 1, 21.0, 0)
+        assert list(reader.iter_range(1010, 1013)) == [(1000.0 + i, 2, 1, i * 0.5, 0) for i in range(10, 13)]
+
+def test_reopen_appends(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 10, index_interval=4)
+    with TelemetryStore(path, index_interval=4) as store:
+        store.append(2000.0, 2, 1, 1.0)
+    with TelemetryReader(path) as reader:
+        assert len(reader) == 11
+        assert reader.record(10)[0] == 2000.0
+        assert reader.index_records == [0, 4, 8]
+
+@pytest.mark.parametrize("interval", [1, 3, 16, 1000])
+def test_find(tmp_path, interval):
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 50, index_interval=interval)
+    with TelemetryReader(path) as reader:
+        assert reader.find(0) == 0
+        assert reader.find(1000.0) == 0
+        assert reader.find(1024.5) == 25
+        assert reader.find(1049.0) == 49
+        assert reader.find(5000) == 50
+        assert reader.range(1010, 1005) == (10, 10)
+
+def test_torn_record_is_truncated(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 5)
+    with open(path, 'ab') as file:
+        file.write(b'\x00' * (RECORD.size // 2))
+    with TelemetryStore(path) as store:
+        assert store.count == 5
+    with TelemetryReader(path) as reader:
+        assert len(reader) == 5
+
+def test_not_a_store(tmp_path):
+    path = tmp_path / "logs.txt"
+    path.write_text("Time: 2023-2-5-0-15-34\n")
+    with pytest.raises(ValueError):
+        TelemetryStore(str(path))
+
+def test_array(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 100, index_interval=10)
+    reader = TelemetryReader(path)
+    records = reader.array(1020, 1030)
+    assert records['timestamp'].tolist() == [1000.0 + i for i in range(20, 30)]
+    assert records['value'].mean() == pytest.approx(np.mean([i * 0.5 for i in range(20, 30)]))
+    del records
+    reader.close()
+
+def test_index_past_end_is_truncated(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    fill(path, 10, index_interval=2)
+    with open(path, 'r+b') as file:
+        file.truncate(HEADER.size + 5 * RECORD.size)
+    with TelemetryStore(path, index_interval=2) as store:
+        for i in range(5, 10):
+            store.append(1000.0 + i, 2, 1, i * 0.5)
+    with TelemetryReader(path) as reader:
+        assert reader.index_records == [0, 2, 4, 6, 8]
+        assert reader.find(1007) == 7
@@ -0,0 +1,95 @@
+'''
+Codec for MCP9808 temperature registers
+Data Sheet: https://ww1.microchip.com/downloads/en/DeviceDoc/25095A.pdf
+
+Temperatures are 13 bit two's complement values in units of 0.0625 C (bit 12 is the sign). The ambient register also carries the
+critical, upper and lower alert flags in bits 15:13, and the limit registers only use 0.25 C resolution.
+
+Functionality:
+- Decode register words or byte pairs through a lookup table of the whole 13 bit space
+- Encode temperatures into register words or byte pairs
+- Decode arrays of raw register words in one call with NumPy
+'''
+
+TEMPERATURE_MASK = 0x1FFF
+SIGN_BIT = 0x1000
+COUNTS_PER_DEGREE = 16
+MIN_TEMPERATURE = -256.0
+MAX_TEMPERATURE = 255.9375
+
+# Temperature in C of every 13 bit register value
+DECODE_TABLE = tuple(((raw ^ SIGN_BIT) - SIGN_BIT) / COUNTS_PER_DEGREE for raw in range(TEMPERATURE_MASK + 1))
+
+# Register bytes (upper, lower) of every 13 bit register value
+ENCODE_TABLE = tuple((raw >> 8, raw & 0xFF) for raw in range(TEMPERATURE_MASK + 1))
+
+def decode(word):
+    '''
+    Return the temperature in C of a register word, alert flags are ignored
+    '''
+    return DECODE_TABLE[word & TEMPERATURE_MASK]
+
+def decode_bytes(data):
+    '''
+    Return the temperature in C of the two bytes read from a temperature register
+    '''
+    return DECODE_TABLE[(data[0] << 8 | data[1]) & TEMPERATURE_MASK]
+
+def encode(temperature, limit = False):
+    '''
+    Return the 13 bit register word of a temperature
+
+    Args:
+        temperature (float): temperature in C, -256 to 255.9375
+        limit (bool): round to the 0.25 C resolution of the limit registers
+
+    Raises:
+        ValueError: f"Temperature out of range: {temperature}"
+    '''
+    if not MIN_TEMPERATURE <= temperature <= MAX_TEMPERATURE:
+        raise ValueError(f"Temperature out of range: {temperature}")
+    if limit:
+        counts = int(round(temperature * 4)) * 4
+        counts = min(counts, 0x0FFC)
+    else:
+        counts = int(round(temperature * COUNTS_PER_DEGREE))
+        counts = min(counts, 0x0FFF)
+    return counts & TEMPERATURE_MASK
+
+def encode_bytes(temperature, limit = False):
+    '''
+    Return the two bytes (upper, lower) to write to a temperature register
+    '''
+    return list(ENCODE_TABLE[encode(temperature, limit)])
+
+def decode_array(words):
+    '''
+    Decode an array of raw register words (e.g. from a SampleRingBuffer or a telemetry log) in one call
+
+    Args:
+        words (array like): raw 16 bit register words, alert flags are ignored
+
+    Returns:
+        numpy.ndarray : temperatures in C as float64
+    '''
+    import numpy as np
+    return _decode_lookup(np)[np.asarray(words, dtype=np.uint16) & TEMPERATURE_MASK]
+
+def decode_bytes_array(data):
+    '''
+    Decode a flat array of register bytes (upper, lower, upper, lower, ...) in one call
+
+    Returns:
+        numpy.ndarray : temperatures in C as float64
+    '''
+    import numpy as np
+    pairs = np.asarray(data, dtype=np.uint16).reshape(-1, 2)
+    return decode_array(pairs[:, 0] << 8 | pairs[:, 1])
+
+_lookup = None
+
+def _decode_lookup(np):
+    global _lookup
+    if _lookup is None:
+        _lookup = np.array(DECODE_TABLE, dtype=np.float64)
+    return _lookup
@@ -1,4 +1,51 @@
-from smbus import SMBus
+import contextlib
+import time
+from array import array
+try:
+    from . import mcp9808_codec
+except ImportError:
+    import mcp9808_codec
+
+class SampleRingBuffer:
+    '''
+    Fixed size ring buffer of timestamped temperature samples
+    Storage is preallocated so appending a sample does not allocate. When the buffer is full the oldest sample is overwritten
+    and counted as an overrun.
+    '''
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError(f"Invalid capacity: {capacity}")
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0 #Index of the next sample to write
+        self.count = 0
+        self.overruns = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count == self.capacity:
+            self.overruns += 1
+        else:
+            self.count += 1
+
+    def drain(self):
+        '''
+        Remove and return every buffered sample, oldest first
+
+        Returns:
+            list : (timestamp, value) tuples
+        '''
+        start = (self.head - self.count) % self.capacity
+        samples = [(self.timestamps[(start + i) % self.capacity], self.values[(start + i) % self.capacity]) for i in range(self.count)]
+        self.count = 0
+        return samples
 
 class Temperature_Sensor:
     '''
@@ -11,8 +58,12 @@ class Temperature_Sensor:
     - Set/Get Critical Temperature
     - Set/Get Upper Temperature
     - Set/Get Lower Temperature
+    - Set/Get Resolution
+    - Stream Ambient Temperature at a target rate
+    - Configure the Alert output and wait for alert events
     '''
-    i2c_bus = SMBus(1)
+    i2c_bus_number = 1
+    _i2c_bus = None
 
     registers = {
         'slave' : 0x18,
@@ -26,10 +77,64 @@ class Temperature_Sensor:
         'resolution' : 0x08
     }
 
-    def __init__(self, i2c_status = None, critical_value = None, upper_value = None, lower_value = None):
+    # Config register (0x01) bits
+    config_bits = {
+        'alert_mode' : 0x0001, #0 = comparator output, 1 = interrupt output
+        'alert_polarity' : 0x0002, #0 = active low, 1 = active high
+        'alert_select' : 0x0004, #0 = upper, lower and critical limits, 1 = critical limit only
+        'alert_enable' : 0x0008,
+        'alert_status' : 0x0010,
+        'int_clear' : 0x0020,
+        'win_lock' : 0x0040,
+        'crit_lock' : 0x0080,
+        'shutdown' : 0x0100,
+    }
+    # Limit hysteresis in C: value of config register bits 10:9
+    hysteresis_values = {
+        0 : 0b00,
+        1.5 : 0b01,
+        3 : 0b10,
+        6 : 0b11,
+    }
+
+    # Resolution register value: (resolution in C, typical conversion time in seconds)
+    resolutions = {
+        0b00 : (0.5, 0.030),
+        0b01 : (0.25, 0.065),
+        0b10 : (0.125, 0.130),
+        0b11 : (0.0625, 0.250),
+    }
+
+    @property
+    def i2c_bus(self):
+        '''
+        SMBus handle used by the sensor. The bus is opened on first use and shared by every Temperature_Sensor instance
+        '''
+        if self._i2c_bus is None:
+            from smbus import SMBus
+            Temperature_Sensor._i2c_bus = SMBus(self.i2c_bus_number)
+        return self._i2c_bus
+
+    @i2c_bus.setter
+    def i2c_bus(self, bus):
+        self._i2c_bus = bus
+
+    def _transaction(self):
+        '''
+        Hold the bus over several I2C transactions when it is shared through I2C_Bus.bus_manager, a no-op for a plain SMBus handle
+        '''
+        transaction = getattr(self.i2c_bus, 'transaction', None)
+        return transaction() if transaction else contextlib.nullcontext()
+
+    def __init__(self, i2c_status = None, critical_value = None, upper_value = None, lower_value = None, i2c_bus = None):
         '''
         Initialization of Temperature_Sensor class
+
+        i2c_bus can be given to use a shared bus (e.g. BusManager().bus(1)) instead of opening SMBus(i2c_bus_number)
         '''
+        if i2c_bus is not None:
+            self.i2c_bus = i2c_bus
+
         if i2c_status:
             self.i2c_status = i2c_status
 
@@ -52,57 +157,45 @@ class Temperature_Sensor:
         self.upper_temp = 0 
         self.lower_temp = 0 
 
-    @staticmethod
-    def bit_inverse(bit,binary):
-        tmp = binary >> bit
-        replacement = 1 << bit 
-
-        if tmp & 0x1: #bit to replace is a 1
-            replacement = ~replacement
-            binary &= replacement
-                
-        else: #bit to replace is a 0
-            binary |= replacement
-
-        return binary 
-
     def set_temperature(self, register, value):
         '''
-        Return the decoded value of a temperature from a given register. Supported for values up until 256 
+        Encode a temperature and write it to a given limit register. Values are rounded to the 0.25 C resolution of the limit registers
         '''
-        if value < 0:
-
-            value = int(value * -16)
-            upper_byte = value >> 8 #isolate Upper bits
-            lower_byte = value & 0xFF
+        self.i2c_bus.write_i2c_block_data(self.registers['slave'],register, mcp9808_codec.encode_bytes(value, limit=True))
 
-            for i in range(4):
-                upper_byte = self.bit_inverse(i,upper_byte)
-            for i in range(8):
-                lower_byte = self.bit_inverse(i,lower_byte)
-
-            upper_byte |= 0x10 # add sign bit
+    def get_temperature(self, register):
+        '''
+        Return the decoded value of a temperature from a given register
+        '''
+        return self.decode_temperature(self.i2c_bus.read_i2c_block_data(self.registers['slave'],register, 2))
 
-        else:
-            value = int(value * 16)
-            upper_byte = value >> 8 #isolate upper bits
-            lower_byte = value & 0xFF
+    @staticmethod
+    def decode_temperature(temp_reg_data):
+        '''
+        Return the decoded value of a temperature from the two bytes of a temperature register
+        '''
+        return mcp9808_codec.decode_bytes(temp_reg_data)
 
-        self.i2c_bus.write_i2c_block_data(self.registers['slave'],register, [upper_byte,lower_byte])
+    @staticmethod
+    def limit_value(value):
+        '''
+        Return value as it reads back from a limit register, rounded to the 0.25 C register resolution
+        '''
+        return mcp9808_codec.decode_bytes(mcp9808_codec.encode_bytes(value, limit=True))
 
-    def get_temperature(self, register):
+    def read_limits(self):
         '''
-        Return the decoded value of a temperature from a given register
+        Read the critical, upper and lower limits in one bus transaction
+
+        The MCP9808 register pointer does not auto-increment, so each 16-bit limit register is a separate 2 byte read.
+        Returns a dict with the critical_temp, upper_temp and lower_temp values in C
         '''
-        temp_reg_data = self.i2c_bus.read_i2c_block_data(self.registers['slave'],register, 2)
-        upper_byte =  temp_reg_data[0] & 0x1F
-        lower_byte = (temp_reg_data[1]) / 16
-        if upper_byte & 0x10:
-            upper_byte = (upper_byte & 0xF) * 16
-            return -255.75 + (upper_byte + lower_byte)
-        else: 
-            upper_byte = upper_byte * 16
-            return upper_byte + lower_byte
+        with self._transaction():
+            return {
+                'critical_temp' : self.critical_temp,
+                'upper_temp' : self.upper_temp,
+                'lower_temp' : self.lower_temp,
+            }
 
     @property
     def critical_temp(self):
@@ -131,3 +224,170 @@ class Temperature_Sensor:
     @property
     def ambient(self):
         return self.get_temperature(self.registers['t_ambient'])
+
+    @property
+    def config(self):
+        '''
+        Return the 16 bit config register
+        '''
+        config_data = self.i2c_bus.read_i2c_block_data(self.registers['slave'],self.registers['config'], 2)
+        return config_data[0] << 8 | config_data[1]
+
+    @config.setter
+    def config(self,value):
+        self.i2c_bus.write_i2c_block_data(self.registers['slave'],self.registers['config'], [value >> 8 & 0xFF, value & 0xFF])
+
+    def configure_alert(self, mode = 'comparator', hysteresis = 0, critical_only = False, active_high = False, enable = True):
+        '''
+        Program the Alert output in the config register, keeping the shutdown and lock bits
+
+        Args:
+            mode (string): 'comparator' (Alert follows the limits) or 'interrupt' (Alert latches until cleared)
+            hysteresis (float): limit hysteresis in C, one of 0, 1.5, 3 or 6
+            critical_only (bool): only assert Alert for the critical limit
+            active_high (bool): Alert polarity, the MCP9808 Alert pin is open drain and active low by default
+            enable (bool): enable the Alert output
+
+        Raises:
+            ValueError: f"Invalid alert mode: {mode}"
+            ValueError: f"Invalid hysteresis: {hysteresis}"
+        '''
+        if mode not in ('comparator', 'interrupt'):
+            raise ValueError(f"Invalid alert mode: {mode}")
+        if hysteresis not in self.hysteresis_values:
+            raise ValueError(f"Invalid hysteresis: {hysteresis}")
+        config = self.config & (self.config_bits['shutdown'] | self.config_bits['win_lock'] | self.config_bits['crit_lock'])
+        config |= self.hysteresis_values[hysteresis] << 9
+        if mode == 'interrupt':
+            config |= self.config_bits['alert_mode']
+        if active_high:
+            config |= self.config_bits['alert_polarity']
+        if critical_only:
+            config |= self.config_bits['alert_select']
+        if enable:
+            config |= self.config_bits['alert_enable']
+        self.config = config
+        self._alert_config = config
+
+    def clear_alert(self):
+        '''
+        Release a latched Alert output in interrupt mode
+        '''
+        config = getattr(self, '_alert_config', None)
+        if config is None:
+            config = self.config
+        self.config = config | self.config_bits['int_clear']
+
+    @staticmethod
+    def decode_alert(temp_reg_data):
+        '''
+        Return the alert event encoded in the two bytes of the ambient temperature register
+        '''
+        return {
+            'temperature' : Temperature_Sensor.decode_temperature(temp_reg_data),
+            'critical' : bool(temp_reg_data[0] & 0x80), #Ambient >= Critical
+            'upper' : bool(temp_reg_data[0] & 0x40), #Ambient > Upper
+            'lower' : bool(temp_reg_data[0] & 0x20), #Ambient < Lower
+        }
+
+    @property
+    def alert_flags(self):
+        '''
+        Return the ambient temperature and the critical, upper and lower alert flags, from one read of the ambient register
+        '''
+        return self.decode_alert(self.i2c_bus.read_i2c_block_data(self.registers['slave'],self.registers['t_ambient'], 2))
+
+    def wait_for_alert(self, edge_source, timeout = None):
+        '''
+        Block on the Alert line without touching the bus, then read the alert flags once the line changes.
+        In interrupt mode the latched output is cleared after the flags are read.
+
+        Args:
+            edge_source: object with a wait(timeout) method returning True on an edge, see GPIO/edge_source.py
+            timeout (float): seconds to wait, None to wait forever
+
+        Returns:
+            dict : timestamp, temperature and critical/upper/lower flags, or None on timeout
+        '''
+        if not edge_source.wait(timeout):
+            return None
+        event = self.alert_flags
+        event['timestamp'] = time.time()
+        config = getattr(self, '_alert_config', None)
+        if config is not None and config & self.config_bits['alert_mode']:
+            self.clear_alert()
+        return event
+
+    def alerts(self, edge_source):
+        '''
+        Yield every alert event signalled on edge_source
+        '''
+        while True:
+            event = self.wait_for_alert(edge_source)
+            if event is not None:
+                yield event
+
+    @property
+    def resolution(self):
+        '''
+        Return the resolution register value (0 = 0.5 C, 1 = 0.25 C, 2 = 0.125 C, 3 = 0.0625 C)
+        '''
+        return self.i2c_bus.read_byte_data(self.registers['slave'],self.registers['resolution']) & 0b11
+
+    @resolution.setter
+    def resolution(self,value):
+        if value not in self.resolutions:
+            raise ValueError(f"Invalid resolution: {value}")
+        self.i2c_bus.write_byte_data(self.registers['slave'],self.registers['resolution'],value)
+
+    @classmethod
+    def resolution_for_rate(cls, rate):
+        '''
+        Return the finest resolution whose conversion time fits in one sample period at rate Hz
+        '''
+        period = 1 / rate
+        fitting = [value for value, (_, conversion_time) in cls.resolutions.items() if conversion_time <= period]
+        return max(fitting) if fitting else min(cls.resolutions)
+
+    def stream(self, rate, buffer = None, duration = None, callback = None):
+        '''
+        Sample the ambient temperature at rate Hz, yielding (timestamp, temperature) for every sample.
+        The resolution register is set so the conversion time fits in the sample period. Samples are also appended to buffer
+        (a SampleRingBuffer) and passed to callback(timestamp, temperature) when given. Deadlines are kept on a fixed grid,
+        a sample that starts more than a period late is skipped and counted in stream_stats['missed_deadlines'].
+
+        Args:
+            rate (float): target sample rate in Hz
+            buffer (SampleRingBuffer): optional buffer receiving every sample
+            duration (float): seconds to stream for, None to stream until the generator is closed
+            callback (function): optional function called with each sample
+        '''
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+        self.resolution = self.resolution_for_rate(rate)
+        period = 1 / rate
+        self.stream_stats = {'samples' : 0, 'missed_deadlines' : 0, 'max_lateness' : 0.0, 'overruns' : 0}
+        start = time.monotonic()
+        index = 0
+        while duration is None or index * period < duration:
+            deadline = start + index * period
+            now = time.monotonic()
+            if deadline > now:
+                time.sleep(deadline - now)
+            lateness = time.monotonic() - deadline
+            if lateness > period:
+                missed = int(lateness // period)
+                self.stream_stats['missed_deadlines'] += missed
+                index += missed
+                continue
+            self.stream_stats['max_lateness'] = max(self.stream_stats['max_lateness'], lateness)
+            timestamp = time.time()
+            temperature = self.ambient
+            self.stream_stats['samples'] += 1
+            if buffer is not None:
+                buffer.append(timestamp, temperature)
+                self.stream_stats['overruns'] = buffer.overruns
+            if callback is not None:
+                callback(timestamp, temperature)
+            yield timestamp, temperature
+            index += 1
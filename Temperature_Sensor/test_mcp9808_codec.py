@@ -0,0 +1,52 @@
+import pytest
+import mcp9808_codec
+
+# Register words and temperatures from the MCP9808 data sheet, section 5.1.3
+@pytest.mark.parametrize("raw,expected", [
+    (0x0000, 0.0),
+    (0x0001, 0.0625),
+    (0x0190, 25.0),
+    (0x0FFF, 255.9375),
+    (0x1FFF, -0.0625),
+    (0x1F5C, -10.25),
+    (0x1E70, -25.0),
+    (0x1000, -256.0),
+    (0xC190, 25.0), #Alert flags are ignored
+])
+def test_decode(raw,expected):
+    assert mcp9808_codec.decode(raw) == expected
+    assert mcp9808_codec.decode_bytes([raw >> 8, raw & 0xFF]) == expected
+
+def test_round_trip_every_word():
+    for raw in range(0x2000):
+        temperature = mcp9808_codec.decode(raw)
+        assert mcp9808_codec.encode(temperature) == raw
+        assert mcp9808_codec.encode_bytes(temperature) == [raw >> 8, raw & 0xFF]
+
+def test_round_trip_every_limit_word():
+    for raw in range(0, 0x2000, 4):
+        assert mcp9808_codec.encode(mcp9808_codec.decode(raw), limit=True) == raw
+
+@pytest.mark.parametrize("raw,expected", [
+    (-5.1, 0x1FB0), #Rounded to -5.0
+    (-5.2, 0x1FAC), #Rounded to -5.25
+    (-5.15, 0x1FAC),
+    (40.1, 0x0280),
+    (40.2, 0x0284),
+])
+def test_encode_limit(raw,expected):
+    assert mcp9808_codec.encode(raw, limit=True) == expected
+
+@pytest.mark.parametrize("raw", [-256.0625, 256.0])
+def test_encode_out_of_range(raw):
+    with pytest.raises(ValueError):
+        mcp9808_codec.encode(raw)
+
+def test_decode_array():
+    np = pytest.importorskip("numpy")
+    words = np.arange(0x10000, dtype=np.uint16)
+    decoded = mcp9808_codec.decode_array(words)
+    assert decoded.dtype == np.float64
+    assert decoded.tolist() == [mcp9808_codec.decode(int(word)) for word in words]
+    data = [0xC1,0x90,0x1F,0x5C]
+    assert mcp9808_codec.decode_bytes_array(data).tolist() == [25.0,-10.25]
@@ -0,0 +1,64 @@
+import pytest
+from temperature_sensor import Temperature_Sensor, SampleRingBuffer
+
+@pytest.mark.parametrize("rate,expected", [
+    (1, 0b11),
+    (4, 0b11),
+    (5, 0b10),
+    (10, 0b01),
+    (20, 0b00),
+    (100, 0b00),
+])
+def test_resolution_for_rate(rate,expected):
+    assert Temperature_Sensor.resolution_for_rate(rate) == expected
+
+def test_ring_buffer_overrun():
+    buffer = SampleRingBuffer(3)
+    for i in range(5):
+        buffer.append(float(i),float(i*10))
+    assert buffer.overruns == 2
+    assert buffer.drain() == [(2.0,20.0),(3.0,30.0),(4.0,40.0)]
+    assert len(buffer) == 0
+
+def test_stream(sim_bus):
+    sensor = Temperature_Sensor(i2c_bus=sim_bus)
+    sim_bus.devices[0x18].temperature = 25.5
+    buffer = SampleRingBuffer(64)
+    samples = list(sensor.stream(50,buffer=buffer,duration=0.2))
+    assert sensor.resolution == 0b00
+    assert 8 <= len(samples) <= 10
+    assert all(temperature == 25.5 for _, temperature in samples)
+    assert buffer.drain() == samples
+    assert sensor.stream_stats['samples'] == len(samples)
+    assert sensor.stream_stats['overruns'] == 0
+
+def test_alert_flags(sim_bus):
+    sensor = Temperature_Sensor(0,80,40,-5,i2c_bus=sim_bus)
+    sim_bus.devices[0x18].temperature = 45
+    assert sensor.alert_flags == {'temperature':45.0,'critical':False,'upper':True,'lower':False}
+    sim_bus.devices[0x18].temperature = 85
+    assert sensor.alert_flags['critical']
+
+@pytest.mark.parametrize("mode", ['comparator','interrupt'])
+def test_wait_for_alert(sim_bus,mode):
+    from GPIO.edge_source import PipeEdgeSource
+    source = PipeEdgeSource()
+    device = sim_bus.devices[0x18]
+    device.alert_output = source.trigger
+    sensor = Temperature_Sensor(0,80,40,-5,i2c_bus=sim_bus)
+    sensor.configure_alert(mode=mode,hysteresis=1.5)
+    assert sensor.config == 0x0200 | 0x0008 | (0x0001 if mode == 'interrupt' else 0)
+
+    assert sensor.wait_for_alert(source,timeout=0.01) is None
+    count = sim_bus.transaction_count
+    device.temperature = 41
+    event = sensor.wait_for_alert(source,timeout=1)
+    assert event['upper'] and event['temperature'] == 41.0
+    assert sim_bus.transaction_count - count == (2 if mode == 'interrupt' else 1)
+    source.close()
+
+@pytest.mark.parametrize("value", [-40, -10.25, -0.25, 0.5, 40, 125])
+def test_limit_round_trip(sim_bus,value):
+    sensor = Temperature_Sensor(i2c_bus=sim_bus)
+    sensor.lower_temp = value
+    assert sensor.lower_temp == value
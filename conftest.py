@@ -0,0 +1,22 @@
+import pytest
+from I2C_Bus.sim_smbus import SimSMBus
+
+@pytest.fixture
+def sim_bus():
+    '''Simulated SMBus with the MCP79410, MCP9808 and STM32 attached'''
+    return SimSMBus()
+
+class FakeClock:
+    '''Monotonic clock stand-in, time only passes through sleep() or by setting now'''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self,seconds):
+        self.now += seconds
+
+@pytest.fixture
+def fake_clock():
+    return FakeClock()
@@ -0,0 +1,217 @@
+'''
+asyncio variants of the device drivers
+
+Blocking bus calls run in a bounded thread pool shared by every device, and the waits between them (OSCRUN polling,
+the RTC tick check, the STM32 handshake) are awaited with asyncio.sleep, so a slow device does not hold a worker thread
+or delay the others. Exchanges made of several bus calls hold a lock per device, so concurrent ones do not interleave.
+gather_telemetry() reads several devices concurrently with a timeout per device. A timed out read stops being waited
+for, a bus call already running in the pool still finishes in the background.
+'''
+import asyncio
+import concurrent.futures
+import time
+import weakref
+
+MAX_WORKERS = 4
+_executor = None
+_locks = weakref.WeakKeyDictionary() #Blocking driver -> (event loop, asyncio.Lock)
+
+def get_executor(max_workers = MAX_WORKERS):
+    '''
+    Return the thread pool shared by the async drivers, created on first use
+    '''
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='obc-bus')
+    return _executor
+
+class AsyncDevice:
+    '''
+    Base class of the async drivers, wraps a blocking driver instance
+    '''
+
+    def __init__(self, device, executor = None):
+        self.device = device
+        self.executor = executor
+
+    @classmethod
+    async def open(cls, factory, executor = None):
+        '''
+        Create the blocking driver with factory() in the executor (driver constructors talk to the device) and wrap it
+        '''
+        device = await asyncio.get_running_loop().run_in_executor(executor or get_executor(), factory)
+        return cls(device, executor)
+
+    def lock(self):
+        '''
+        Return the asyncio.Lock of the wrapped driver in the running event loop, shared by every wrapper of the same driver
+        '''
+        loop = asyncio.get_running_loop()
+        entry = _locks.get(self.device)
+        if entry is None or entry[0] is not loop:
+            entry = _locks[self.device] = (loop, asyncio.Lock())
+        return entry[1]
+
+    async def run(self, function, *args):
+        '''
+        Run a blocking call of the driver in the executor
+        '''
+        return await asyncio.get_running_loop().run_in_executor(self.executor or get_executor(), function, *args)
+
+class AsyncRTC(AsyncDevice):
+    '''
+    Async MCP79410 driver, see Real_Time_Clock/rtc.py
+    '''
+
+    async def snapshot(self):
+        return await self.run(lambda: self.device.snapshot)
+
+    async def timestamp(self):
+        return await self.run(lambda: self.device.timestamp)
+
+    async def read_state(self):
+        return await self.run(self.device.read_state)
+
+    async def set_datetime(self, value):
+        await self.run(setattr, self.device, 'datetime', value)
+
+    async def wait_oscrun(self, state, timeout, poll_interval):
+        '''
+        Poll the OSCRUN status bit until it reports state, returns False on timeout
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            if await self.run(self.device._read_oscrun) == bool(state):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+
+    async def set_clock(self, state):
+        '''
+        Start (1) or stop (0) the oscillator and confirm it with the tick check of the driver
+
+        Raises:
+            RuntimeError: "Clock unable to Stop" or "Clock unable to Start"
+        '''
+        rtc = self.device
+        await self.run(rtc._write_st, state)
+        if rtc.tick_check == 'oscrun':
+            confirmed = await self.wait_oscrun(state, rtc.oscrun_timeout, rtc.oscrun_poll_interval)
+        elif rtc.tick_check == 'sleep':
+            second_start = await self.run(lambda: rtc._second)
+            await asyncio.sleep(rtc.tick_sleep)
+            confirmed = rtc._ticked_as_expected(state, await self.run(lambda: rtc._second) - second_start)
+        else:
+            raise ValueError(f"Invalid tick check: {rtc.tick_check}")
+        if not confirmed:
+            raise rtc._clock_error(state)
+
+class AsyncTemperatureSensor(AsyncDevice):
+    '''
+    Async MCP9808 driver, see Temperature_Sensor/temperature_sensor.py
+    '''
+
+    async def ambient(self):
+        return await self.run(lambda: self.device.ambient)
+
+    async def read_limits(self):
+        return await self.run(self.device.read_limits)
+
+    async def set_limit(self, name, value):
+        '''
+        Write one of the critical_temp, upper_temp or lower_temp limits
+        '''
+        await self.run(setattr, self.device, name, value)
+
+class AsyncSTM32(AsyncDevice):
+    '''
+    Async STM32 driver, see STM32/stm32.py. The handshake decisions (status, backoff, retries) are the driver's own,
+    only the waits between them are awaited instead of slept
+
+    transmit() and recieve() hold the device lock from the command byte to the end of the data phase, concurrent calls
+    to the same STM32 run one after the other
+    '''
+
+    async def _wait_ready(self):
+        stm32 = self.device
+        deadline = time.monotonic() + stm32.ready_timeout
+        delays = stm32._backoff()
+        polls = 0
+        while True:
+            polls += 1
+            if await self.run(stm32._read_ready):
+                return True, polls
+            now = time.monotonic()
+            if now >= deadline:
+                return False, polls
+            await asyncio.sleep(min(next(delays), deadline - now))
+
+    async def _command(self, command):
+        stm32 = self.device
+        retries = 0
+        polls = 0
+        while True:
+            try:
+                await self.run(stm32.bus.write_i2c_block_data, stm32.slave_address, 0, [command])
+                if stm32.handshake == 'ready':
+                    ready, command_polls = await self._wait_ready()
+                    polls += command_polls
+                else:
+                    await asyncio.sleep(stm32.command_delay)
+                    ready = True
+            except OSError:
+                ready = False
+            if ready:
+                return True, retries, polls
+            retries += 1
+            if stm32._give_up(retries):
+                return False, retries, polls
+            if stm32.handshake == 'sleep':
+                await asyncio.sleep(stm32.command_delay)
+
+    async def transmit(self, data):
+        stm32 = self.device
+        async with self.lock():
+            start = time.monotonic()
+            ok, retries, polls = await self._command(stm32.defined_bits['WRITE'])
+            if ok:
+                await self.run(stm32.bus.write_i2c_block_data, stm32.slave_address, 0x0, [stm32.defined_bits['BAD_BYTE']] + list(data))
+        stm32._record('WRITE', start, ok, retries, polls)
+
+    async def recieve(self, expected_bytes):
+        stm32 = self.device
+        data = None
+        async with self.lock():
+            start = time.monotonic()
+            ok, retries, polls = await self._command(stm32.defined_bits['READ'])
+            if ok:
+                data = (await self.run(stm32.bus.read_i2c_block_data, stm32.slave_address, 0x0, expected_bytes + 2))[2:]
+        stm32._record('READ', start, ok, retries, polls)
+        return data
+
+async def _read_with_timeout(read, timeout):
+    try:
+        return {'value': await asyncio.wait_for(read(), timeout), 'error': None}
+    except asyncio.TimeoutError:
+        return {'value': None, 'error': f"timed out after {timeout} s"}
+    except Exception as error:
+        return {'value': None, 'error': str(error) or type(error).__name__}
+
+async def gather_telemetry(reads, timeouts = None, default_timeout = 1.0):
+    '''
+    Run every read concurrently and return {name: {'value': ..., 'error': None or message, 'elapsed': seconds}}
+
+    Args:
+        reads (dict): name -> coroutine function taking no arguments, e.g. {'rtc': AsyncRTC(rtc).timestamp}
+        timeouts (dict): seconds allowed per name, names not listed get default_timeout
+    '''
+    timeouts = timeouts or {}
+    start = time.monotonic()
+
+    async def timed(name, read):
+        result = await _read_with_timeout(read, timeouts.get(name, default_timeout))
+        result['elapsed'] = time.monotonic() - start
+        return name, result
+
+    return dict(await asyncio.gather(*(timed(name, read) for name, read in reads.items())))
@@ -0,0 +1,261 @@
+import dataclasses
+import os
+import pickle
+
+class ConfigError(ValueError):
+    '''
+    Raised when the config file cannot be read or does not match the schema
+    '''
+
+def _choice(default, *choices):
+    return dataclasses.field(default=default, metadata={'choices': choices})
+
+def _default(factory):
+    return dataclasses.field(default_factory=factory)
+
+def _mapping(factory, *keys):
+    return dataclasses.field(default_factory=factory, metadata={'keys': keys})
+
+@dataclasses.dataclass(frozen=True)
+class SimConfig:
+    latency: float = 0.0
+    byte_time: float = 0.0
+    fault_rate: float = 0.0
+
+@dataclasses.dataclass(frozen=True)
+class I2CConfig:
+    backend: str = _choice('smbus', 'smbus', 'sim')
+    sim: SimConfig = _default(SimConfig)
+
+@dataclasses.dataclass(frozen=True)
+class RTCAlarmConfig:
+    gpio: int = None
+    alarm: int = _choice(0, 0, 1)
+    period: int = 3600
+    pass_period: int = 10
+    passes_path: str = ''
+
+@dataclasses.dataclass(frozen=True)
+class RTCConfig:
+    battery_state: int = _choice(1, 0, 1)
+    clock_state: int = _choice(1, 0, 1)
+    i2c_status: int = _choice(0, 0, 1)
+    datetime: str = None
+    tick_check: str = _choice('oscrun', 'oscrun', 'sleep')
+    oscrun_timeout: float = 1.0
+    oscrun_poll_interval: float = 0.01
+    resync_interval: float = 60
+    align_sync: bool = True
+    checkpoint_batch: int = _choice(3, 1, 2, 3)
+    alarm: RTCAlarmConfig = _default(RTCAlarmConfig)
+
+@dataclasses.dataclass(frozen=True)
+class AlertConfig:
+    mode: str = _choice('comparator', 'comparator', 'interrupt')
+    hysteresis: float = _choice(0, 0, 1.5, 3, 6)
+    critical_only: bool = False
+    gpio: int = None
+
+@dataclasses.dataclass(frozen=True)
+class TemperatureSensorConfig:
+    i2c_status: int = _choice(0, 0, 1)
+    critical_temperature: float = None
+    lower_temperature: float = None
+    upper_temperature: float = None
+    alert: AlertConfig = _default(AlertConfig)
+
+@dataclasses.dataclass(frozen=True)
+class STM32Config:
+    address: int = 0x15
+    handshake: str = _choice('sleep', 'sleep', 'ready')
+    ready_timeout: float = 0.5
+    telemetry_bytes: int = 0
+
+@dataclasses.dataclass(frozen=True)
+class DaemonConfig:
+    jitter_report_period: float = 60
+    config_poll_period: float = 2
+    periods: dict = _mapping(lambda: {'rtc': 1, 'temperature_sensor': 0.5}, 'rtc', 'temperature_sensor', 'checkpoint')
+
+@dataclasses.dataclass(frozen=True)
+class StatsConfig:
+    textfile: str = ''
+
+@dataclasses.dataclass(frozen=True)
+class TelemetryConfig:
+    store_path: str = ''
+    batch_size: int = 64
+    fsync: str = _choice('batch', 'never', 'batch', 'close')
+    index_interval: int = 1024
+    rollup_resolutions: list = _default(lambda: [60, 3600, 86400])
+    device_timeouts: dict = _default(lambda: {'rtc': 0.5, 'temperature_sensor': 0.5, 'stm32': 5})
+
+@dataclasses.dataclass(frozen=True)
+class ControllerConfig:
+    '''
+    Validated contents of controller_config.yml, every section falls back to its defaults when it is left out
+    '''
+    i2c: I2CConfig = _default(I2CConfig)
+    rtc: RTCConfig = _default(RTCConfig)
+    temperature_sensor: TemperatureSensorConfig = _default(TemperatureSensorConfig)
+    stm32: STM32Config = _default(STM32Config)
+    daemon: DaemonConfig = _default(DaemonConfig)
+    stats: StatsConfig = _default(StatsConfig)
+    telemetry: TelemetryConfig = _default(TelemetryConfig)
+
+def _check_value(field, value, path):
+    kind = field.type
+    if value is None:
+        if field.default is None:
+            return None
+        raise ConfigError(f"{path} must be set")
+    if dataclasses.is_dataclass(kind):
+        return _build(kind, value, path)
+    if kind is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{path} must be a number, not {value!r}")
+    elif kind is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ConfigError(f"{path} must be an integer, not {value!r}")
+    elif kind is bool:
+        if not isinstance(value, bool):
+            raise ConfigError(f"{path} must be true or false, not {value!r}")
+    elif kind is str:
+        if not isinstance(value, str):
+            raise ConfigError(f"{path} must be a string, not {value!r}")
+    elif kind is dict:
+        if not isinstance(value, dict) or not all(isinstance(period, (int, float)) and period > 0 for period in value.values()):
+            raise ConfigError(f"{path} must map names to positive numbers, not {value!r}")
+        unknown = set(value) - set(field.metadata.get('keys', value))
+        if unknown:
+            raise ConfigError(f"Unknown key {path}.{sorted(map(str, unknown))[0]}")
+    elif kind is list:
+        if not isinstance(value, list) or not all(isinstance(item, int) and item > 0 for item in value):
+            raise ConfigError(f"{path} must be a list of positive integers, not {value!r}")
+    choices = field.metadata.get('choices')
+    if choices and value not in choices:
+        raise ConfigError(f"{path} must be one of {', '.join(map(str, choices))}, not {value!r}")
+    return value
+
+def _build(cls, data, path):
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path or 'config'} must be a mapping, not {data!r}")
+    fields = {field.name: field for field in dataclasses.fields(cls)}
+    unknown = set(data) - set(fields)
+    if unknown:
+        raise ConfigError(f"Unknown key {(path + '.' if path else '') + sorted(map(str, unknown))[0]}")
+    values = {}
+    for name, value in data.items():
+        values[name] = _check_value(fields[name], value, f"{path}.{name}" if path else name)
+    return cls(**values)
+
+def parse_config(data):
+    '''
+    Validate the mapping loaded from the YAML file and return a ControllerConfig
+
+    Raises:
+        ConfigError: the first key that is unknown, missing or has an invalid value
+    '''
+    return _build(ControllerConfig, {} if data is None else data, '')
+
+def cache_path(path):
+    '''
+    Return the path of the parse cache kept next to the config file
+    '''
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.cache")
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_config(path, use_cache = True):
+    '''
+    Load and validate the config file at path
+
+    The validated config is pickled next to the file, keyed on its mtime and size and on the mtime of this module
+    (the schema), so repeat runs skip YAML parsing (and the PyYAML import) until either changes.
+
+    Raises:
+        ConfigError: the file cannot be read, is not valid YAML or does not match the schema
+    '''
+    try:
+        key = _file_key(path) + (os.stat(__file__).st_mtime_ns,)
+    except OSError as error:
+        raise ConfigError(f"Unable to open {path}: {error}") from error
+    if use_cache:
+        try:
+            with open(cache_path(path), 'rb') as file:
+                cached_key, config = pickle.load(file)
+            if cached_key == key and isinstance(config, ControllerConfig):
+                return config
+        except Exception:
+            pass # A missing, stale or unreadable cache is rebuilt below
+
+    import yaml
+    try:
+        with open(path, 'r') as file:
+            data = yaml.safe_load(file)
+    except OSError as error:
+        raise ConfigError(f"Unable to open {path}: {error}") from error
+    except yaml.YAMLError as error:
+        raise ConfigError(f"Unable to parse {path}: {error}") from error
+    config = parse_config(data)
+
+    if use_cache:
+        temporary = cache_path(path) + '.tmp'
+        try:
+            with open(temporary, 'wb') as file:
+                pickle.dump((key, config), file)
+            os.replace(temporary, cache_path(path))
+        except OSError:
+            pass # The cache is only an optimization, e.g. the config directory may be read only
+    return config
+
+class ConfigWatcher:
+    '''
+    Reload the config when its file changes, for long running processes
+
+    Call check() periodically (e.g. from a scheduler task), on_change(old, new) is called with the validated configs
+    after every change. An invalid edit is reported and the previous config is kept.
+    '''
+
+    def __init__(self, path, on_change = None, config = None):
+        '''
+        Initialization of ConfigWatcher class
+
+        Args:
+            path (string): config file to watch
+            on_change (function): called with (old, new) ControllerConfig after the file changed
+            config (ControllerConfig): config already loaded from path, loaded now if not given
+        '''
+        self.path = path
+        self.on_change = on_change
+        self._key = _file_key(path)
+        self.config = load_config(path) if config is None else config
+        self.reloads = 0
+        self.errors = 0
+
+    def check(self):
+        '''
+        Reload the config if the file changed since the last check, returns True if a new config was applied
+        '''
+        try:
+            key = _file_key(self.path)
+        except OSError as error:
+            print(f"Config reload failed: {error}", flush=True)
+            return False
+        if key == self._key:
+            return False
+        self._key = key
+        try:
+            config = load_config(self.path)
+        except ConfigError as error:
+            self.errors += 1
+            print(f"Config reload failed, keeping the previous config: {error}", flush=True)
+            return False
+        old, self.config = self.config, config
+        self.reloads += 1
+        if config != old and self.on_change is not None:
+            self.on_change(old, config)
+        return True
@@ -1,7 +1,19 @@
-import yaml
 from Real_Time_Clock.rtc import RTC 
+from Real_Time_Clock.time_service import TimeService
+from Real_Time_Clock.checkpoint import CheckpointStore
+from Real_Time_Clock.alarm_scheduler import AlarmScheduler
 from Temperature_Sensor.temperature_sensor import Temperature_Sensor
+from Telemetry.scheduler import MultiRateScheduler
+from I2C_Bus.bus_manager import BusManager, get_opener
+from I2C_Bus.instrumentation import BusStats, instrument
+from Telemetry.telemetry_store import TelemetryStore, TelemetryReader, DEVICE_IDS, CHANNEL_IDS, STATUS
+from Telemetry.rollups import RollupStore
+from obc_config import ConfigError, ConfigWatcher, load_config
 import argparse
+import datetime
+import os
+import signal
+import sys
 
 class OBC_Controller:
     """This is a class to contain various fucntions and operations of the on board controller. This class is meant to be used through a CLI.
@@ -9,54 +21,565 @@ class OBC_Controller:
         Functionality:
             1) Yaml file configurability 
             2) Aquire telemetry from multiple devices
+            3) Long running telemetry daemon with a per device sample period
+            4) I2C transaction statistics per device and register
+            5) Event driven temperature alerts from the MCP9808 Alert output
+            6) Binary telemetry log (see Telemetry/telemetry_store.py)
+            7) Min/max/mean queries over the telemetry log from multi-resolution rollups
+            8) Validated, cached config that the daemon reloads when the file changes
+            9) Daemon timestamps from a cached RTC time with drift reporting (see Real_Time_Clock/time_service.py)
+            10) Boot counters and temperature summaries that survive power loss (see Real_Time_Clock/checkpoint.py)
+            11) Telemetry woken by the RTC alarm, more often during passes (see Real_Time_Clock/alarm_scheduler.py)
     """
-    config_path =  "controller_config.yml"
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),"controller_config.yml")
+    # Dependencies imported on first use rather than when obc_controller is imported
+    deferred_modules = ['yaml','smbus']
+    bus_manager = None
+    bus_stats = BusStats()
+
+    config = None
 
     @staticmethod
     def get_config():
-        try:
-            with open(OBC_Controller.config_path, 'r') as file:
-                return yaml.safe_load(file)
-        except:
-            Exception(f"Unable to open {OBC_Controller.config_path}")
+        """Return the validated config (see obc_config.py), it is loaded once per process and cached on disk between runs.
+
+        Raises:
+            ConfigError: the config file is missing, is not valid YAML or does not match the schema
+        """
+        if OBC_Controller.config is None:
+            OBC_Controller.config = load_config(OBC_Controller.config_path)
+        return OBC_Controller.config
+
+    @staticmethod
+    def get_bus(bus_number):
+        """Return the thread safe handle for bus_number, every device on the same bus shares one handle.
+        The backend (hardware smbus or simulated) is selected by $OBC_I2C_BACKEND or the i2c section of the config,
+        a simulated bus uses the i2c.sim options of the config either way.
+        """
+        if OBC_Controller.bus_manager is None:
+            i2c_config = OBC_Controller.get_config().i2c
+            opener = get_opener(i2c_config.backend,latency=i2c_config.sim.latency,byte_time=i2c_config.sim.byte_time,
+                                fault_rate=i2c_config.sim.fault_rate)
+            OBC_Controller.bus_manager = BusManager(instrument(opener,OBC_Controller.bus_stats))
+        return OBC_Controller.bus_manager.bus(bus_number)
 
     @staticmethod
     def init_rtc(config):
-        rtc_config = config["rtc"]
-        return RTC(rtc_config['battery_state'],rtc_config['clock_state'],rtc_config['i2c_status'],rtc_config['datetime'])
+        rtc_config = config.rtc
+        return RTC(rtc_config.battery_state,rtc_config.clock_state,rtc_config.i2c_status,rtc_config.datetime,
+                   rtc_config.tick_check,rtc_config.oscrun_timeout,rtc_config.oscrun_poll_interval,
+                   i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number))
 
     @staticmethod
     def init_temp(config):
-        temp_config = config["temperature_sensor"]
-        return Temperature_Sensor(temp_config["i2c_status"],temp_config["critical_temperature"],temp_config["upper_temperature"],temp_config["lower_temperature"])
+        temp_config = config.temperature_sensor
+        return Temperature_Sensor(temp_config.i2c_status,temp_config.critical_temperature,temp_config.upper_temperature,temp_config.lower_temperature,
+                                  i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
 
     @staticmethod
-    def init_hardware():
+    def plan_init(config,rtc_interface,temp_interface):
+        """Read the current device state and return the writes needed to make the devices match config.
+        The RTC datetime is only loaded when the clock is stopped or behind the configured datetime, so a running clock keeps its time.
+
+        Returns:
+            list : (setting, current value, desired value, function applying the change) in the order they must be applied
+        """
+        plan = []
+        rtc_config = config.rtc
+        state = rtc_interface.read_state()
+        if state['battery'] != rtc_config.battery_state:
+            plan.append(('rtc.battery',state['battery'],rtc_config.battery_state,lambda: setattr(rtc_interface,'battery',rtc_config.battery_state)))
+        if rtc_config.datetime is not None:
+            start = RTC.parse_datetime(rtc_config.datetime)
+            current = state['datetime']
+            if not state['clock'] or current is None or current < start:
+                plan.append(('rtc.datetime',current,start,lambda: setattr(rtc_interface,'datetime',start)))
+        if state['clock'] != rtc_config.clock_state:
+            plan.append(('rtc.clock',state['clock'],rtc_config.clock_state,lambda: setattr(rtc_interface,'clock',rtc_config.clock_state)))
+
+        temp_config = config.temperature_sensor
+        limits = temp_interface.read_limits()
+        for name, attribute in (('critical_temperature','critical_temp'),('upper_temperature','upper_temp'),('lower_temperature','lower_temp')):
+            value = getattr(temp_config,name)
+            if value is None:
+                continue
+            limit = Temperature_Sensor.limit_value(value)
+            if limits[attribute] != limit:
+                plan.append((f'temperature_sensor.{attribute}',limits[attribute],limit,
+                             lambda attribute=attribute, limit=limit: setattr(temp_interface,attribute,limit)))
+        return plan
+
+    @staticmethod
+    def init_hardware(dry_run = False,force = False):
+        """Bring the devices to the state in the config, writing only the settings that differ and printing the plan.
+
+        Args:
+            dry_run (bool): print the plan without writing to the devices
+            force (bool): re-apply every setting in the config without reading the devices first
+
+        Raises:
+            RuntimeError: f"Unable to apply {setting}: {error}", the changes after it in the plan are not applied
+        """
         config = OBC_Controller.get_config()
-        OBC_Controller.init_rtc(config)
-        OBC_Controller.init_temp(config)
+        if force:
+            OBC_Controller.init_rtc(config)
+            OBC_Controller.init_temp(config)
+            return
+        rtc_config = config.rtc
+        rtc_interface = RTC(tick_check=rtc_config.tick_check,oscrun_timeout=rtc_config.oscrun_timeout,
+                            oscrun_poll_interval=rtc_config.oscrun_poll_interval,i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number))
+        temp_interface = Temperature_Sensor(i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
+        plan = OBC_Controller.plan_init(config,rtc_interface,temp_interface)
+        if not plan:
+            print("Devices match the config, nothing to write",flush=True)
+            return
+        print("Dry run, planned changes:" if dry_run else "Applying changes:",flush=True)
+        for name, current, desired, apply in plan:
+            print(f"  {name}: {current} -> {desired}",flush=True)
+            if not dry_run:
+                try:
+                    apply()
+                except RuntimeError as error:
+                    raise RuntimeError(f"Unable to apply {name}: {error}") from error
+
+    @staticmethod
+    def open_telemetry_store():
+        """Open the binary telemetry log from the telemetry section of the config, or return None if store_path is not set"""
+        telemetry_config = OBC_Controller.get_config().telemetry
+        if not telemetry_config.store_path:
+            return None
+        return TelemetryStore(os.path.expanduser(telemetry_config.store_path),telemetry_config.batch_size,
+                              telemetry_config.fsync,telemetry_config.index_interval)
+
+    @staticmethod
+    def open_rollups():
+        """Open the rollups kept next to the binary telemetry log, or return None if store_path is not set"""
+        telemetry_config = OBC_Controller.get_config().telemetry
+        if not telemetry_config.store_path:
+            return None
+        return RollupStore(os.path.expanduser(telemetry_config.store_path),telemetry_config.rollup_resolutions)
+
+    @staticmethod
+    def sample_temperature(rtc_interface,temp_interface,store = None,rollups = None):
+        """Print the time and ambient temperature, and append the sample to store and rollups when given.
+        A failed temperature read is logged with the read_error status before the error is raised.
+        rtc_interface is an RTC, or a TimeService to timestamp samples without an RTC read each.
+        """
+        timestamp = rtc_interface.timestamp
+        print("Time: {}-{}-{}-{}-{}-{}".format(*timestamp.timetuple()[:6]),flush=True)
+        try:
+            temperature = temp_interface.ambient
+        except Exception:
+            OBC_Controller.record_temperature(timestamp,None,store)
+            raise
+        OBC_Controller.record_temperature(timestamp,temperature,store,rollups)
+        return temperature
+
+    @staticmethod
+    def record_temperature(timestamp,temperature,store = None,rollups = None):
+        """Print the ambient temperature read at timestamp (from the RTC) and append it to store and rollups when given.
+        A temperature of None is logged with the read_error status.
+        """
+        epoch = timestamp.replace(tzinfo=datetime.timezone.utc).timestamp() #The RTC keeps UTC
+        if temperature is None:
+            if store is not None:
+                store.append(epoch,DEVICE_IDS['temperature_sensor'],CHANNEL_IDS['ambient_temperature'],float('nan'),STATUS['read_error'])
+            return
+        print(f"OBC Ambient Temperature: {temperature} °C",flush=True)
+        if store is not None:
+            store.append(epoch,DEVICE_IDS['temperature_sensor'],CHANNEL_IDS['ambient_temperature'],temperature,STATUS['ok'])
+        if rollups is not None:
+            rollups.add(epoch,DEVICE_IDS['temperature_sensor'],CHANNEL_IDS['ambient_temperature'],temperature)
 
     @staticmethod
     def get_telemetry():
-        temp_interface = Temperature_Sensor()
-        rtc_interface = RTC() 
+        temp_interface = Temperature_Sensor(i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
+        rtc_interface = RTC(i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number))
 
-        print(f"Time: {rtc_interface.datetime}")
-        print(f"OBC Ambient Temperature: {temp_interface.ambient} °C")
+        store = OBC_Controller.open_telemetry_store()
+        rollups = OBC_Controller.open_rollups()
+        try:
+            OBC_Controller.sample_temperature(rtc_interface,temp_interface,store,rollups)
+        finally:
+            if store is not None:
+                store.close()
+                rollups.close()
     
+    @staticmethod
+    def get_telemetry_async():
+        """Read every device concurrently with the async drivers in obc_async.py, each within its timeout from
+        telemetry.device_timeouts, so one cycle takes as long as the slowest device instead of the sum of all of them.
+        The STM32 is read when stm32.telemetry_bytes is set.
+        """
+        import asyncio
+        from obc_async import AsyncRTC, AsyncTemperatureSensor, AsyncSTM32, gather_telemetry
+        config = OBC_Controller.get_config()
+        rtc_bus = OBC_Controller.get_bus(RTC.i2c_bus_number)
+        temp_bus = OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number)
+
+        async def read_rtc():
+            return await (await AsyncRTC.open(lambda: RTC(i2c_bus=rtc_bus))).timestamp()
+
+        async def read_temperature():
+            return await (await AsyncTemperatureSensor.open(lambda: Temperature_Sensor(i2c_bus=temp_bus))).ambient()
+
+        reads = {'rtc': read_rtc, 'temperature_sensor': read_temperature}
+        stm32_config = config.stm32
+        if stm32_config.telemetry_bytes:
+            from STM32.stm32 import STM32
+            stm32 = AsyncSTM32(STM32(stm32_config.address,OBC_Controller.get_bus(STM32.bus_number),stm32_config.handshake,stm32_config.ready_timeout))
+
+            async def read_stm32():
+                data = await stm32.recieve(stm32_config.telemetry_bytes)
+                if data is None:
+                    raise RuntimeError("I2C Bus is likely Bad")
+                return data
+            reads['stm32'] = read_stm32
+        results = asyncio.run(gather_telemetry(reads,config.telemetry.device_timeouts))
+
+        rtc_result = results['rtc']
+        if rtc_result['error'] is None:
+            print("Time: {}-{}-{}-{}-{}-{}".format(*rtc_result['value'].timetuple()[:6]),flush=True)
+            store = OBC_Controller.open_telemetry_store()
+            rollups = OBC_Controller.open_rollups()
+            try:
+                OBC_Controller.record_temperature(rtc_result['value'],results['temperature_sensor']['value'],store,rollups)
+            finally:
+                if store is not None:
+                    store.close()
+                    rollups.close()
+        if 'stm32' in results and results['stm32']['value'] is not None:
+            print(f"STM32: {results['stm32']['value']}",flush=True)
+        for name, result in results.items():
+            if result['error'] is not None:
+                print(f"{name} failed: {result['error']}",flush=True)
+        print("Device read times: " + ", ".join(f"{name} {result['elapsed']*1000:.1f} ms" for name, result in results.items()),flush=True)
+
+    @staticmethod
+    def run_daemon():
+        """Keep devices and bus handles open and sample each device on its own period from the daemon section of the config.
+        A jitter report is printed periodically and when the daemon is stopped with SIGTERM or SIGINT.
+        The config file is watched, periods, limits, the RTC tick check and resync settings and the stats textfile are applied live.
+        Samples are timestamped from a TimeService, which only reads the RTC every rtc.resync_interval seconds.
+        With a checkpoint period, boots are counted and a summary of the temperatures is kept in the RTC SRAM/EEPROM.
+        """
+        config = OBC_Controller.get_config()
+        temp_interface = Temperature_Sensor(i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
+        rtc_interface = RTC(i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number))
+        time_service = TimeService(rtc_interface,config.rtc.resync_interval,config.rtc.align_sync)
+        try:
+            time_service.sync() #Before the tasks are scheduled, so waiting for the RTC tick does not delay it
+        except RuntimeError as error:
+            print(f"RTC sync failed, retrying on the first sample: {error}",flush=True)
+
+        checkpoints = None
+        if 'checkpoint' in config.daemon.periods:
+            checkpoints = CheckpointStore(rtc_interface,config.rtc.checkpoint_batch)
+            try:
+                print(checkpoints.format_state(checkpoints.boot()),flush=True)
+            except RuntimeError as error:
+                print(f"Checkpoints disabled: {error}",flush=True)
+                checkpoints = None
+
+        store = OBC_Controller.open_telemetry_store()
+        rollups = OBC_Controller.open_rollups()
+
+        def sample_temperature():
+            temperature = OBC_Controller.sample_temperature(time_service,temp_interface,store,rollups)
+            if checkpoints is not None:
+                checkpoints.add_sample(temperature)
+
+        def report():
+            print(scheduler.format_jitter_report(),flush=True)
+            print(OBC_Controller.bus_manager.format_stats(),flush=True)
+            print(time_service.format_stats(),flush=True)
+            textfile = OBC_Controller.get_config().stats.textfile
+            if textfile:
+                OBC_Controller.bus_stats.write_textfile(os.path.expanduser(textfile))
+            if rollups is not None:
+                rollups.flush()
+
+        callbacks = {
+            'rtc': lambda: print(f"Time: {time_service.datetime}",flush=True),
+            'temperature_sensor': sample_temperature,
+            'jitter_report': report,
+        }
+        if checkpoints is not None:
+            callbacks['checkpoint'] = lambda: checkpoints.checkpoint_samples(time_service.time())
+        scheduler = MultiRateScheduler()
+        OBC_Controller.apply_daemon_config(None,config,scheduler,callbacks)
+
+        def reconfigure(old,new):
+            OBC_Controller.config = new
+            OBC_Controller.apply_daemon_config(old,new,scheduler,callbacks)
+            OBC_Controller.apply_device_config(old,new,rtc_interface,temp_interface,time_service)
+            print("Config reloaded",flush=True)
+        if config.daemon.config_poll_period:
+            watcher = ConfigWatcher(OBC_Controller.config_path,reconfigure,config)
+            scheduler.add_task('config_reload',config.daemon.config_poll_period,watcher.check)
+
+        def shutdown(signum,frame):
+            scheduler.stop()
+        signal.signal(signal.SIGTERM,shutdown)
+        signal.signal(signal.SIGINT,shutdown)
+
+        scheduler.run()
+        report()
+        if checkpoints is not None:
+            try:
+                checkpoints.checkpoint_samples(time_service.time())
+                checkpoints.close()
+            except RuntimeError as error:
+                print(f"Unable to save the final checkpoint: {error}",flush=True)
+        if store is not None:
+            store.close()
+            rollups.close()
+        OBC_Controller.bus_manager.close()
+
+    @staticmethod
+    def apply_daemon_config(old,new,scheduler,callbacks):
+        """Add, remove or re-period the daemon tasks so they match the daemon section of new (old is None at startup)"""
+        periods = dict(new.daemon.periods)
+        if new.daemon.jitter_report_period:
+            periods['jitter_report'] = new.daemon.jitter_report_period
+        for name, callback in callbacks.items():
+            if name not in periods:
+                if name in scheduler.tasks:
+                    scheduler.remove_task(name)
+            elif name not in scheduler.tasks:
+                scheduler.add_task(name,periods[name],callback,report=name != 'jitter_report')
+            elif scheduler.tasks[name]['period'] != periods[name]:
+                scheduler.set_period(name,periods[name])
+        if old is not None:
+            for section in ('i2c','telemetry'):
+                if getattr(old,section) != getattr(new,section):
+                    print(f"The {section} section changed, restart the daemon to apply it",flush=True)
+            if new.daemon.config_poll_period != old.daemon.config_poll_period and 'config_reload' in scheduler.tasks:
+                if new.daemon.config_poll_period:
+                    scheduler.set_period('config_reload',new.daemon.config_poll_period)
+                else:
+                    scheduler.remove_task('config_reload')
+
+    @staticmethod
+    def apply_device_config(old,new,rtc_interface,temp_interface,time_service = None):
+        """Write the temperature limits and set the RTC tick check and time service settings that changed between old and new"""
+        for name in ('tick_check','oscrun_timeout','oscrun_poll_interval'):
+            if getattr(old.rtc,name) != getattr(new.rtc,name):
+                setattr(rtc_interface,name,getattr(new.rtc,name))
+        if time_service is not None:
+            time_service.resync_interval = new.rtc.resync_interval
+            time_service.align = new.rtc.align_sync
+        for name, attribute in (('critical_temperature','critical_temp'),('upper_temperature','upper_temp'),('lower_temperature','lower_temp')):
+            value = getattr(new.temperature_sensor,name)
+            if value is not None and value != getattr(old.temperature_sensor,name):
+                setattr(temp_interface,attribute,value)
+
+    @staticmethod
+    def watch_alerts():
+        """Program the MCP9808 Alert output from the alert section of the temperature_sensor config and print every alert event.
+        The Alert line is watched through sysfs GPIO, so the bus is only used when an alert fires.
+        """
+        from GPIO.edge_source import SysfsEdgeSource
+        alert_config = OBC_Controller.get_config().temperature_sensor.alert
+        if alert_config.gpio is None:
+            raise ConfigError("temperature_sensor.alert.gpio must be set to watch alerts")
+        temp_interface = Temperature_Sensor(i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
+        temp_interface.configure_alert(alert_config.mode,alert_config.hysteresis,alert_config.critical_only)
+        #A comparator output also reports the return inside the limits, an interrupt output only reports the excursion
+        edge_source = SysfsEdgeSource(alert_config.gpio,'both' if alert_config.mode == 'comparator' else 'falling')
+        for event in temp_interface.alerts(edge_source):
+            flags = [name for name in ('critical','upper','lower') if event[name]]
+            print(f"Temperature Alert: {event['temperature']} °C, limits exceeded: {', '.join(flags) or 'none'}",flush=True)
+
+    @staticmethod
+    def load_passes(path):
+        """Read pass windows from a file with one "start end" pair per line (seconds since the epoch or ISO 8601), # starts a comment"""
+        passes = []
+        try:
+            file = open(os.path.expanduser(path))
+        except OSError as error:
+            raise ConfigError(f"Unable to open {path}: {error}") from error
+        with file:
+            for number, line in enumerate(file,1):
+                fields = line.split('#')[0].split()
+                if not fields:
+                    continue
+                if len(fields) != 2:
+                    raise ConfigError(f"{path}:{number}: expected a start and end time")
+                try:
+                    passes.append((OBC_Controller.parse_time(fields[0]),OBC_Controller.parse_time(fields[1])))
+                except ValueError as error:
+                    raise ConfigError(f"{path}:{number}: {error}") from error
+        return passes
+
+    @staticmethod
+    def run_alarm_telemetry():
+        """Sample telemetry when the RTC alarm fires, every rtc.alarm.period seconds and every pass_period seconds during the
+        passes listed in passes_path. The process blocks on the MFP line between samples, replacing a cron job that starts
+        every minute whether or not a sample is due.
+        """
+        from GPIO.edge_source import SysfsEdgeSource
+        alarm_config = OBC_Controller.get_config().rtc.alarm
+        if alarm_config.gpio is None:
+            raise ConfigError("rtc.alarm.gpio must be set to run alarm telemetry")
+        passes = OBC_Controller.load_passes(alarm_config.passes_path) if alarm_config.passes_path else []
+        temp_interface = Temperature_Sensor(i2c_bus=OBC_Controller.get_bus(Temperature_Sensor.i2c_bus_number))
+        rtc_interface = RTC(i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number))
+        #The MFP output is open drain, pulled low while the alarm is asserted
+        edge_source = SysfsEdgeSource(alarm_config.gpio,'rising' if RTC.alarm_polarity else 'falling')
+        scheduler = AlarmScheduler(rtc_interface,edge_source,alarm_config.period,alarm_config.alarm,name='alarm_telemetry')
+        for start, end in passes:
+            scheduler.add_window(start,end,alarm_config.pass_period)
+
+        store = OBC_Controller.open_telemetry_store()
+        rollups = OBC_Controller.open_rollups()
+
+        def sample(due):
+            OBC_Controller.sample_temperature(rtc_interface,temp_interface,store,rollups)
+            if store is not None:
+                store.flush() #Samples are minutes to hours apart, do not leave them in the write buffer
+                rollups.flush()
+        try:
+            scheduler.run(sample)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(scheduler.format_stats(),flush=True)
+            print(OBC_Controller.bus_manager.format_stats(),flush=True)
+            if store is not None:
+                store.close()
+                rollups.close()
+            edge_source.close()
+
+    @staticmethod
+    def print_stats():
+        """Collect telemetry once and print the I2C transactions it cost per device address and register.
+        The statistics are also written to the Prometheus textfile set in the stats section of the config.
+        """
+        OBC_Controller.get_telemetry()
+        print(OBC_Controller.bus_stats.format_table())
+        textfile = OBC_Controller.get_config().stats.textfile
+        if textfile:
+            OBC_Controller.bus_stats.write_textfile(os.path.expanduser(textfile))
+
+    @staticmethod
+    def print_checkpoints():
+        """Print the boot counters and temperature summaries kept in the RTC SRAM/EEPROM by the daemon"""
+        store = CheckpointStore(RTC(i2c_bus=OBC_Controller.get_bus(RTC.i2c_bus_number)))
+        print(store.format_state(store.recover()))
+
+    @staticmethod
+    def parse_time(value):
+        """Parse seconds since the epoch or an ISO 8601 date/time (UTC unless it has an offset)"""
+        try:
+            return float(value)
+        except ValueError:
+            timestamp = datetime.datetime.fromisoformat(value)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        return timestamp.timestamp()
+
+    @staticmethod
+    def parse_step(value):
+        """Parse a step in seconds, with an optional s, m, h or d suffix (e.g. 1h)"""
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        if value[-1:] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+
+    @staticmethod
+    def run_query(start,end,step,device = 'temperature_sensor',channel = 'ambient_temperature',rebuild = False):
+        """Print count/mean/min/max of a telemetry channel per step between start and end, answered from the rollups.
+
+        Args:
+            start (string): seconds since the epoch or ISO 8601 date/time, defaults to the start of the log
+            end (string): seconds since the epoch or ISO 8601 date/time, defaults to now
+            step (string): bin width, e.g. 60, 15m, 1h or 1d
+            rebuild (bool): recompute the rollups from the raw log first
+        """
+        telemetry_config = OBC_Controller.get_config().telemetry
+        if not telemetry_config.store_path:
+            raise RuntimeError("telemetry.store_path is not set in the config")
+        rollups = OBC_Controller.open_rollups()
+        try:
+            if rebuild:
+                with TelemetryReader(os.path.expanduser(telemetry_config.store_path)) as reader:
+                    rollups.rebuild(reader)
+            start = 0 if start is None else OBC_Controller.parse_time(start)
+            end = datetime.datetime.now(datetime.timezone.utc).timestamp() if end is None else OBC_Controller.parse_time(end)
+            rows = rollups.query(DEVICE_IDS[device],CHANNEL_IDS[channel],start,end,OBC_Controller.parse_step(step))
+        finally:
+            rollups.close()
+        print(f"{'start (UTC)':<20} {'count':>8} {'mean':>10} {'min':>10} {'max':>10}")
+        for bin_start, count, mean, minimum, maximum in rows:
+            label = datetime.datetime.fromtimestamp(bin_start,datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            print(f"{label:<20} {count:>8} {mean:>10.4f} {minimum:>10.4f} {maximum:>10.4f}")
+
     @staticmethod
     def take_pic():
         pass 
 
+    @staticmethod
+    def import_profile():
+        """Print the import cost of obc_controller and its deferred dependencies.
+        The imports are timed in a fresh interpreter with python -X importtime so nothing is already cached.
+        """
+        import subprocess
+        code = "import obc_controller\n"
+        for module in OBC_Controller.deferred_modules:
+            code += f"try:\n    import {module}\nexcept ImportError:\n    pass\n"
+        result = subprocess.run([sys.executable,'-X','importtime','-c',code],capture_output=True,text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        costs = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if name.startswith('  '):
+                continue #Only report modules imported directly, their dependencies are included in the cumulative cost
+            costs.append((int(cumulative_us),int(self_us),name.strip()))
+
+        print(f"{'cumulative [ms]':>16} {'self [ms]':>10}  module")
+        for cumulative_us, self_us, name in sorted(costs,reverse=True):
+            deferred = "  (deferred)" if name in OBC_Controller.deferred_modules else ""
+            print(f"{cumulative_us/1000:>16.2f} {self_us/1000:>10.2f}  {name}{deferred}")
+        print(f"{sum(cost[0] for cost in costs)/1000:>16.2f} {'':>10}  total")
+
 if __name__  == '__main__':
     FUNCTION_MAP =  {
-        'init': OBC_Controller.init_hardware,
+        'init': lambda: OBC_Controller.init_hardware(args.dry_run,args.force),
         'telemetry': OBC_Controller.get_telemetry,
-        'take_picture': OBC_Controller.take_picture,
+        'telemetry_async': OBC_Controller.get_telemetry_async,
+        'take_picture': OBC_Controller.take_pic,
+        'daemon': OBC_Controller.run_daemon,
+        'stats': OBC_Controller.print_stats,
+        'alerts': OBC_Controller.watch_alerts,
+        'checkpoints': OBC_Controller.print_checkpoints,
+        'alarm_telemetry': OBC_Controller.run_alarm_telemetry,
+        'query': lambda: OBC_Controller.run_query(args.start,args.end,args.step,args.device,args.channel,args.rebuild),
         }
     parser = argparse.ArgumentParser()
-    parser.add_argument('cmd', choices=FUNCTION_MAP.keys())
+    parser.add_argument('cmd', nargs='?', choices=FUNCTION_MAP.keys())
+    parser.add_argument('--import-profile', action='store_true', help='report the import cost of each module and exit')
+    init_arguments = parser.add_argument_group('init')
+    init_arguments.add_argument('--dry-run', action='store_true', help='print the changes init would make without writing them')
+    init_arguments.add_argument('--force', action='store_true', help='re-apply every setting without comparing against the devices')
+    query_arguments = parser.add_argument_group('query')
+    query_arguments.add_argument('--from', dest='start', help='start time, seconds since the epoch or ISO 8601 (UTC)')
+    query_arguments.add_argument('--to', dest='end', help='end time, seconds since the epoch or ISO 8601 (UTC)')
+    query_arguments.add_argument('--step', default='1h', help='bin width, e.g. 60, 15m, 1h or 1d')
+    query_arguments.add_argument('--device', default='temperature_sensor', choices=DEVICE_IDS.keys())
+    query_arguments.add_argument('--channel', default='ambient_temperature', choices=CHANNEL_IDS.keys())
+    query_arguments.add_argument('--rebuild', action='store_true', help='recompute the rollups from the raw telemetry log')
     args = parser.parse_args()
 
-    func = FUNCTION_MAP[args.cmd]
-    func()
+    if args.import_profile:
+        OBC_Controller.import_profile()
+    elif args.cmd is None:
+        parser.error('a command is required')
+    else:
+        func = FUNCTION_MAP[args.cmd]
+        try:
+            func()
+        except ConfigError as error:
+            sys.exit(f"Invalid config: {error}")
@@ -0,0 +1,80 @@
+import asyncio
+import concurrent.futures
+from obc_async import AsyncRTC, AsyncSTM32, AsyncTemperatureSensor, gather_telemetry
+from Real_Time_Clock.rtc import RTC
+from STM32.stm32 import STM32
+from Temperature_Sensor.temperature_sensor import Temperature_Sensor
+
+def test_gather_is_bounded_by_slowest_device(sim_bus):
+    stm32 = STM32(0x15,bus=sim_bus)
+    stm32.command_delay = 0.3
+    reads = {
+        'rtc': AsyncRTC(RTC(i2c_bus=sim_bus)).timestamp,
+        'temperature_sensor': AsyncTemperatureSensor(Temperature_Sensor(i2c_bus=sim_bus)).ambient,
+        'stm32': lambda: AsyncSTM32(stm32).recieve(2),
+        'stm32_timeout': lambda: AsyncSTM32(stm32).recieve(2),
+    }
+    results = asyncio.run(gather_telemetry(reads,{'stm32_timeout': 0.1}))
+    assert results['temperature_sensor'] == {'value': 20.0, 'error': None, 'elapsed': results['temperature_sensor']['elapsed']}
+    assert results['stm32']['error'] is None
+    assert results['stm32']['elapsed'] >= 0.3
+    #The other reads and the timeout did not wait for the slow STM32 handshake
+    assert max(results[name]['elapsed'] for name in ('rtc','temperature_sensor','stm32_timeout')) < results['stm32']['elapsed']
+    assert results['stm32_timeout']['error'] == "timed out after 0.1 s"
+
+def test_waits_do_not_hold_executor_threads(sim_bus):
+    from I2C_Bus.sim_smbus import SimSTM32
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    addresses = (0x15,0x16,0x17)
+    for address in addresses[1:]:
+        sim_bus.devices[address] = SimSTM32()
+    stm32s = [STM32(address,bus=sim_bus) for address in addresses]
+    for stm32 in stm32s:
+        stm32.command_delay = 0.2
+
+    writes = []
+    write = sim_bus.write_i2c_block_data
+
+    def logged_write(address,register,data):
+        writes.append('data' if data[0] == STM32.defined_bits['BAD_BYTE'] else 'command')
+        write(address,register,data)
+    sim_bus.write_i2c_block_data = logged_write
+
+    async def main():
+        await asyncio.gather(*(AsyncSTM32(stm32,executor).transmit([i]) for i, stm32 in enumerate(stm32s)))
+    asyncio.run(main())
+    #Every command was sent while the single worker thread was free during the other handshakes
+    assert writes == ['command'] * 3 + ['data'] * 3
+    assert [sim_bus.devices[address].received for address in addresses] == [[[0]],[[1]],[[2]]]
+
+def test_exchanges_with_one_device_do_not_interleave(sim_bus):
+    stm32 = STM32(0x15,bus=sim_bus)
+    stm32.command_delay = 0.02
+
+    async def main():
+        await asyncio.gather(*(AsyncSTM32(stm32).transmit([value]) for value in (10,11,12)))
+        return await asyncio.gather(AsyncSTM32(stm32).recieve(1),AsyncSTM32(stm32).transmit([13]))
+    data, _ = asyncio.run(main())
+    assert sim_bus.devices[0x15].received == [[10],[11],[12],[13]]
+    assert data == [12]
+    assert stm32.stats()['transactions'] == 5
+    assert stm32.stats()['failures'] == 0
+
+def test_ready_handshake_and_clock(sim_bus):
+    sim_bus.devices[0x15].ready_delay = 0.01
+
+    async def main():
+        stm32 = AsyncSTM32(STM32(0x15,bus=sim_bus,handshake='ready'))
+        await stm32.transmit([4,2])
+        rtc = await AsyncRTC.open(lambda: RTC(i2c_bus=sim_bus))
+        await rtc.set_clock(1)
+        return await stm32.recieve(2), await rtc.read_state()
+    data, state = asyncio.run(main())
+    assert data == [4,2]
+    assert state['clock'] == 1
+
+def test_errors_are_reported(sim_bus):
+    async def fail():
+        raise RuntimeError("Unable to Get Second")
+    results = asyncio.run(gather_telemetry({'rtc': fail}))
+    assert results['rtc']['error'] == "Unable to Get Second"
@@ -0,0 +1,72 @@
+import os
+import sys
+import pytest
+import obc_config
+from obc_config import ConfigError, ConfigWatcher, load_config, parse_config
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def test_repo_config_is_valid():
+    config = load_config(os.path.join(REPO_DIR,'controller_config.yml'),use_cache=False)
+    assert config.rtc.tick_check == 'oscrun'
+    assert config.temperature_sensor.alert.hysteresis == 1.5
+    assert config.daemon.periods['temperature_sensor'] == 0.5
+
+def test_missing_sections_use_defaults():
+    config = parse_config({'rtc': {'datetime': "2023-2-5-0-15-34"}})
+    assert config.rtc.datetime == "2023-2-5-0-15-34"
+    assert config.i2c.backend == 'smbus'
+    assert config.telemetry.rollup_resolutions == [60,3600,86400]
+
+@pytest.mark.parametrize("data, message", [
+    ({'rtc': {'tick_chek': 'oscrun'}}, "Unknown key rtc.tick_chek"),
+    ({'rtc': {'tick_check': 'poll'}}, "rtc.tick_check must be one of"),
+    ({'rtc': {'oscrun_timeout': 'fast'}}, "rtc.oscrun_timeout must be a number"),
+    ({'telemetry': {'batch_size': 1.5}}, "telemetry.batch_size must be an integer"),
+    ({'temperature_sensor': {'alert': {'critical_only': 'no'}}}, "temperature_sensor.alert.critical_only must be true or false"),
+    ({'daemon': {'periods': {'rtc': 0}}}, "daemon.periods must map names to positive numbers"),
+    ({'daemon': {'periods': {'temprature_sensor': 0.5}}}, "Unknown key daemon.periods.temprature_sensor"),
+    ({'stats': None}, "stats must be set"),
+    ([1, 2], "config must be a mapping"),
+])
+def test_invalid_config(data, message):
+    with pytest.raises(ConfigError, match=message):
+        parse_config(data)
+
+def test_missing_file(tmp_path):
+    with pytest.raises(ConfigError, match="Unable to open"):
+        load_config(str(tmp_path / 'missing.yml'))
+
+def test_cache_skips_yaml(tmp_path, monkeypatch):
+    path = tmp_path / 'config.yml'
+    path.write_text("rtc:\n    tick_check: sleep\n")
+    assert load_config(str(path)).rtc.tick_check == 'sleep'
+    assert os.path.exists(obc_config.cache_path(str(path)))
+    monkeypatch.setitem(sys.modules,'yaml',None) #Importing yaml now fails
+    assert load_config(str(path)).rtc.tick_check == 'sleep'
+
+def test_cache_invalidated_on_change(tmp_path):
+    path = tmp_path / 'config.yml'
+    path.write_text("rtc:\n    tick_check: sleep\n")
+    load_config(str(path))
+    path.write_text("rtc:\n    tick_check: oscrun\n")
+    os.utime(path,ns=(0,0))
+    assert load_config(str(path)).rtc.tick_check == 'oscrun'
+
+def test_watcher_applies_changes_and_keeps_last_valid(tmp_path):
+    path = tmp_path / 'config.yml'
+    path.write_text("daemon:\n    periods: {rtc: 1}\n")
+    changes = []
+    watcher = ConfigWatcher(str(path),lambda old, new: changes.append((old,new)))
+    assert not watcher.check()
+
+    path.write_text("daemon:\n    periods: {rtc: 5}\n")
+    os.utime(path,ns=(1,1))
+    assert watcher.check()
+    assert changes[0][1].daemon.periods == {'rtc': 5}
+
+    path.write_text("daemon:\n    periods: {rtc: -1}\n")
+    os.utime(path,ns=(2,2))
+    assert not watcher.check()
+    assert watcher.config.daemon.periods == {'rtc': 5}
+    assert watcher.errors == 1
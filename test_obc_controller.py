@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Seconds allowed for a cold start, override on slower boards
+COLD_START_BUDGET = float(os.environ.get('OBC_COLD_START_BUDGET', 0.5))
+
+def run_python(code):
+    start = time.monotonic()
+    result = subprocess.run([sys.executable,'-c',code],cwd=REPO_DIR,capture_output=True,text=True)
+    return result, time.monotonic() - start
+
+@pytest.mark.parametrize("module", ['yaml','smbus','picamera','PIL','matplotlib','numpy'])
+def test_import_defers_heavy_modules(module):
+    result, _ = run_python(f"import sys, obc_controller\nprint('{module}' in sys.modules)")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False'
+
+def test_telemetry_cold_start_budget(tmp_path):
+    start = time.monotonic()
+    result = subprocess.run([sys.executable,'obc_controller.py','telemetry'],cwd=REPO_DIR,capture_output=True,text=True,
+                            env=dict(os.environ,OBC_I2C_BACKEND='sim',HOME=str(tmp_path)))
+    elapsed = time.monotonic() - start
+    assert result.returncode == 0, result.stderr
+    assert 'Time: ' in result.stdout
+    assert elapsed < COLD_START_BUDGET
+
+def test_telemetry_writes_store(tmp_path):
+    from Telemetry.telemetry_store import TelemetryReader
+    for _ in range(2):
+        result = subprocess.run([sys.executable,'obc_controller.py','telemetry'],cwd=REPO_DIR,capture_output=True,text=True,
+                                env=dict(os.environ,OBC_I2C_BACKEND='sim',HOME=str(tmp_path)))
+        assert result.returncode == 0, result.stderr
+    with TelemetryReader(str(tmp_path / 'telemetry.bin')) as reader:
+        assert len(reader) == 2
+        timestamp, device, channel, value, status = reader.record(1)
+        assert (device, channel, value, status) == (2, 1, 20.0, 0)
+
+def test_import_profile():
+    result = subprocess.run([sys.executable,'obc_controller.py','--import-profile'],cwd=REPO_DIR,capture_output=True,text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'obc_controller' in result.stdout
+    assert 'total' in result.stdout
+
+def test_init_reconciles_then_writes_nothing(sim_bus):
+    from obc_controller import OBC_Controller
+    from obc_config import load_config
+    from Real_Time_Clock.rtc import RTC
+    from Temperature_Sensor.temperature_sensor import Temperature_Sensor
+    config = load_config(os.path.join(REPO_DIR,'controller_config.yml'),use_cache=False)
+    rtc_interface = RTC(oscrun_timeout=0.1,i2c_bus=sim_bus)
+    temp_interface = Temperature_Sensor(i2c_bus=sim_bus)
+
+    plan = OBC_Controller.plan_init(config,rtc_interface,temp_interface)
+    assert [name for name, *_ in plan] == ['rtc.battery','rtc.datetime','rtc.clock',
+                                           'temperature_sensor.upper_temp','temperature_sensor.lower_temp']
+    for *_, apply in plan:
+        apply()
+
+    def no_writes(*args):
+        raise AssertionError("unexpected write")
+    sim_bus.write_byte_data = sim_bus.write_i2c_block_data = no_writes
+    start = time.monotonic()
+    assert OBC_Controller.plan_init(config,rtc_interface,temp_interface) == []
+    assert time.monotonic() - start < 0.05
+
+def test_init_reports_failed_writes(monkeypatch, capsys):
+    from obc_controller import OBC_Controller
+    from Real_Time_Clock.rtc import RTC
+    from I2C_Bus.bus_manager import BACKEND_ENV
+
+    def stuck_oscillator(self,value):
+        raise RuntimeError("Clock unable to Stop")
+    monkeypatch.setenv(BACKEND_ENV,'sim')
+    monkeypatch.setattr(OBC_Controller,'bus_manager',None)
+    monkeypatch.setattr(RTC,'_write_timekeeping',stuck_oscillator)
+    with pytest.raises(RuntimeError, match="Unable to apply rtc.datetime: Clock unable to Stop"):
+        OBC_Controller.init_hardware()
+    assert 'rtc.clock' not in capsys.readouterr().out #Not started with the wrong time
+
+def test_backend_override_keeps_sim_options(monkeypatch):
+    from obc_controller import OBC_Controller
+    from obc_config import parse_config
+    from I2C_Bus.bus_manager import BACKEND_ENV
+    monkeypatch.setenv(BACKEND_ENV,'sim')
+    monkeypatch.setattr(OBC_Controller,'bus_manager',None)
+    monkeypatch.setattr(OBC_Controller,'config',parse_config({'i2c': {'backend': 'smbus', 'sim': {'latency': 0.001, 'fault_rate': 0.5}}}))
+    sim = OBC_Controller.get_bus(1).handle.handle #ManagedBus -> InstrumentedBus -> SimSMBus
+    assert (sim.latency, sim.fault_rate) == (0.001, 0.5)
+
+def test_init_dry_run(tmp_path):
+    result = subprocess.run([sys.executable,'obc_controller.py','init','--dry-run'],cwd=REPO_DIR,capture_output=True,text=True,
+                            env=dict(os.environ,OBC_I2C_BACKEND='sim',HOME=str(tmp_path)))
+    assert result.returncode == 0, result.stderr
+    assert 'Dry run' in result.stdout
+    assert 'rtc.clock: 0 -> 1' in result.stdout
+
+def test_load_passes(tmp_path):
+    from obc_controller import OBC_Controller
+    from obc_config import ConfigError
+    path = tmp_path / 'passes.txt'
+    path.write_text("# AOS LOS\n2023-02-05T00:10:00 2023-02-05T00:20:00\n1675560000 1675560600 #Epoch seconds\n\n")
+    assert OBC_Controller.load_passes(str(path)) == [(1675555800.0,1675556400.0),(1675560000.0,1675560600.0)]
+    path.write_text("2023-02-05T00:10:00\n")
+    with pytest.raises(ConfigError,match="passes.txt:1"):
+        OBC_Controller.load_passes(str(path))
+    with pytest.raises(ConfigError):
+        OBC_Controller.load_passes(str(tmp_path / 'missing.txt'))